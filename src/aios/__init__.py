@@ -11,16 +11,30 @@ from .agent.role import AIRole,AIRoleGroup
 from .agent.workflow import Workflow
 from .agent.agent_memory import AgentMemory
 from .agent.workspace import AgentWorkspace
-from .agent.llm_context import LLMProcessContext,GlobaToolsLibrary,SimpleLLMContext
+from .agent.llm_context import LLMProcessContext,GlobaToolsLibrary,SimpleLLMContext,CompiledFunctions
 from .agent.llm_process import BaseLLMProcess,LLMAgentBaseProcess
 from .agent.llm_process_loader import LLMProcessLoader
 
 from .frame.compute_kernel import ComputeKernel,ComputeTask,ComputeTaskResult,ComputeTaskState,ComputeTaskType
 from .frame.compute_node import ComputeNode,LocalComputeNode
 from .frame.bus import AIBus
-from .frame.tunnel import AgentTunnel
+from .frame.tunnel import AgentTunnel,StreamReplyEditor
 from .frame.contact_manager import ContactManager,Contact
 from .frame.queue_compute_node import Queue_ComputeNode
+from .frame.compute_task_queue import ComputeTaskQueue
+from .frame.compute_node_stats import ComputeNodeStats
+from .frame.capability_index import ComputeCapabilityIndex
+from .frame.llm_cache import LLMCompletionCache
+from .frame.function_cache import AIFunctionResultCache
+from .frame.token_counter import TokenCounter
+from .frame.context_packer import ContextPacker,ContextSegment,PackedSegment
+from .frame.embedding_batcher import EmbeddingBatcher
+from .frame.circuit_breaker import CircuitBreaker,CircuitState
+from .frame.remote_compute_node import RemoteComputeNode
+from .frame.compute_node_worker import ComputeNodeWorker
+from .frame.metrics import MetricsRegistry
+from .frame.token_budget import TokenBudgetScheduler,OwnerBudget
+from .frame.schedule_policy import SchedulePolicy,WeightedRandomSchedulePolicy,CheapestSchedulePolicy,LowestLatencySchedulePolicy
 
 from .environment.environment import BaseEnvironment,SimpleEnvironment,CompositeEnvironment
 # from .environment.workflow_env import WorkflowEnvironment,CalenderEnvironment,CalenderEvent,PaintEnvironment
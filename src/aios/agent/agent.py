@@ -10,6 +10,7 @@ import json
 import shlex
 import datetime
 import copy
+import math
 import sys
 
 from ..proto.agent_msg import AgentMsg
@@ -26,6 +27,7 @@ from .chatsession import *
 from ..environment.workspace_env import WorkspaceEnvironment, TodoListType
 from ..environment.environment import *
 from ..storage.storage import AIStorage
+from ..frame.compute_kernel import ComputeKernel
 from ..knowledge import *
 from ..proto.compute_task import LLMPrompt,LLMResult
 
@@ -33,15 +35,21 @@ logger = logging.getLogger(__name__)
 
 
 class AIAgent(BaseAIAgent):
+    # 1 energy is 2000 tokens, with token_quota 2000 and the default burst the agent has 15 energy and recovers 1 per minute
+    ENERGY_TOKENS = 2000
+    DEFAULT_TOKEN_BURST = 30000
+
     def __init__(self) -> None:
         self.role_prompt:LLMPrompt = None
         self.agent_prompt:LLMPrompt = None
         self.agent_think_prompt:LLMPrompt = None
         self.llm_model_name:str = None
         self.max_token_size:int = 128000
-        self.agent_energy = 15
+        # the token quota in the compute kernel, agent_energy is a view of it
+        self.token_quota = None # tokens per minute, None means only the fair share
+        self.token_burst = AIAgent.DEFAULT_TOKEN_BURST
+        self.token_weight = 1.0
         self.agent_task = None
-        self.last_recover_time = time.time()
         self.enable_thread = False
         self.can_do_unassigned_task = True
 
@@ -115,6 +123,13 @@ class AIAgent(BaseAIAgent):
             self.enable_timestamp = bool(config["enable_timestamp"])
         if config.get("history_len"):
             self.history_len = int(config.get("history_len"))
+        if config.get("token_quota") is not None:
+            self.token_quota = float(config["token_quota"])
+        if config.get("token_burst") is not None:
+            self.token_burst = float(config["token_burst"])
+        if config.get("token_weight") is not None:
+            self.token_weight = float(config["token_weight"])
+        self.set_token_budget()
 
         #load all LLMProcess
         self.behaviors = {}
@@ -126,12 +141,28 @@ class AIAgent(BaseAIAgent):
             real_config.update(process_config)
             load_result = await LLMProcessLoader.get_instance().load_from_config(real_config)
             if load_result:
+                load_result.behavior = process_config_name
                 self.behaviors[process_config_name] = load_result
             else:
                 logger.error(f"load LLMProcess {process_config_name} failed!")
                 return False
         return True
 
+    def set_token_budget(self):
+        # without token_quota the agent only gets its fair share
+        if self.token_quota:
+            ComputeKernel.get_instance().token_budget.set_budget(self.agent_id,self.token_weight,self.token_quota,self.token_burst)
+        else:
+            ComputeKernel.get_instance().token_budget.set_budget(self.agent_id,self.token_weight)
+
+    @property
+    def agent_energy(self) -> float:
+        budget = ComputeKernel.get_instance().token_budget.get_budget(self.agent_id)
+        balance = budget.get_balance()
+        if balance is None:
+            return math.inf
+        return balance / AIAgent.ENERGY_TOKENS
+
     def get_id(self) -> str:
         return self.agent_id
 
@@ -225,7 +256,6 @@ class AIAgent(BaseAIAgent):
             else:
                 logger.info(f"llm process self thinking  ok!,think is:{llm_result.resp}")
                 await self.memory.set_last_think_time(time.time())
-            self.agent_energy -= 2
             return
 
     async def llm_triage_tasklist(self):
@@ -255,7 +285,6 @@ class AIAgent(BaseAIAgent):
                             logger.info(f"llm process triage_tasks ignore!")
                         else:
                             logger.info(f"llm process triage_tasks ok!,think is:{llm_result.resp}")
-                        self.agent_energy -= 3
 
                     # for agent_task in tasklist:
                     #     if self.agent_energy <= 0:
@@ -292,7 +321,6 @@ class AIAgent(BaseAIAgent):
                 logger.info(f"llm process do_todo ignore!")
             else:
                 logger.info(f"llm process do_todo ok!,think is:{llm_result.resp}")
-            self.agent_energy -= 1
 
     async def llm_check_todo(self, todo: AgentTodo):
         llm_process : BaseLLMProcess = self.behaviors.get("check")
@@ -309,7 +337,6 @@ class AIAgent(BaseAIAgent):
                 logger.info(f"llm process check_todo ignore!")
             else:
                 logger.info(f"llm process check_todo ok!,think is:{llm_result.resp}")
-            self.agent_energy -= 1
 
             return
 
@@ -328,7 +355,6 @@ class AIAgent(BaseAIAgent):
                 logger.info(f"llm process plan_task ignore!")
             else:
                 logger.info(f"llm process plan_task ok!,think is:{llm_result.resp}")
-            self.agent_energy -= 1
 
     async def llm_review_task(self,task:AgentTask):
         llm_process : BaseLLMProcess = self.behaviors.get("review_task")
@@ -345,7 +371,6 @@ class AIAgent(BaseAIAgent):
                 logger.info(f"llm process review_task ignore!")
             else:
                 logger.info(f"llm process review_task ok!,think is:{llm_result.resp}")
-            self.agent_energy -= 1
 
 
     async def _self_imporve(self):
@@ -361,17 +386,10 @@ class AIAgent(BaseAIAgent):
         await asyncio.sleep(5)
         while True:
             try:
-                now = time.time()
-                if self.last_recover_time is None:
-                    self.last_recover_time = now
-                else:
-                    if now - self.last_recover_time > 60:
-                        self.agent_energy += (now - self.last_recover_time) / 60
-                        self.last_recover_time = now
-                        logger.info(f"agent {self.agent_id} recover energy to {self.agent_energy}")
-
+                # the energy is recovered by the token quota of compute kernel
                 if self.agent_energy <= 1:
                     logger.info(f"agent {self.agent_id} energy is too low!, goto sleep!")
+                    await asyncio.sleep(30)
                     continue
 
                 await self.llm_triage_tasklist()
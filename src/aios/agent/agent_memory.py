@@ -13,6 +13,7 @@ from ..knowledge.knowledge_base import BaseKnowledgeGraph,ObjFSKnowledgeGrpah
 from ..frame.compute_kernel import ComputeKernel
 from ..frame.contact_manager import ContactManager
 from ..frame.contact import Contact
+from ..frame.context_packer import ContextPacker,ContextSegment
 from ..proto.ai_function import ParameterDefine, SimpleAIFunction
 from ..proto.agent_msg import AgentMsg, AgentMsgType
 from ..proto.agent_task import AgentWorkLog
@@ -110,26 +111,20 @@ The Knowledgegraph is used to store important information obtained by Agent in t
         pass
 
     async def load_chatlogs(self,msg:AgentMsg,token_limit=800,model_name=""):
+        records,token_counts = await self.load_chat_records(msg)
+        # 32 tokens are kept like before
+        packer = ContextPacker(token_limit - 32,model_name or None)
+        packer.add_segment(ContextSegment("chat_record",records,token_counts,truncate=ContextSegment.KEEP_NEWEST))
+        packed = packer.pack()["chat_record"]
+        return packed.to_str(),packed.is_complete
+
+    async def load_chat_records(self,msg:AgentMsg):
+        # the records of the session of msg oldest first, with their token counts stored in the chat db
         chatsession = self.get_session_from_msg(msg)
-        # Must load n (n> = 2), and hope to load the M
-        # The information in the # M is gradually added, knowing that it is less than 72 hours from the current time, and consumes enough tokens
-
-        messages_n = chatsession.read_history() # read
-        histroy_str = ""
-        read_count = 0
-        is_all = True
-        for msg in messages_n:
-            dt = datetime.fromtimestamp(float(msg.create_time))
-            formatted_time = dt.strftime('%y-%m-%d %H:%M:%S')
-            record_str = f"{msg.sender},[{formatted_time}]\n{msg.body}\n"
-            token_limit -= ComputeKernel.llm_num_tokens_from_text(record_str)
-            if token_limit <= 32:
-                is_all = False
-                break
-            read_count += 1
-            histroy_str = record_str + histroy_str
-
-        return histroy_str,is_all
+        records,token_counts = chatsession.read_records()
+        records.reverse()
+        token_counts.reverse()
+        return records,token_counts
     
     async def get_chat_summary(self,msg:AgentMsg) -> str:
         chatsession : AIChatSession = self.get_session_from_msg(msg)
@@ -6,9 +6,26 @@ import threading
 import datetime
 import uuid
 import json
-from typing import List
+from typing import List,Tuple
 
 from ..proto.agent_msg import AgentMsgType, AgentMsg, AgentMsgStatus
+from ..frame.token_counter import TokenCounter
+
+MESSAGE_COLUMNS = "MessageID, SessionID, MsgType, PrevMsgID, SenderID, ReceiverID, Timestamp, Topic,Mentions,ContentMIME,Content,ActionName,ActionParams,ActionResult,DoneTime,Status"
+
+# the record of msg in the prompts, like
+# sender,[23-11-01 12:00:00]
+# content
+def format_chat_record(msg:AgentMsg) -> str:
+    try:
+        formatted_time = datetime.datetime.fromtimestamp(float(msg.create_time)).strftime('%y-%m-%d %H:%M:%S')
+    except (TypeError,ValueError):
+        formatted_time = str(msg.create_time)
+    return f"{msg.sender},[{formatted_time}]\n{msg.body}\n"
+
+# tokens of the record by the default encoding, it's counted once when the msg is inserted
+def count_chat_record_tokens(msg:AgentMsg) -> int:
+    return TokenCounter.count(format_chat_record(msg))
 
 class ChatSessionDB:
     def __init__(self, db_file):
@@ -86,9 +103,14 @@ class ChatSessionDB:
                     DoneTime TEXT,     
                          
                     Status INTEGER,
-                    Tags TEXT
+                    Tags TEXT,
+                    TokenCount INTEGER
                 );
             """)
+            # the dbs created before TokenCount
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(Messages)").fetchall()]
+            if "TokenCount" not in columns:
+                conn.execute("ALTER TABLE Messages ADD COLUMN TokenCount INTEGER")
             conn.commit()
         except Error as e:
             logging.error("Error occurred while creating tables: %s", e)
@@ -135,11 +157,12 @@ class ChatSessionDB:
                 tags = []
 
             str_tags = ','.join(tags)
+            msg.token_count = count_chat_record_tokens(msg)
             conn = self._get_conn()
             conn.execute("""
-                INSERT INTO Messages (MessageID, SessionID, MsgType, PrevMsgID, SenderID, ReceiverID, Timestamp, Topic,Mentions,ContentMIME,Content,ActionName,ActionParams,ActionResult,DoneTime,Status,Tags)
-                VALUES (?, ?, ?, ?, ?, ?, ?,?, ?, ?, ?, ?, ?, ?, ?, ?,?)
-            """, (msg.msg_id, msg.session_id, msg.msg_type.value, msg.prev_msg_id, msg.sender, msg.target, msg.create_time, msg.topic,mentions,msg.body_mime,msg.body,action_name,action_params,action_result,msg.done_time,msg.status.value,str_tags))
+                INSERT INTO Messages (MessageID, SessionID, MsgType, PrevMsgID, SenderID, ReceiverID, Timestamp, Topic,Mentions,ContentMIME,Content,ActionName,ActionParams,ActionResult,DoneTime,Status,Tags,TokenCount)
+                VALUES (?, ?, ?, ?, ?, ?, ?,?, ?, ?, ?, ?, ?, ?, ?, ?,?,?)
+            """, (msg.msg_id, msg.session_id, msg.msg_type.value, msg.prev_msg_id, msg.sender, msg.target, msg.create_time, msg.topic,mentions,msg.body_mime,msg.body,action_name,action_params,action_result,msg.done_time,msg.status.value,str_tags,msg.token_count))
             conn.commit()
 
             if msg.inner_call_chain:
@@ -201,8 +224,8 @@ class ChatSessionDB:
             if limit == 0:
                 limit = 1024
 
-            cursor.execute("""
-                SELECT MessageID, SessionID, MsgType, PrevMsgID, SenderID, ReceiverID, Timestamp, Topic,Mentions,ContentMIME,Content,ActionName,ActionParams,ActionResult,DoneTime,Status FROM Messages
+            cursor.execute(f"""
+                SELECT {MESSAGE_COLUMNS},TokenCount FROM Messages
                 WHERE SessionID = ?
                 ORDER BY Timestamp 
                 LIMIT ? OFFSET ?
@@ -239,8 +262,8 @@ class ChatSessionDB:
             cursor = conn.cursor()
             if limit == 0:
                 limit = 1024
-            cursor.execute("""
-                SELECT MessageID, SessionID, MsgType, PrevMsgID, SenderID, ReceiverID, Timestamp, Topic,Mentions,ContentMIME,Content,ActionName,ActionParams,ActionResult,DoneTime,Status FROM Messages
+            cursor.execute(f"""
+                SELECT {MESSAGE_COLUMNS},TokenCount FROM Messages
                 WHERE SessionID = ?
                 ORDER BY Timestamp DESC
                 LIMIT ? OFFSET ?
@@ -267,6 +290,21 @@ class ChatSessionDB:
             logging.error("Error occurred while updating message status: %s", e)
             return -1  # return -1 if an error occurs
 
+    def update_message_token_counts(self, token_counts:List[Tuple[int,str]]):
+        """ set the token counts of messages, [(token_count, message_id)] """
+        try:
+            conn = self._get_conn()
+            conn.executemany("""
+                UPDATE Messages
+                SET TokenCount = ?
+                WHERE MessageID = ?
+            """, token_counts)
+            conn.commit()
+            return 0
+        except Error as e:
+            logging.error("Error occurred while updating message token count: %s", e)
+            return -1
+
     def update_session_summary(self, session_id, summarize_pos, summary):
         """ update the summary of a session """
         try:
@@ -452,10 +490,28 @@ class AIChatSession:
             agent_msg.result_str = msg[13]
             agent_msg.done_time = msg[14]
             agent_msg.status = AgentMsgStatus(msg[15])
+            agent_msg.token_count = msg[16]
 
             result.append(agent_msg)
         return result
 
+    def read_records(self, number:int=0,offset=0,order="revers") -> Tuple[List[str],List[int]]:
+        # the records of messages for the prompts and their token counts, in the order of read_history
+        msgs = self.read_history(number,offset,order)
+        records = []
+        token_counts = []
+        uncounted = []
+        for msg in msgs:
+            records.append(format_chat_record(msg))
+            if msg.token_count is None:
+                # inserted before the token counts are stored
+                msg.token_count = count_chat_record_tokens(msg)
+                uncounted.append((msg.token_count,msg.msg_id))
+            token_counts.append(msg.token_count)
+        if len(uncounted) > 0:
+            self.db.update_message_token_counts(uncounted)
+        return records,token_counts
+
     def append(self,msg:AgentMsg,tags:List[str] = None) -> None:
         msg.session_id = self.session_id
         self.db.insert_message(msg,tags)
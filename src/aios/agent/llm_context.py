@@ -5,9 +5,49 @@ import logging
 from typing import Optional,Set,List,Dict,Callable
 
 from ..proto.ai_function import AIFunction,AIAction, AIFunction2Action,SimpleAIAction
+from ..frame.token_counter import TokenCounter
 
 logger = logging.getLogger(__name__)
 
+# The functions and actions of a context compiled for the prompts: lookups by name, the inner function schemas
+# sorted by name and serialized once, and their token count of every model. A context rebuilds it only when its
+# version or the version of GlobaToolsLibrary changes (a function or action is added, removed or registered again),
+# the prompts share the schema list, don't change it.
+class CompiledFunctions:
+    def __init__(self,functions:List[AIFunction],actions:List[AIAction] = None,version:int = 0,library_version:int = 0) -> None:
+        self.version = version
+        self.library_version = library_version
+        self.functions : Dict[str,AIFunction] = {}
+        self.actions : Dict[str,AIAction] = {}
+        self.inner_functions : List[Dict] = []
+        self.schemas : Dict[str,str] = {} # name -> json of schema
+
+        library = GlobaToolsLibrary.get_instance()
+        for func in sorted(functions or [],key=lambda func: func.get_name()):
+            schema,schema_json = library.get_function_schema(func)
+            self.functions[func.get_name()] = func
+            self.inner_functions.append(schema)
+            self.schemas[func.get_name()] = schema_json
+        for action in actions or []:
+            self.actions[action.get_name()] = action
+
+        # same as json.dumps(self.inner_functions,ensure_ascii=False)
+        self.schema_json = "[" + ", ".join(self.schemas.values()) + "]"
+        self.token_counts : Dict[str,int] = {} # model_name -> token count of inner_functions
+
+    def get_token_count(self,model_name:str = None) -> int:
+        if len(self.inner_functions) == 0:
+            return 0
+        token_count = self.token_counts.get(model_name)
+        if token_count is None:
+            token_count = TokenCounter.count(self.schema_json,model_name)
+            self.token_counts[model_name] = token_count
+        return token_count
+
+    def set_to_prompt(self,prompt) -> None:
+        prompt.set_inner_functions(self.inner_functions,self.token_counts)
+
+
 class LLMProcessContext:
     def __init__(self) -> None:
         pass
@@ -17,23 +57,25 @@ class LLMProcessContext:
     def function2action(ai_func:AIFunction) -> AIAction:
         return AIFunction2Action(ai_func)
 
+    @staticmethod
+    def aifunction_to_inner_function(inner_func:AIFunction) -> Dict:
+        this_func = {}
+        this_func["name"] = inner_func.get_name()
+        this_func["description"] = inner_func.get_description()
+        this_func["parameters"] = inner_func.get_openai_parameters()
+        return this_func
+
     @staticmethod
     def aifunctions_to_inner_functions(all_inner_function:List[AIFunction]) -> List[Dict]:
         if all_inner_function is None:
             return []
         
-        result_func = []
-        result_len = 0
-        for inner_func in all_inner_function:
-            func_name = inner_func.get_name()
-            this_func = {}
-            this_func["name"] = func_name
-            this_func["description"] = inner_func.get_description()
-            this_func["parameters"] = inner_func.get_openai_parameters()
-            result_len += len(json.dumps(this_func,ensure_ascii=False)) / 4
-            result_func.append(this_func)
-        return result_func
+        # sorted by name, the function sets are python sets and the prompt prefix must be stable
+        return [LLMProcessContext.aifunction_to_inner_function(inner_func) for inner_func in sorted(all_inner_function,key=lambda func: func.get_name())]
     
+    def get_compiled_functions(self) -> CompiledFunctions:
+        # not cached, the contexts know when their functions change should override it
+        return CompiledFunctions(self.get_all_ai_functions(),self.get_all_ai_action())
     
     @abstractmethod
     def get_ai_function(self,func_name:str) -> AIFunction:
@@ -83,6 +125,9 @@ class GlobaToolsLibrary:
         self.all_tool_functions : Dict[str,AIFunction] = {}
         self.all_action_sets : Dict[str,Set[str]] = {}
         self.all_function_sets : Dict[str,Set[str]] = {}
+        # function id -> (function, schema, json of schema), the schemas of the registered functions are built once
+        self.function_schemas : Dict[str,tuple] = {}
+        self.version = 0
     
     def register_prset_context(self,preset_id:str,context) -> None:
         self.all_preset_context[preset_id] = context
@@ -95,12 +140,34 @@ class GlobaToolsLibrary:
             logger.warning(f"Tool function {function.get_id()} already exists! will be replaced!")
             
         self.all_tool_functions[function.get_id()] = function
+        self.function_schemas.pop(function.get_id(),None)
+        self.version += 1
+
+    def remove_tool_function(self,function_id:str) -> AIFunction:
+        function = self.all_tool_functions.pop(function_id,None)
+        self.function_schemas.pop(function_id,None)
+        if function is not None:
+            self.version += 1
+        return function
 
     def get_tool_function(self,function_name:str) -> AIFunction:
         return self.all_tool_functions.get(function_name)
 
+    def get_function_schema(self,function:AIFunction) -> tuple:
+        # (schema, json of schema) of the inner function
+        cached = self.function_schemas.get(function.get_id())
+        if cached is not None and cached[0] is function:
+            return cached[1],cached[2]
+
+        schema = LLMProcessContext.aifunction_to_inner_function(function)
+        schema_json = json.dumps(schema,ensure_ascii=False)
+        if self.all_tool_functions.get(function.get_id()) is function:
+            self.function_schemas[function.get_id()] = (function,schema,schema_json)
+        return schema,schema_json
+
     def register_function_set(self,set_name:str,function_set:Set[str]) -> None:
         self.all_function_sets[set_name] = function_set
+        self.version += 1
 
     def get_function_set(self,set_name:str) -> Set[str]:
         return self.all_function_sets.get(set_name)  
@@ -116,6 +183,9 @@ class SimpleLLMContext(LLMProcessContext):
         self.func_sets : Dict[str,Dict[str,AIFunction]] = {}
         self.actions: Dict[str,AIAction] = {}
         self.action_sets : Dict[str,Dict[str,AIAction]] = {}
+        # changed when a function or action is added or removed
+        self.version = 0
+        self.compiled_functions : CompiledFunctions = None
 
     def load_action_set_from_config(self,preset,config:Dict[str,str]) -> Dict:
         if preset is None:
@@ -211,10 +281,11 @@ class SimpleLLMContext(LLMProcessContext):
             
             self.values = self.parent.values
             self.values_callback = self.parent.values_callback
-            self.actions = self.parent.actions
-            self.functions = self.parent.functions
-            self.action_sets = self.parent.action_sets
-            self.func_sets = self.parent.func_sets
+            # the sets are changed by the config below, don't change the preset
+            self.actions = dict(self.parent.actions)
+            self.functions = dict(self.parent.functions)
+            self.action_sets = dict(self.parent.action_sets)
+            self.func_sets = dict(self.parent.func_sets)
 
         action_def:Dict= config.get("actions")
         if action_def:
@@ -254,6 +325,8 @@ class SimpleLLMContext(LLMProcessContext):
                     logger.error(f"load_from_config failed! load_function_set_from_config failed!")
                     return False
 
+        self.version += 1
+
         #values_def = config.get("values")
         #if values_def:
         #    for key,value in values_def.items():
@@ -271,15 +344,35 @@ class SimpleLLMContext(LLMProcessContext):
     def set_value(self,key:str,value:str):
         self.values[key] = value
 
+    def add_ai_function(self,func:AIFunction) -> None:
+        self.functions[func.get_id()] = func
+        self.version += 1
+
+    def remove_ai_function(self,func_id:str) -> AIFunction:
+        func = self.functions.pop(func_id,None)
+        if func is not None:
+            self.version += 1
+        return func
+
+    def add_ai_action(self,action:AIAction) -> None:
+        self.actions[action.get_id()] = action
+        self.version += 1
+
+    def remove_ai_action(self,action_id:str) -> AIAction:
+        action = self.actions.pop(action_id,None)
+        if action is not None:
+            self.version += 1
+        return action
+
+    def get_compiled_functions(self) -> CompiledFunctions:
+        library_version = GlobaToolsLibrary.get_instance().version
+        compiled = self.compiled_functions
+        if compiled is None or compiled.version != self.version or compiled.library_version != library_version:
+            self.compiled_functions = CompiledFunctions(self.get_all_ai_functions(),self.get_all_ai_action(),self.version,library_version)
+        return self.compiled_functions
+
     def get_ai_function(self,func_name:str) -> AIFunction:
-        for func in self.functions.values():
-            if func.get_name() == func_name:
-                return func
-        #for set_name in self.func_sets.keys():
-        #    func = self.func_sets[set_name].get(func_name)
-        #    if func is not None:
-        #        return func
-        return None
+        return self.get_compiled_functions().functions.get(func_name)
 
     def get_function_set(self,set_name:str = None) -> List[AIFunction]:
         if self.functions is None:
@@ -295,11 +388,7 @@ class SimpleLLMContext(LLMProcessContext):
 
     
     def get_ai_action(self,op_name:str) -> AIAction:
-        for action in self.actions.values():
-            if action.get_name() == op_name:
-                return action
-
-        return None
+        return self.get_compiled_functions().actions.get(op_name)
     
     def get_action_set(self,set_name:str = None) -> List[AIFunction]:
         if self.actions is None:
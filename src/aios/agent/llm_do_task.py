@@ -1,4 +1,4 @@
-from ..proto.compute_task_test import LLMPrompt,LLMResult,ComputeTaskResult,ComputeTaskResultCode
+from ..proto.compute_task_test import LLMPrompt,LLMResult,ComputeTaskResult,ComputeTaskResultCode,ComputeTaskPriority
 from ..proto.ai_function import AIFunction,AIAction,ActionNode
 from ..proto.agent_msg import AgentMsg,AgentMsgType
 from ..proto.agent_task import AgentTask, AgentTodo, AgentWorkLog
@@ -24,6 +24,7 @@ logger = logging.getLogger(__name__)
 class AgentTriageTaskList(LLMAgentBaseProcess):
     def __init__(self) -> None:
         super().__init__()
+        self.priority = ComputeTaskPriority.SELF_THINK
     
     
     async def load_from_config(self,config:dict) -> bool:
@@ -63,8 +64,8 @@ class AgentTriageTaskList(LLMAgentBaseProcess):
         if have_known_info:
             system_prompt_dict["known_info"] = known_info
 
-        prompt.inner_functions =LLMProcessContext.aifunctions_to_inner_functions(self.llm_context.get_all_ai_functions())
-        prompt.append_system_message(json.dumps(system_prompt_dict,ensure_ascii=False))
+        self.llm_context.get_compiled_functions().set_to_prompt(prompt)
+        prompt.append_system_message(self.dumps_system_prompt(system_prompt_dict))
         return prompt
 
 
@@ -93,6 +94,7 @@ class AgentTriageTaskList(LLMAgentBaseProcess):
 class AgentPlanTask(LLMAgentBaseProcess):
     def __init__(self) -> None:
         super().__init__()
+        self.priority = ComputeTaskPriority.SELF_THINK
 
     async def load_from_config(self, config: dict,is_load_default=True) -> bool:
         if await super().load_from_config(config) is False:
@@ -132,8 +134,8 @@ class AgentPlanTask(LLMAgentBaseProcess):
         if have_known_info:
             system_prompt_dict["known_info"] = known_info
 
-        prompt.inner_functions =LLMProcessContext.aifunctions_to_inner_functions(self.llm_context.get_all_ai_functions())
-        prompt.append_system_message(json.dumps(system_prompt_dict,ensure_ascii=False))
+        self.llm_context.get_compiled_functions().set_to_prompt(prompt)
+        prompt.append_system_message(self.dumps_system_prompt(system_prompt_dict))
         return prompt
         
 
@@ -165,6 +167,7 @@ class AgentPlanTask(LLMAgentBaseProcess):
 class AgentDo(LLMAgentBaseProcess):
     def __init__(self) -> None:
         super().__init__()
+        self.priority = ComputeTaskPriority.SELF_THINK
 
     async def load_from_config(self, config: dict,is_load_default=True) -> Coroutine[Any, Any, bool]:
         if await super().load_from_config(config) is False:
@@ -203,8 +206,8 @@ class AgentDo(LLMAgentBaseProcess):
         if have_known_info:
             system_prompt_dict["known_info"] = known_info
 
-        prompt.inner_functions =LLMProcessContext.aifunctions_to_inner_functions(self.llm_context.get_all_ai_functions())
-        prompt.append_system_message(json.dumps(system_prompt_dict,ensure_ascii=False))
+        self.llm_context.get_compiled_functions().set_to_prompt(prompt)
+        prompt.append_system_message(self.dumps_system_prompt(system_prompt_dict))
         return prompt
         
 
@@ -235,6 +238,7 @@ class AgentDo(LLMAgentBaseProcess):
 class AgentCheck(LLMAgentBaseProcess):
     def __init__(self) -> None:
         super().__init__()
+        self.priority = ComputeTaskPriority.SELF_THINK
 
     async def load_from_config(self, config: dict,is_load_default=True) -> Coroutine[Any, Any, bool]:
         if await super().load_from_config(config) is False:
@@ -273,8 +277,8 @@ class AgentCheck(LLMAgentBaseProcess):
         if have_known_info:
             system_prompt_dict["known_info"] = known_info
 
-        prompt.inner_functions =LLMProcessContext.aifunctions_to_inner_functions(self.llm_context.get_all_ai_functions())
-        prompt.append_system_message(json.dumps(system_prompt_dict,ensure_ascii=False))
+        self.llm_context.get_compiled_functions().set_to_prompt(prompt)
+        prompt.append_system_message(self.dumps_system_prompt(system_prompt_dict))
         return prompt
         
 
@@ -305,6 +309,7 @@ class AgentCheck(LLMAgentBaseProcess):
 class AgentReviewTask(LLMAgentBaseProcess):
     def __init__(self) -> None:
         super().__init__()
+        self.priority = ComputeTaskPriority.SELF_THINK
 
     
     async def load_from_config(self, config: dict,is_load_default=True) -> Coroutine[Any, Any, bool]:
@@ -345,8 +350,8 @@ class AgentReviewTask(LLMAgentBaseProcess):
         if have_known_info:
             system_prompt_dict["known_info"] = known_info
 
-        prompt.inner_functions =LLMProcessContext.aifunctions_to_inner_functions(self.llm_context.get_all_ai_functions())
-        prompt.append_system_message(json.dumps(system_prompt_dict,ensure_ascii=False))
+        self.llm_context.get_compiled_functions().set_to_prompt(prompt)
+        prompt.append_system_message(self.dumps_system_prompt(system_prompt_dict))
         return prompt
         
 
@@ -5,7 +5,7 @@ import os.path
 from .chatsession import AIChatSession
 from ..utils import video_utils,image_utils
 
-from ..proto.compute_task_test import LLMPrompt,LLMResult,ComputeTaskResult,ComputeTaskResultCode
+from ..proto.compute_task_test import LLMPrompt,LLMResult,ComputeTaskResult,ComputeTaskResultCode,ComputeTaskPriority
 from ..proto.ai_function import AIFunction,AIAction,ActionNode
 from ..proto.agent_msg import AgentMsg,AgentMsgType
 
@@ -14,14 +14,18 @@ from .workspace import AgentWorkspace
 from .llm_context import LLMProcessContext,GlobaToolsLibrary, SimpleLLMContext
 
 from ..frame.compute_kernel import ComputeKernel
+from ..frame.metrics import MetricsRegistry
+from ..frame.function_cache import AIFunctionResultCache
+from ..frame.context_packer import ContextPacker,ContextSegment
 from ..knowledge.knowledge_base import BaseKnowledgeGraph
 
 from abc import ABC,abstractmethod
+import asyncio
 import copy
 import json
 import datetime
 from datetime import datetime
-from typing import Any, Callable, Coroutine, Optional,Dict,Awaitable,List
+from typing import Any, Callable, Coroutine, Optional,Dict,Awaitable,List,Tuple
 from enum import Enum
 import logging
 
@@ -29,6 +33,11 @@ logger = logging.getLogger(__name__)
 
 MIN_PREDICT_TOKEN_LEN = 32
 
+# The segments of system prompt from the most stable to the most volatile. The providers cache the prompt by prefix,
+# so the role text and action schemas must come before the context (with "now") and the known info (chat record, worklogs).
+SYSTEM_PROMPT_SEGMENT_ORDER = ["role_description","process_rule","reply_format","support_actions","knowledge_graph","context","known_info"]
+VOLATILE_SYSTEM_PROMPT_SEGMENTS = ["context","known_info"]
+
 class BaseLLMProcess(ABC):
     def __init__(self) -> None:
         self.behavior:str = None #行为名字
@@ -37,6 +46,8 @@ class BaseLLMProcess(ABC):
         self.result_example:str = None #llm_result样例
 
         self.enable_json_resp = False
+        # the reply is plain text (no json, no ##/ actions, no **IGNORE**), only then the llm output is streamed to the tunnel
+        self.enable_stream_reply = False
         #None means system default,
         # TODO: support abcstract model name like: local-hight,local-low,local-medium,remote-hight,remote-low,remote-medium
         self.model_name = None
@@ -44,6 +55,13 @@ class BaseLLMProcess(ABC):
         self.max_prompt_token = 2000 # not include input prompt
         self.chat_summary_token_len = 500
         self.timeout = 1800 # 30 min
+        self.priority = ComputeTaskPriority.NORMAL
+        self.enable_llm_cache = False # cache the completion of same prompt, enable it if the process is idempotent
+        self.owner_id = None # the agent instance of the process, for the cost statistics
+        self.prompt_token_count = 0
+        self.cached_token_count = 0 # prompt tokens read from the prefix cache of provider
+        self.max_parallel_tool_calls = 4 # the tool calls of a turn running at the same time
+        self.tool_timeout = 120 # seconds of an inner function, None means no timeout
 
         self.llm_context:LLMProcessContext = None
 
@@ -66,8 +84,40 @@ class BaseLLMProcess(ABC):
     async def post_llm_process(self,actions:List[ActionNode],input:Dict,llm_result:LLMResult) -> bool:
         pass
 
+    # return a coroutine function to receive the deltas of completion, None means don't use stream mode
+    def get_stream_handler(self,input:Dict) -> Callable[[str],Awaitable]:
+        return None
+
+    @staticmethod
+    def dumps_system_prompt(system_prompt_dict:Dict) -> str:
+        # byte-identical for the same segments: stable segments first, the nested keys are sorted
+        def _segment_rank(key:str) -> int:
+            if key in SYSTEM_PROMPT_SEGMENT_ORDER:
+                return SYSTEM_PROMPT_SEGMENT_ORDER.index(key)
+            # unknown segments are placed before the volatile ones
+            return SYSTEM_PROMPT_SEGMENT_ORDER.index(VOLATILE_SYSTEM_PROMPT_SEGMENTS[0]) - 0.5
+
+        keys = sorted(system_prompt_dict.keys(),key=_segment_rank)
+        items = [f"{json.dumps(key,ensure_ascii=False)}: {json.dumps(system_prompt_dict[key],ensure_ascii=False,sort_keys=True)}" for key in keys]
+        return "{" + ", ".join(items) + "}"
+
+    def _record_prompt_cache(self,task_result:ComputeTaskResult):
+        prompt_tokens,cached_tokens = ComputeKernel.get_prompt_cache_usage(task_result)
+        if prompt_tokens == 0:
+            return
+        self.prompt_token_count += prompt_tokens
+        self.cached_token_count += cached_tokens
+        metric = MetricsRegistry.get_instance().counter("aios_llm_behavior_prompt_tokens_total","prompt tokens of llm processes, cached ones are read from the prefix cache of provider",["behavior","kind"])
+        metric.inc(prompt_tokens,behavior=self.behavior or "",kind="prompt")
+        metric.inc(cached_tokens,behavior=self.behavior or "",kind="cached")
+
+    def get_prompt_cache_hit_ratio(self) -> float:
+        if self.prompt_token_count == 0:
+            return 0.0
+        return self.cached_token_count / self.prompt_token_count
+
     def get_remain_prompt_length(self,prompt:LLMPrompt,will_append_str:str) -> int:
-        return self.max_prompt_token - ComputeKernel.llm_num_tokens(prompt,self.model_name)
+        return self.max_prompt_token - ComputeKernel.llm_num_tokens(prompt,self.model_name) - ComputeKernel.llm_num_tokens_from_text(will_append_str,self.model_name)
 
     @abstractmethod
     async def load_from_config(self,config:dict) -> bool:
@@ -80,10 +130,22 @@ class BaseLLMProcess(ABC):
             self.model_name = config.get("model_name")
         if config.get("enable_json_resp"):
             self.enable_json_resp = config.get("enable_json_resp") == "true"
+        if config.get("enable_stream_reply"):
+            self.enable_stream_reply = config.get("enable_stream_reply") == "true"
         if config.get("max_token"):
             self.max_token = config.get("max_token")
         if config.get("timeout"):
             self.timeout = config.get("timeout")
+        if config.get("priority"):
+            self.priority = ComputeTaskPriority[config.get("priority").upper()]
+        if config.get("enable_llm_cache"):
+            self.enable_llm_cache = config.get("enable_llm_cache") == "true"
+        if config.get("instance_id"):
+            self.owner_id = config.get("instance_id")
+        if config.get("max_parallel_tool_calls"):
+            self.max_parallel_tool_calls = int(config.get("max_parallel_tool_calls"))
+        if config.get("tool_timeout"):
+            self.tool_timeout = float(config.get("tool_timeout"))
 
 
         return True
@@ -96,27 +158,82 @@ class BaseLLMProcess(ABC):
         return content.format_map(env)
 
 
-    async def _execute_inner_func(self,inner_func_call_node:Dict,prompt: LLMPrompt,stack_limit = 1) -> ComputeTaskResult:
-        arguments = None
-        stack_limit = stack_limit - 1
+    async def _call_inner_func(self,func_name:str,arguments_str:str) -> Tuple[str,bool]:
+        # (result string, is ok), the error is returned to llm as the result
         try:
-            func_name = inner_func_call_node.get("name")
-            arguments = json.loads(inner_func_call_node.get("arguments"))
+            arguments = json.loads(arguments_str) if arguments_str else {}
             logger.info(f"LLMProcess execute inner func:{func_name} :({json.dumps(arguments,ensure_ascii=False)})")
 
             func_node : AIFunction = await self.get_inner_function_for_exec(func_name)
             if func_node is None:
-                result_str:str = f"execute {func_name} error,function not found"
+                return f"execute {func_name} error,function not found",False
+
+            self.prepare_inner_function_context_for_exec(func_name,arguments)
+            call = AIFunctionResultCache.get_instance().execute(func_node,arguments,lambda: func_node.execute(arguments))
+            if self.tool_timeout:
+                result_str:str = await asyncio.wait_for(call,self.tool_timeout)
             else:
-                self.prepare_inner_function_context_for_exec(func_name,arguments)
-                result_str:str = await func_node.execute(arguments)
+                result_str:str = await call
+        except asyncio.TimeoutError:
+            logger.error(f"LLMProcess execute inner func:{func_name} timeout after {self.tool_timeout}s")
+            return f"execute {func_name} error:timeout after {self.tool_timeout}s",False
         except Exception as e:
-            result_str = f"execute {func_name} error:{str(e)}"
             logger.error(f"LLMProcess execute inner func:{func_name} error:\n\t{e}")
+            return f"execute {func_name} error:{str(e)}",False
+
+        logger.info("LLMProcess execute inner func result:" + str(result_str))
+        return str(result_str),True
 
-        logger.info("LLMProcess execute inner func result:" + result_str)
+    @staticmethod
+    def _get_call_message(result_message:Dict) -> Dict:
+        # the assistant message which calls the inner functions, None if there is no call
+        if not result_message:
+            return None
+        call_msg = dict(result_message)
+        if result_message.get("tool_calls"):
+            call_msg.pop("function_call",None)
+            return call_msg
+        if result_message.get("function_call"):
+            call_msg.pop("tool_calls",None)
+            return call_msg
+        return None
 
+    async def _execute_calls(self,call_msg:Dict,prompt:LLMPrompt,stack_limit = 1,stream_handler:Callable[[str],Awaitable] = None) -> ComputeTaskResult:
+        prompt.messages.append(call_msg)
+        if call_msg.get("tool_calls"):
+            return await self._execute_tool_calls(call_msg["tool_calls"],prompt,stack_limit,stream_handler)
+        return await self._execute_inner_func(call_msg["function_call"],prompt,stack_limit,stream_handler)
+
+    async def _execute_inner_func(self,inner_func_call_node:Dict,prompt: LLMPrompt,stack_limit = 1,stream_handler:Callable[[str],Awaitable] = None) -> ComputeTaskResult:
+        # the legacy function_call, one function in a turn
+        func_name = inner_func_call_node.get("name")
+        result_str,is_ok = await self._call_inner_func(func_name,inner_func_call_node.get("arguments"))
         prompt.messages.append({"role":"function","content":result_str,"name":func_name})
+        return await self._followup_completion(prompt,stack_limit - 1,stream_handler)
+
+    async def _execute_tool_calls(self,tool_calls:List[Dict],prompt: LLMPrompt,stack_limit = 1,stream_handler:Callable[[str],Awaitable] = None) -> ComputeTaskResult:
+        # the tool calls in a turn are independent, they run at the same time and the results are sent in one completion
+        semaphore = asyncio.Semaphore(max(self.max_parallel_tool_calls,1))
+
+        async def _call(tool_call:Dict):
+            function = tool_call.get("function") or {}
+            async with semaphore:
+                return await self._call_inner_func(function.get("name"),function.get("arguments"))
+
+        results = await asyncio.gather(*[_call(tool_call) for tool_call in tool_calls])
+        failed_names = []
+        for tool_call,(result_str,is_ok) in zip(tool_calls,results):
+            func_name = (tool_call.get("function") or {}).get("name")
+            if not is_ok:
+                failed_names.append(func_name)
+            prompt.messages.append({"role":"tool","tool_call_id":tool_call.get("id"),"name":func_name,"content":result_str})
+        if len(failed_names) > 0:
+            logger.warning(f"LLMProcess {len(failed_names)} of {len(tool_calls)} tool calls failed:{failed_names}")
+
+        return await self._followup_completion(prompt,stack_limit - 1,stream_handler)
+
+    async def _followup_completion(self,prompt: LLMPrompt,stack_limit:int,stream_handler:Callable[[str],Awaitable] = None) -> ComputeTaskResult:
+        # send the results of inner functions to llm
         if self.enable_json_resp:
             resp_mode = "json"
         else:
@@ -141,25 +258,20 @@ class BaseLLMProcess(ABC):
             mode_name=self.get_llm_model_name(),
             max_token=max_result_token,
             inner_functions=inner_functions, #NOTICE: inner_function in prompt can be a subset of get_inner_function
-            timeout=self.timeout))
+            timeout=self.timeout,
+            priority=max(self.priority,ComputeTaskPriority.TOOL_FOLLOWUP),
+            cacheable=self.enable_llm_cache,
+            stream_handler=stream_handler,
+            owner_id=self.owner_id))
+        self._record_prompt_cache(task_result)
 
         if task_result.result_code != ComputeTaskResultCode.OK:
             logger.error(f"llm compute error:{task_result.error_str}")
             return task_result
 
-        inner_func_call_node = None
-
-        result_message : dict = task_result.result.get("message")
-        if result_message:
-            inner_func_call_node = result_message.get("function_call")
-            if inner_func_call_node:
-                func_msg = copy.deepcopy(result_message)
-                del func_msg["tool_calls"]#TODO: support tool_calls?
-                prompt.messages.append(func_msg)
-
-
-        if inner_func_call_node:
-            return await self._execute_inner_func(inner_func_call_node,prompt,stack_limit-1)
+        call_msg = self._get_call_message(task_result.result.get("message"))
+        if call_msg:
+            return await self._execute_calls(call_msg,prompt,stack_limit - 1,stream_handler)
         else:
             return task_result
 
@@ -178,6 +290,9 @@ class BaseLLMProcess(ABC):
         max_result_token = self.max_token - ComputeKernel.llm_num_tokens(prompt,self.get_llm_model_name())
         #if max_result_token < MIN_PREDICT_TOKEN_LEN:
         #    return LLMResult.from_error_str(f"prompt too long,can not predict")
+        stream_handler = None
+        if resp_mode == "text" and self.enable_stream_reply:
+            stream_handler = self.get_stream_handler(input)
         logger.info(f"do_llm_completion with max_result_token:{max_result_token},resp_mode:{resp_mode},prompt:{prompt}")
         task_result: ComputeTaskResult = await (ComputeKernel.get_instance().do_llm_completion(
                 prompt,
@@ -185,24 +300,22 @@ class BaseLLMProcess(ABC):
                 mode_name=self.get_llm_model_name(),
                 max_token=max_result_token,
                 inner_functions=prompt.inner_functions, #NOTICE: inner_function in prompt can be a subset of get_inner_function
-                timeout=self.timeout))
+                timeout=self.timeout,
+                priority=self.priority,
+                cacheable=self.enable_llm_cache,
+                stream_handler=stream_handler,
+                owner_id=self.owner_id))
+        self._record_prompt_cache(task_result)
 
         if task_result.result_code != ComputeTaskResultCode.OK:
             err_str = f"do_llm_completion error:{task_result.error_str}"
             logger.error(err_str)
             return LLMResult.from_error_str(err_str)
 
-        result_message = task_result.result.get("message")
-        inner_func_call_node = None
-        if result_message:
-            inner_func_call_node = result_message.get("function_call")
-
-        if inner_func_call_node:
-            call_prompt : LLMPrompt = copy.deepcopy(prompt)
-            func_msg = copy.deepcopy(result_message)
-            del func_msg["tool_calls"]
-            call_prompt.messages.append(func_msg)
-            task_result = await self._execute_inner_func(inner_func_call_node,call_prompt)
+        call_msg = self._get_call_message(task_result.result.get("message"))
+        if call_msg:
+            call_prompt : LLMPrompt = prompt.fork()
+            task_result = await self._execute_calls(call_msg,call_prompt,stream_handler=stream_handler)
 
         # parse task_result to LLM Result
         if self.enable_json_resp:
@@ -327,7 +440,9 @@ class LLMAgentBaseProcess(BaseLLMProcess):
         actions_list = []
 
         actions_list.extend(self.llm_context.get_all_ai_action())
-    
+        # the action sets are python sets, sort them to keep the prompt prefix stable
+        actions_list.sort(key=lambda action: action.get_name())
+
         for action in actions_list:
             result[action.get_name()] = action.get_description()
  
@@ -355,6 +470,7 @@ class LLMAgentBaseProcess(BaseLLMProcess):
 class AgentMessageProcess(LLMAgentBaseProcess):
     def __init__(self) -> None:
         super().__init__()
+        self.priority = ComputeTaskPriority.INTERACTIVE
         self.mutil_model = None
         self.enable_media2text = False
         self.is_mutil_model = False
@@ -364,6 +480,12 @@ class AgentMessageProcess(LLMAgentBaseProcess):
     async def load_default_config(self) -> bool:
         return True
 
+    def get_stream_handler(self,input:Dict) -> Callable[[str],Awaitable]:
+        msg : AgentMsg = input.get("msg")
+        if msg is None:
+            return None
+        return msg.stream_handler
+
     async def load_from_config(self, config: dict,is_load_default=True) -> Coroutine[Any, Any, bool]:
         if is_load_default:
             await self.load_default_config()
@@ -470,6 +592,12 @@ class AgentMessageProcess(LLMAgentBaseProcess):
         #content
         return await self.memory.load_chatlogs(msg,max_length_by_token)
 
+    async def load_chat_records(self,msg:AgentMsg) -> Tuple[List[str],List[int]]:
+        # oldest first, like
+        #sender,[2023-11-1 12:00:00]
+        #content
+        return await self.memory.load_chat_records(msg)
+
     async def get_chat_summary(self,msg:AgentMsg)->str:
         return await self.memory.get_chat_summary(msg)
 
@@ -505,30 +633,35 @@ class AgentMessageProcess(LLMAgentBaseProcess):
 
         system_prompt_dict["known_info"] = known_info
 
-        prompt.inner_functions =LLMProcessContext.aifunctions_to_inner_functions(self.llm_context.get_all_ai_functions())
+        self.llm_context.get_compiled_functions().set_to_prompt(prompt)
         if self.workspace:
             #TODO eanble workspace functions?
             logger.info(f"workspace is not none,enable workspace functions")
 
 
-        ### 根据Token Limit加载聊天记录
-        remain_token = self.get_remain_prompt_length(prompt,json.dumps(system_prompt_dict,ensure_ascii=False))
-        chat_record,is_all = await self.load_chatlogs(msg,remain_token - self.chat_summary_token_len)
-        if chat_record:
-            if len(chat_record) > 4:
-                known_info["chat_record"] = chat_record
-
-            if not is_all :
-                ### 如果出触发了Token Limit,则删除几条信息后，加载summary （summary的长度基本是固定的）
-                summary = await self.get_chat_summary(msg)
-                if summary:
-                    if len(summary) > 4:
-                        known_info["chat_summary"] = summary
+        ### 根据Token Limit加载聊天记录, the token counts of records are stored in the chat db
+        remain_token = self.get_remain_prompt_length(prompt,self.dumps_system_prompt(system_prompt_dict))
+        # 32 tokens for the json of the records in system prompt
+        packer = ContextPacker(remain_token - 32,self.model_name)
+        records,token_counts = await self.load_chat_records(msg)
+        packer.add_segment(ContextSegment("chat_record",records,token_counts,priority=1,truncate=ContextSegment.KEEP_NEWEST))
+        if sum(token_counts) > packer.token_budget:
+            ### 如果出触发了Token Limit,则删除几条信息后，加载summary （summary的长度基本是固定的）
+            summary = await self.get_chat_summary(msg)
+            if summary and len(summary) > 4:
+                packer.add_segment(ContextSegment("chat_summary",summary,priority=0,max_share=0.5,truncate=ContextSegment.CUT_TEXT))
+
+        packed = packer.pack()
+        chat_record = packed["chat_record"].to_str()
+        if len(chat_record) > 4:
+            known_info["chat_record"] = chat_record
+        if packed.get("chat_summary") and packed["chat_summary"].token_count > 0:
+            known_info["chat_summary"] = packed["chat_summary"].to_str()
 
         # TODO: extend known info
         #prompt.append_system_message(await self.get_extend_known_info(msg,prompt))
          
-        prompt.append_system_message(json.dumps(system_prompt_dict,ensure_ascii=False))
+        prompt.append_system_message(self.dumps_system_prompt(system_prompt_dict))
         return prompt
 
 
@@ -562,6 +695,7 @@ class AgentMessageProcess(LLMAgentBaseProcess):
 class AgentSelfThinking(LLMAgentBaseProcess):
     def __init__(self) -> None:
         super().__init__()
+        self.priority = ComputeTaskPriority.SELF_THINK
         
 
     async def load_from_config(self, config: dict) -> Coroutine[Any, Any, bool]:
@@ -569,48 +703,37 @@ class AgentSelfThinking(LLMAgentBaseProcess):
             return False
 
     async def _load_chat_history(self,token_limit:int):
-        chat_history = {}
+        # the summary and the messages after summarize_pos of every session, packed in the order of sessions
+        packer = ContextPacker(token_limit - 8,self.model_name)
+        chatsessions : List[AIChatSession] = []
         session_list = AIChatSession.list_session(self.memory.agent_id ,self.memory.memory_db)
-        total_read_msg = 0
-        for session_id in session_list:
+        for index,session_id in enumerate(session_list):
             chatsession = AIChatSession.get_session_by_id(session_id,self.memory.memory_db)
-            session_history = {}
-            session_history["summary"] = chatsession.summary
-            session_history["id"] = chatsession.session_id
-            token_limit -= ComputeKernel.llm_num_tokens_from_text(chatsession.summary,self.model_name)
-            read_history_msg = 0
-            
-            if token_limit > 8:
-                # load session chat history
-                cur_pos = chatsession.summarize_pos
-                messages = chatsession.read_history(0,cur_pos,"natural") # read
-                history_str = ""
-                for msg in messages:
-                    read_history_msg += 1
-                    total_read_msg += 1
-                    cur_pos += 1
-                    dt = datetime.fromtimestamp(float(msg.create_time))
-                    formatted_time = dt.strftime('%y-%m-%d %H:%M:%S')
-                    record_str = f"{msg.sender},[{formatted_time}]\n{msg.body}\n"
-                    token_limit -= ComputeKernel.llm_num_tokens_from_text(record_str,self.model_name)
-                    if token_limit < 8:
-                        break
-
-                    history_str = history_str + record_str
-
-                if ComputeKernel.llm_num_tokens_from_text(history_str,self.model_name) > self.chat_summary_token_len:
-                    session_history["history"] = history_str
-                    chat_history[session_id] = session_history
-                    chatsession.summarize_pos = cur_pos
+            records,token_counts = chatsession.read_records(0,chatsession.summarize_pos,"natural")
+            packer.add_segment(ContextSegment(f"{session_id}.summary",chatsession.summary or [],priority=index * 2,truncate=ContextSegment.DROP))
+            packer.add_segment(ContextSegment(f"{session_id}.history",records,token_counts,priority=index * 2 + 1,truncate=ContextSegment.KEEP_OLDEST))
+            chatsessions.append(chatsession)
+
+        packed = packer.pack()
+        chat_history = {}
+        total_read_msg = 0
+        for chatsession in chatsessions:
+            history = packed[f"{chatsession.session_id}.history"]
+            total_read_msg += len(history.items)
+            # the summary is sent with the history
+            if history.token_count > self.chat_summary_token_len and packed[f"{chatsession.session_id}.summary"].is_complete:
+                session_history = {}
+                session_history["summary"] = chatsession.summary
+                session_history["id"] = chatsession.session_id
+                session_history["history"] = history.to_str()
+                chat_history[chatsession.session_id] = session_history
+                chatsession.summarize_pos += len(history.items)
 
-            else:
-                logger.info(f"load_chat_history reach token limit,load {total_read_msg} history messages.")
-                return chat_history
-            
         if total_read_msg < 2:
             logger.info(f"load_chat_history: no history messages,return NONE")
             return None
         
+        logger.info(f"load_chat_history load {total_read_msg} history messages.")
         return chat_history   
                 
 
@@ -622,15 +745,15 @@ class AgentSelfThinking(LLMAgentBaseProcess):
         system_prompt_dict = self.prepare_role_system_prompt(context_info)
 
         # Known_info is the SESSION summary of the existence, the current task work record summary,
-        token_remain = self.get_remain_prompt_length(prompt,json.dumps(system_prompt_dict,ensure_ascii=False))
+        token_remain = self.get_remain_prompt_length(prompt,self.dumps_system_prompt(system_prompt_dict))
         chat_history = await self._load_chat_history(token_remain)
         if chat_history is None:
             logger.info(f"prepare_prompt: no history messages,return NONE")
             return None
         
-        prompt.inner_functions =LLMProcessContext.aifunctions_to_inner_functions(self.llm_context.get_all_ai_functions())
+        self.llm_context.get_compiled_functions().set_to_prompt(prompt)
         
-        prompt.append_system_message(json.dumps(system_prompt_dict,ensure_ascii=False))
+        prompt.append_system_message(self.dumps_system_prompt(system_prompt_dict))
         prompt.append_user_message(json.dumps(chat_history,ensure_ascii=False))
         return prompt 
 
@@ -652,6 +775,7 @@ class AgentSelfThinking(LLMAgentBaseProcess):
 class AgentSelfLearning(BaseLLMProcess):
     def __init__(self) -> None:
         super().__init__()
+        self.priority = ComputeTaskPriority.PIPELINE
 
     async def load_from_config(self, config: dict) -> Coroutine[Any, Any, bool]:
         if await super().load_from_config(config) is False:
@@ -670,6 +794,7 @@ class AgentSelfLearning(BaseLLMProcess):
 class AgentSelfImprove(BaseLLMProcess):
     def __init__(self) -> None:
         super().__init__()
+        self.priority = ComputeTaskPriority.SELF_THINK
 
 
 
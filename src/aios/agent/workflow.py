@@ -18,6 +18,7 @@ from .role import AIRole,AIRoleGroup
 
 from ..frame.compute_kernel import ComputeKernel
 from ..frame.bus import AIBus
+from ..frame.function_cache import AIFunctionResultCache
 
 from ..environment.environment import BaseEnvironment
 from ..environment.workflow_env import WorkflowEnvironment
@@ -299,9 +300,12 @@ class Workflow:
         if self.workflow_env is None:
             return
 
+        # the messages may be shared by other prompts, replace them
+        formated_messages = []
         for msg in prompt.messages:
             old_content = msg.get("content")
-            msg["content"] = old_content.format_map(self.workflow_env)
+            formated_messages.append({**msg,"content":old_content.format_map(self.workflow_env)})
+        prompt.messages = formated_messages
 
     def _get_inner_functions(self,the_role:AIRole) -> dict:
         all_inner_function = self.workflow_env.get_all_ai_functions()
@@ -338,7 +342,7 @@ class Workflow:
             result_str = f"execute {func_name} failed,function not found"
         else:
             try:
-                result_str = await func_node.execute(**arguments)
+                result_str = await AIFunctionResultCache.get_instance().execute(func_node,arguments,lambda: func_node.execute(**arguments))
             except Exception as e:
                 result_str = f"execute {func_name} error:{str(e)}"
                 logger.error(f"llm execute inner func:{func_name} error:{e}")
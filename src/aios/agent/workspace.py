@@ -9,7 +9,7 @@ from typing import List, Optional
 import aiofiles
 
 from  ..proto.agent_msg import AgentMsg
-from ..proto.ai_function import AIFunction, ParameterDefine,SimpleAIFunction,ActionNode,SimpleAIAction
+from ..proto.ai_function import AIFunction, ParameterDefine,SimpleAIFunction,ActionNode,SimpleAIAction,CacheableResult
 from ..proto.agent_task import AgentTask, AgentTaskState,AgentTodo,AgentWorkLog,AgentTaskManager
 from ..storage.storage import AIStorage
 from ..frame.bus import AIBus
@@ -18,6 +18,10 @@ from .llm_context import GlobaToolsLibrary
 import logging
 logger = logging.getLogger(__name__)
 
+# the results of reading the task files are cached a short time, the write functions drop them
+TASK_FILE_CACHE_TTL = 30
+TASK_FILE_READ_FUNCTIONS = ["agent.workspace.read_file","agent.workspace.list_dir"]
+
 class LocalAgentTaskManger(AgentTaskManager):
     def __init__(self, owner_id):
         super().__init__() 
@@ -423,6 +427,10 @@ class AgentWorkspace:
         self.owner_id : str = owner_id
         self.task_mgr : AgentTaskManager = LocalAgentTaskManger(owner_id)
 
+    def get_cache_identity(self) -> str:
+        # the key of workspace in the cached function results
+        return self.owner_id
+
     @staticmethod
     def register_ai_functions():
         async def post_message(parameters):
@@ -710,7 +718,7 @@ class AgentWorkspace:
         })
         write_task_file_ai_function = SimpleAIFunction("agent.workspace.write_file",
                                               "write file for task",
-                                               write_task_file,parameters)
+                                               write_task_file,parameters,invalidate_functions=TASK_FILE_READ_FUNCTIONS)
         GlobaToolsLibrary.get_instance().register_tool_function(write_task_file_ai_function)
 
         # append file
@@ -729,7 +737,7 @@ class AgentWorkspace:
         })
         append_task_file_ai_function = SimpleAIFunction("agent.workspace.append_file",
                                               "append file for task",
-                                               append_task_file,parameters)
+                                               append_task_file,parameters,invalidate_functions=TASK_FILE_READ_FUNCTIONS)
         GlobaToolsLibrary.get_instance().register_tool_function(append_task_file_ai_function)
 
         # read file
@@ -740,13 +748,15 @@ class AgentWorkspace:
             task_id = parameters.get("task_id")
             path = parameters.get("filename")
             content = await _workspace.task_mgr.read_task_file(task_id,path)
-            return content
+            if content is None:
+                return content
+            return CacheableResult(content)
         parameters = ParameterDefine.create_parameters({
             "filename": {"type": "string", "description": "filename"},
         })
         read_task_file_ai_function = SimpleAIFunction("agent.workspace.read_file",
                                               "read file for task",
-                                               read_task_file,parameters)
+                                               read_task_file,parameters,cache_ttl=TASK_FILE_CACHE_TTL)
         GlobaToolsLibrary.get_instance().register_tool_function(read_task_file_ai_function)
 
         # list dir
@@ -757,13 +767,15 @@ class AgentWorkspace:
             task_id = parameters.get("task_id")
             path = parameters.get("path")
             content = await _workspace.task_mgr.list_task_dir(task_id,path)
-            return content
+            if content is None:
+                return content
+            return CacheableResult(str(content))
         parameters = ParameterDefine.create_parameters({
             "path": {"type": "string", "description": "The relative path of the dir"},
         })
         list_task_dir_ai_function = SimpleAIFunction("agent.workspace.list_dir",
                                               "list dir in task workspace",
-                                               list_task_dir,parameters)
+                                               list_task_dir,parameters,cache_ttl=TASK_FILE_CACHE_TTL)
         GlobaToolsLibrary.get_instance().register_tool_function(list_task_dir_ai_function)
 
         # remove file
@@ -780,7 +792,7 @@ class AgentWorkspace:
         })
         remove_task_file_ai_function = SimpleAIFunction("agent.workspace.remove_file",
                                               "remove file for task",
-                                               remove_task_file,parameters)
+                                               remove_task_file,parameters,invalidate_functions=TASK_FILE_READ_FUNCTIONS)
         GlobaToolsLibrary.get_instance().register_tool_function(remove_task_file_ai_function)
 
 
@@ -52,7 +52,7 @@ class GetTableInfosFunction(AIFunction):
         database = get_database(database_url)
         tables = database.get_usable_table_names()
         table_infos = database.get_table_info(tables)
-        return table_infos
+        return CacheableResult(table_infos)
 
     def is_local(self) -> bool:
         return True
@@ -61,7 +61,10 @@ class GetTableInfosFunction(AIFunction):
         return True
 
     def is_ready_only(self) -> bool:
-        return False
+        return True
+
+    def get_cache_ttl(self) -> float:
+        return 600
 
 
 class ExecuteSqlFunction(AIFunction):
@@ -111,3 +114,7 @@ class ExecuteSqlFunction(AIFunction):
 
     def is_ready_only(self) -> bool:
         return False
+
+    def get_invalidate_functions(self) -> List[str]:
+        # the sql may change the tables
+        return ["get_table_infos"]
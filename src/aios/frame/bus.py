@@ -12,7 +12,7 @@ class AIBusHandler:
     def __init__(self,handler:Coroutine,owner_bus,enable_defualt_proc=True) -> None:
         self.handler = handler
         self.working_task = None
-        self.results = {} # recv resps
+        self.waiters = {} # msg_id -> Future resolved by the resp
         self.queue:Queue = Queue()
         self.enable_defualt_proc = enable_defualt_proc
         self.owner_bus = owner_bus
@@ -42,6 +42,7 @@ class AIBus:
     def __init__(self) -> None:
         self.handlers:Dict[AIBusHandler] = {}
         self.unhandle_handler:Coroutine = None
+        self.send_timeout = 240 # seconds
 
 
     async def post_message(self,msg:AgentMsg,target_id = None,use_unhandle=True) -> bool:
@@ -53,7 +54,12 @@ class AIBus:
         handler = self.handlers.get(target_id)
         if handler:
             if msg.rely_msg_id is not None:
-                handler.results[msg.rely_msg_id] = msg
+                waiter = handler.waiters.pop(msg.rely_msg_id, None)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(msg)
+                else:
+                    # no one waits for it (posted msg or send_message timeout), don't keep the resp
+                    logger.info(f"no sender is waiting for resp of {msg.rely_msg_id}, dropped")
                 return None
 
             handler.queue.put_nowait(msg)
@@ -83,26 +89,25 @@ class AIBus:
             logger.warn(f"sender {sender_id} not register on AI_BUS!")
             return None
 
+        # wake up when the resp is posted, instead of checking the results every 0.2s
+        waiter = asyncio.get_event_loop().create_future()
+        sender_handler.waiters[msg.msg_id] = waiter
         post_result = await self.post_message(msg,target_id)
         if post_result is False:
+            sender_handler.waiters.pop(msg.msg_id, None)
             return None
 
-        retry_times = 0
-        while True:
-            resp : AgentMsg = sender_handler.results.get(msg.msg_id)
-            if resp is not None:
-                msg.resp_msg = resp
-                msg.status = AgentMsgStatus.RESPONSED
-                del sender_handler.results[msg.msg_id]
-                return resp
-
-            await asyncio.sleep(0.2)
-            retry_times += 1
-            if retry_times > 5*240: # default timeout is 240 sec
-                msg.status = AgentMsgStatus.ERROR
-                return None
+        try:
+            resp : AgentMsg = await asyncio.wait_for(waiter, self.send_timeout)
+        except asyncio.TimeoutError:
+            msg.status = AgentMsgStatus.ERROR
+            return None
+        finally:
+            sender_handler.waiters.pop(msg.msg_id, None)
 
-        return None
+        msg.resp_msg = resp
+        msg.status = AgentMsgStatus.RESPONSED
+        return resp
 
     def register_unhandle_message_handler(self,handler:Any) -> Queue:
         self.unhandle_handler = handler
@@ -0,0 +1,54 @@
+from typing import Dict, List, Tuple
+
+from ..proto.compute_task import ComputeTask, ComputeTaskType
+from .compute_node import ComputeNode
+
+# Index of compute nodes by the capabilities they declared, key is (ComputeTaskType, model_name).
+# model_name None in a capability means the node supports any model of the task type.
+# The nodes which don't declare capabilities are checked by node.is_support(task) when looking up.
+class ComputeCapabilityIndex:
+    def __init__(self) -> None:
+        self.model_index : Dict[Tuple[ComputeTaskType, str], List[ComputeNode]] = {}
+        self.type_index : Dict[ComputeTaskType, List[ComputeNode]] = {}
+        self.dynamic_nodes : List[ComputeNode] = []
+
+    def rebuild(self, nodes: List[ComputeNode]) -> None:
+        self.model_index = {}
+        self.type_index = {}
+        self.dynamic_nodes = []
+
+        for node in nodes:
+            if not node.enable:
+                continue
+
+            capabilities = node.get_capabilities()
+            if capabilities is None:
+                self.dynamic_nodes.append(node)
+                continue
+
+            for task_type, model_name in capabilities:
+                self._add_node(self.model_index, (task_type, model_name), node)
+                self._add_node(self.type_index, task_type, node)
+
+    @staticmethod
+    def _add_node(index: dict, key, node: ComputeNode):
+        node_list = index.get(key)
+        if node_list is None:
+            index[key] = [node]
+        elif node not in node_list:
+            node_list.append(node)
+
+    def get_support_nodes(self, task: ComputeTask) -> List[ComputeNode]:
+        model_name = task.params.get("model_name")
+        if model_name:
+            result = list(self.model_index.get((task.task_type, model_name), []))
+            for node in self.model_index.get((task.task_type, None), []):
+                if node not in result:
+                    result.append(node)
+        else:
+            result = list(self.type_index.get(task.task_type, []))
+
+        for node in self.dynamic_nodes:
+            if node.is_support(task) is True:
+                result.append(node)
+        return result
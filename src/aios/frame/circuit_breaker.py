@@ -0,0 +1,107 @@
+import time
+import logging
+from enum import Enum
+
+logger = logging.getLogger(__name__)
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+# Stop sending tasks to a compute node which keeps failing.
+# CLOSED: the node is healthy. It's tripped to OPEN after failure_threshold consecutive failures,
+# or the error rate of the recent min_samples tasks is higher than error_rate_threshold.
+# OPEN: no task is scheduled to the node until open_duration passed, then it's HALF_OPEN.
+# HALF_OPEN: only one probe task is sent, the node is CLOSED if it succeeds, or OPEN again with doubled open_duration.
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, error_rate_threshold: float = 0.5, min_samples: int = 10,
+                 open_duration: float = 30.0, max_open_duration: float = 600.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_samples = min_samples
+        self.open_duration = open_duration
+        self.max_open_duration = max_open_duration
+
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self.recent_results = [] # is_ok of the recent min_samples tasks
+        self.open_until : float = None
+        self.current_open_duration = open_duration
+        self.probe_in_flight = False
+        self.trip_count = 0
+
+    def _update_state(self, now: float):
+        if self.state == CircuitState.OPEN and now >= self.open_until:
+            self.state = CircuitState.HALF_OPEN
+            self.probe_in_flight = False
+
+    def is_available(self) -> bool:
+        # can a task be scheduled to the node now, the state is not changed by a check
+        self._update_state(time.monotonic())
+        if self.state == CircuitState.CLOSED:
+            return True
+        if self.state == CircuitState.HALF_OPEN:
+            return not self.probe_in_flight
+        return False
+
+    def on_dispatch(self) -> None:
+        if self.state == CircuitState.HALF_OPEN:
+            self.probe_in_flight = True
+
+    def on_cancel(self) -> None:
+        # the probe is cancelled, let another task probe
+        if self.state == CircuitState.HALF_OPEN:
+            self.probe_in_flight = False
+
+    def record(self, is_ok: bool) -> None:
+        self.recent_results.append(is_ok)
+        if len(self.recent_results) > self.min_samples:
+            self.recent_results.pop(0)
+
+        if self.state == CircuitState.HALF_OPEN:
+            if is_ok:
+                self._close()
+            else:
+                self._open(self.current_open_duration * 2)
+            return
+
+        if is_ok:
+            self.consecutive_failures = 0
+            return
+
+        self.consecutive_failures += 1
+        if self.state == CircuitState.CLOSED and self._should_trip():
+            self._open(self.open_duration)
+
+    def _should_trip(self) -> bool:
+        if self.consecutive_failures >= self.failure_threshold:
+            return True
+        if len(self.recent_results) >= self.min_samples:
+            error_rate = self.recent_results.count(False) / len(self.recent_results)
+            return error_rate > self.error_rate_threshold
+        return False
+
+    def _open(self, duration: float):
+        self.current_open_duration = min(duration, self.max_open_duration)
+        self.state = CircuitState.OPEN
+        self.open_until = time.monotonic() + self.current_open_duration
+        self.probe_in_flight = False
+        self.trip_count += 1
+        logger.warning(f"circuit breaker is open for {self.current_open_duration}s")
+
+    def _close(self):
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self.recent_results = []
+        self.current_open_duration = self.open_duration
+        self.probe_in_flight = False
+        logger.info("circuit breaker is closed")
+
+    def to_dict(self) -> dict:
+        self._update_state(time.monotonic())
+        return {
+            "state": self.state.value,
+            "consecutive_failures": self.consecutive_failures,
+            "trip_count": self.trip_count,
+        }
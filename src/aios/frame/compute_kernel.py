@@ -1,16 +1,30 @@
 from abc import ABC, abstractmethod
-import random
-from typing import Optional
+from collections import deque
+import time
+import copy
+import json
+import hashlib
+import uuid
+from typing import List,Optional,Callable,Awaitable,AsyncIterator
 import logging
 import asyncio
-import tiktoken
-from asyncio import Queue
+import litellm
 
 from ..proto.compute_task_test import *
 from ..knowledge import ObjectID
 from ..storage.storage import AIStorage
 
 from .compute_node import ComputeNode
+from .compute_task_queue import ComputeTaskQueue
+from .compute_node_stats import ComputeNodeStats
+from .circuit_breaker import CircuitBreaker
+from .capability_index import ComputeCapabilityIndex
+from .llm_cache import LLMCompletionCache
+from .token_counter import TokenCounter
+from .embedding_batcher import EmbeddingBatcher
+from .metrics import MetricsRegistry
+from .token_budget import TokenBudgetScheduler
+from .schedule_policy import SchedulePolicy,WeightedRandomSchedulePolicy,CheapestSchedulePolicy
 
 logger = logging.getLogger(__name__)
 
@@ -23,24 +37,236 @@ class ComputeKernel:
     @classmethod
     def get_instance(cls):
         if cls._instance is None:
-            cls._instance = ComputeKernel()
+            cls._instance = ComputeKernel(MetricsRegistry.get_instance())
         return cls._instance
 
-    def __init__(self) -> None:
+    def __init__(self, metrics: MetricsRegistry = None) -> None:
         self.is_start = False
-        self.task_queue = Queue()
+        self.task_queue = ComputeTaskQueue()
         self.is_start = False
         self.compute_nodes = {}
+        self.capability_index = ComputeCapabilityIndex()
+        self.node_stats = {}
+        self.circuit_breakers = {} # node_id -> CircuitBreaker
+
+        self.default_schedule_policy : SchedulePolicy = WeightedRandomSchedulePolicy()
+        self.schedule_policies = {} # ComputeTaskPriority -> SchedulePolicy
+        self.llm_cache : LLMCompletionCache = None
+
+        # single-flight: identical tasks running at the same time share the result of the first one
+        self.enable_coalesce = True
+        self.inflight_tasks = {} # task key -> leader ComputeTask
+        self.coalesced_count = 0
+
+        # the concurrent TEXT_EMBEDDING tasks of the same model are sent to the node in one batch
+        self.enable_embedding_batch = True
+        self.embedding_batcher = EmbeddingBatcher(self.run)
+
+        # hedged requests: the tasks of these priorities are sent to another node too,
+        # if there is no result after the p95 latency of the first node. the first successful result is used
+        self.hedge_priorities = set() # ComputeTaskPriority
+        self.hedge_percentile = 0.95
+        self.hedge_min_delay = 0.2
+        self.hedge_default_delay = 2.0 # used before the node has latency samples
+        self.hedged_count = 0
+
+        # fair share of tokens and the token quotas of agents
+        self.enable_fair_share = True
+        self.token_budget = TokenBudgetScheduler()
+
+        # the global instance exposes the metrics by MetricsRegistry.get_instance()
+        self.metrics = metrics or MetricsRegistry()
+        self.token_rate_window = 60 # seconds
+        self.token_events = deque() # (time.monotonic(), prompt tokens, completion tokens) in the window
+        self._init_metrics()
+
+    def _init_metrics(self):
+        self.task_latency_metric = self.metrics.histogram("aios_task_latency_seconds", "latency of the tasks dispatched to compute nodes, including the waiting time in node", ["task_type", "model", "node"])
+        self.task_count_metric = self.metrics.counter("aios_tasks_total", "tasks finished by compute nodes", ["task_type", "model", "node", "result"])
+        self.timeout_metric = self.metrics.counter("aios_task_timeouts_total", "tasks timeout or expired before the result", ["task_type", "model"])
+        self.llm_token_metric = self.metrics.counter("aios_llm_tokens_total", "llm tokens, direction is prompt or completion", ["model", "direction"])
+        self.llm_cached_token_metric = self.metrics.counter("aios_llm_cached_tokens_total", "prompt tokens read from the prefix cache of provider", ["model"])
+        self.llm_cost_metric = self.metrics.counter("aios_llm_cost_usd_total", "llm cost in USD by the agent created the task", ["agent", "model"])
+        self.metrics.add_collector(self._collect_metrics)
+
+    def _collect_metrics(self):
+        self.metrics.gauge("aios_kernel_queue_length", "tasks waiting in the queue of compute kernel").set(self.task_queue.qsize())
+        in_flight_metric = self.metrics.gauge("aios_node_in_flight", "tasks running on compute node", ["node"])
+        capacity_metric = self.metrics.gauge("aios_node_capacity", "free worker slots of compute node", ["node"])
+        circuit_metric = self.metrics.gauge("aios_node_circuit_open", "1 if the circuit breaker of compute node is not closed", ["node"])
+        for node in self.compute_nodes.values():
+            in_flight_metric.set(node.get_in_flight(), node=node.node_id)
+            capacity_metric.set(node.get_capacity() or 0, node=node.node_id)
+            circuit_metric.set(0 if self.get_circuit_breaker(node.node_id).to_dict()["state"] == "closed" else 1, node=node.node_id)
+
+        budget_used_metric = self.metrics.counter("aios_owner_tokens_total", "llm tokens used by the agents and workflows", ["owner"])
+        budget_balance_metric = self.metrics.gauge("aios_owner_token_balance", "token quota balance of the agents and workflows", ["owner"])
+        for owner_id, budget in self.token_budget.budgets.items():
+            budget_used_metric.set_total(budget.used_tokens, owner=owner_id)
+            balance = budget.get_balance()
+            if balance is not None:
+                budget_balance_metric.set(balance, owner=owner_id)
+
+        token_rate_metric = self.metrics.gauge("aios_llm_tokens_per_second", f"llm tokens per second in the last {self.token_rate_window} seconds", ["direction"])
+        prompt_rate, completion_rate = self.get_token_rate()
+        token_rate_metric.set(prompt_rate, direction="prompt")
+        token_rate_metric.set(completion_rate, direction="completion")
+
+        if self.llm_cache is not None:
+            cache_stats = self.llm_cache.get_stats()
+            cache_metric = self.metrics.counter("aios_llm_cache_requests_total", "llm cache lookups", ["result"])
+            cache_metric.set_total(cache_stats["hit_count"], result="hit")
+            cache_metric.set_total(cache_stats["miss_count"], result="miss")
+            self.metrics.gauge("aios_llm_cache_hit_rate", "hit rate of llm cache").set(cache_stats["hit_rate"])
+
+        self.metrics.counter("aios_coalesced_tasks_total", "tasks attached to a running identical task").set_total(self.coalesced_count)
+        self.metrics.counter("aios_hedged_tasks_total", "hedge copies sent to another node").set_total(self.hedged_count)
+        batch_stats = self.embedding_batcher.get_stats()
+        self.metrics.counter("aios_embedding_batches_total", "batched TEXT_EMBEDDING tasks").set_total(batch_stats["batch_count"])
+        self.metrics.counter("aios_embedding_batch_inputs_total", "inputs of the batched TEXT_EMBEDDING tasks").set_total(batch_stats["input_count"])
+
+    def get_token_rate(self):
+        # (prompt tokens, completion tokens) per second in the window
+        now = time.monotonic()
+        while len(self.token_events) > 0 and self.token_events[0][0] < now - self.token_rate_window:
+            self.token_events.popleft()
+        prompt_tokens = sum(event[1] for event in self.token_events)
+        completion_tokens = sum(event[2] for event in self.token_events)
+        return prompt_tokens / self.token_rate_window, completion_tokens / self.token_rate_window
+
+    @staticmethod
+    def get_token_usage(task: ComputeTask):
+        # (prompt tokens, completion tokens) from the token_usage of result, estimated if the node doesn't return it (stream mode)
+        token_usage = task.result.result_refers.get("token_usage") if task.result is not None else None
+        if isinstance(token_usage, dict):
+            return token_usage.get("prompt_tokens") or 0, token_usage.get("completion_tokens") or 0
+        if token_usage is not None and hasattr(token_usage, "prompt_tokens"):
+            return token_usage.prompt_tokens or 0, token_usage.completion_tokens or 0
+
+        prompt_tokens = task.token_count if task.token_count is not None else ComputeKernel.estimate_task_tokens(task)
+        result_str = task.result.result_str if task.result is not None else None
+        completion_tokens = TokenCounter.count(result_str, task.params.get("model_name")) if isinstance(result_str, str) else 0
+        return prompt_tokens, completion_tokens
+
+    @staticmethod
+    def get_prompt_cache_usage(result: ComputeTaskResult):
+        # (prompt tokens, cached prompt tokens) reported by the node, (0, 0) if unknown
+        token_usage = result.result_refers.get("token_usage") if result is not None else None
+        if token_usage is None:
+            return 0, 0
+        if not isinstance(token_usage, dict):
+            token_usage = token_usage.model_dump() if hasattr(token_usage, "model_dump") else vars(token_usage)
+        prompt_tokens = token_usage.get("prompt_tokens") or 0
+        # openai: prompt_tokens_details.cached_tokens, anthropic style: cache_read_input_tokens, llama.cpp: tokens_cached
+        details = token_usage.get("prompt_tokens_details")
+        cached_tokens = details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", None)
+        if cached_tokens is None:
+            cached_tokens = token_usage.get("cache_read_input_tokens") or token_usage.get("tokens_cached")
+        return prompt_tokens, cached_tokens or 0
+
+    def _record_task_metrics(self, task: ComputeTask, node: ComputeNode, latency: float):
+        task_type = task.task_type.value
+        model_name = task.params.get("model_name") or ""
+        if task.is_succeeded():
+            result = "ok"
+        elif task.result is not None and task.result.result_code == ComputeTaskResultCode.TIMEOUT:
+            # expired in the queue of node, or when running
+            result = "timeout"
+            self._record_timeout(task)
+        else:
+            result = "error"
+        self.task_latency_metric.observe(latency, task_type=task_type, model=model_name, node=node.node_id)
+        self.task_count_metric.inc(task_type=task_type, model=model_name, node=node.node_id, result=result)
+
+        if task.task_type != ComputeTaskType.LLM_COMPLETION or not task.is_succeeded():
+            return
+        prompt_tokens, completion_tokens = self.get_token_usage(task)
+        self.llm_token_metric.inc(prompt_tokens, model=model_name, direction="prompt")
+        self.llm_token_metric.inc(completion_tokens, model=model_name, direction="completion")
+        cached_tokens = self.get_prompt_cache_usage(task.result)[1]
+        if cached_tokens > 0:
+            self.llm_cached_token_metric.inc(cached_tokens, model=model_name)
+        self.token_events.append((time.monotonic(), prompt_tokens, completion_tokens))
+        if task.fair_tag is not None:
+            self.token_budget.charge(task, prompt_tokens + completion_tokens)
+        cost = self.llm_completion_cost(model_name, prompt_tokens, completion_tokens)
+        if cost > 0:
+            self.llm_cost_metric.inc(cost, agent=task.owner_id or "", model=model_name)
+
+    def _record_timeout(self, task: ComputeTask):
+        self.timeout_metric.inc(task_type=task.task_type.value, model=task.params.get("model_name") or "")
 
     def run(self, task: ComputeTask) -> None:
         # check there is compute node can support this task
         if self.is_task_support(task) is False:
             logger.error(
                 f"task {task.display()} is not support by any compute node")
+            self._set_task_no_worker(task)
+            return
+
+        # the followers can't get the deltas of a streaming leader
+        if self.enable_coalesce and not task.is_stream() and self._coalesce_task(task):
+            return
+        if self.enable_fair_share and task.task_type in (ComputeTaskType.LLM_COMPLETION, ComputeTaskType.TEXT_EMBEDDING):
+            self._admit_task(task)
             return
         # add task to working_queue
         self.task_queue.put_nowait(task)
 
+    def _admit_task(self, task: ComputeTask):
+        # the tasks of an owner over quota wait in kernel, not in the queue of node
+        if task.token_count is None:
+            task.token_count = self.estimate_task_tokens(task)
+        wait_time = self.token_budget.admit(task)
+        if wait_time > 0:
+            logger.info(f"task {task.display()} is over the token quota of {task.owner_id}, wait {wait_time:.1f}s")
+            asyncio.get_event_loop().call_later(wait_time, self.task_queue.put_nowait, task)
+            return
+        self.task_queue.put_nowait(task)
+
+    @staticmethod
+    def get_task_key(task: ComputeTask) -> str:
+        key_str = json.dumps({"task_type": task.task_type.value, "params": task.params}, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(key_str.encode("utf-8")).hexdigest()
+
+    def _coalesce_task(self, task: ComputeTask) -> bool:
+        # return True if the task is attached to a running identical task
+        task_key = self.get_task_key(task)
+        leader = self.inflight_tasks.get(task_key)
+        if leader is not None and not leader.is_finished():
+            logger.info(f"task {task.display()} is coalesced to running task {leader.task_id}")
+            self.coalesced_count += 1
+
+            def _on_leader_done(future):
+                if future.cancelled():
+                    # the leader is cancelled, not the followers. run again, the first one will be the new leader
+                    self.run(task)
+                    return
+                self._set_task_done_from(task, leader)
+
+            leader.get_done_future().add_done_callback(_on_leader_done)
+            return True
+
+        self.inflight_tasks[task_key] = task
+
+        def _on_task_done(future):
+            if self.inflight_tasks.get(task_key) is task:
+                del self.inflight_tasks[task_key]
+
+        task.get_done_future().add_done_callback(_on_task_done)
+        return False
+
+    @staticmethod
+    def _set_task_done_from(task: ComputeTask, source: ComputeTask):
+        # resolve the task by the result of an identical task
+        if source.result is not None:
+            result = copy.copy(source.result)
+            result.set_from_task(task)
+        else:
+            result = None
+        task.error_str = source.error_str
+        task.set_done(result, source.state)
+
     async def start(self):
         if self.is_start is True:
             logger.warn("compute_kernel is already start")
@@ -52,47 +278,235 @@ class ComputeKernel:
             while True:
                 task = await self.task_queue.get()
                 logger.info(f"compute_kernel get task: {task.display()}")
+                if task.is_finished():
+                    # cancelled by the caller when waiting in queue
+                    continue
+                if task.is_expired():
+                    self._set_task_expired(task)
+                    continue
                 c_node: ComputeNode = self._schedule(task)
                 if c_node:
-                    await c_node.push_task(task)
+                    if task.priority in self.hedge_priorities and not task.is_stream():
+                        await self._dispatch_hedged(task, c_node)
+                    else:
+                        self._watch_task(task, c_node)
+                        await c_node.push_task(task, task.priority)
+                else:
+                    self._set_task_no_worker(task)
 
             logger.warn("compute_kernel is stoped!")
 
         asyncio.create_task(_run_task_loop())
 
-    def _schedule(self, task) -> ComputeNode:
-        # find all the node which supports this task
-        support_nodes = []
-        total_weights = 0
+    def _set_task_no_worker(self, task: ComputeTask):
+        # resolve the task at once, the caller don't need to wait until timeout
+        no_worker_result = ComputeTaskResult()
+        no_worker_result.result_code = ComputeTaskResultCode.NO_WORKER
+        no_worker_result.error_str = f"task {task.display()} is not support by any compute node"
+        no_worker_result.set_from_task(task)
+        task.error_str = no_worker_result.error_str
+        task.set_done(no_worker_result, ComputeTaskState.ERROR)
+
+    def _set_task_expired(self, task: ComputeTask):
+        logger.warning(f"task {task.display()} is expired before running")
+        self._record_timeout(task)
+        task.error_str = f"task {task.task_id} is expired before running"
+        task.set_done(self._get_timeout_result(task), ComputeTaskState.ERROR)
+
+    def _watch_task(self, task: ComputeTask, node: ComputeNode):
+        # the latency includes the waiting time in node's queue
+        start_time = time.monotonic()
+        stats = self.get_node_stats(node.node_id)
+        breaker = self.get_circuit_breaker(node.node_id)
+        breaker.on_dispatch()
+
+        def _on_task_done(future):
+            if future.cancelled():
+                # cancelled by the caller, it's not the fault of node
+                breaker.on_cancel()
+                return
+            self.token_budget.on_task_done(task)
+            is_ok = task.is_succeeded()
+            latency = time.monotonic() - start_time
+            stats.record(latency, is_ok)
+            breaker.record(is_ok)
+            self._record_task_metrics(task, node, latency)
+
+        task.get_done_future().add_done_callback(_on_task_done)
+
+    def get_circuit_breaker(self, node_id: str) -> CircuitBreaker:
+        breaker = self.circuit_breakers.get(node_id)
+        if breaker is None:
+            breaker = CircuitBreaker()
+            self.circuit_breakers[node_id] = breaker
+        return breaker
+
+    def set_hedge(self, priority: ComputeTaskPriority, enable: bool = True):
+        if enable:
+            self.hedge_priorities.add(priority)
+        else:
+            self.hedge_priorities.discard(priority)
 
-        for node in self.compute_nodes.values():
-            if node.is_support(task) is True:
-                weight = node.weight() if node.weight() is not None else 0
-                support_nodes.append({
-                    "pos": total_weights,
-                    "node": node
-                })
-                total_weights += weight
+    def get_hedge_delay(self, node: ComputeNode) -> float:
+        latency = self.get_node_stats(node.node_id).get_latency_percentile(self.hedge_percentile, self.hedge_default_delay)
+        return max(latency, self.hedge_min_delay)
+
+    @staticmethod
+    def _copy_task(task: ComputeTask) -> ComputeTask:
+        copy_task = ComputeTask()
+        copy_task.task_type = task.task_type
+        copy_task.create_time = task.create_time
+        copy_task.task_id = uuid.uuid4().hex
+        copy_task.callchain_id = task.callchain_id
+        copy_task.params = task.params
+        copy_task.priority = task.priority
+        copy_task.owner_id = task.owner_id
+        copy_task.fair_tag = task.fair_tag
+        copy_task.budget_tokens = task.budget_tokens
+        copy_task.token_count = task.token_count
+        copy_task.not_before = task.not_before
+        copy_task.deadline = task.deadline
+        return copy_task
+
+    async def _dispatch_hedged(self, task: ComputeTask, node: ComputeNode):
+        # the nodes run the copies of task, the task is resolved by the first successful copy.
+        # if the first copy fails before the hedge is sent, the hedge is sent at once
+        copies = [] # (copy_task, node)
+        hedge_handle = None
+        hedge_sent = False
+
+        def _send_copy(copy_node: ComputeNode, copy_task: ComputeTask):
+            copies.append((copy_task, copy_node))
+            self._watch_task(copy_task, copy_node)
+            copy_task.get_done_future().add_done_callback(lambda future: _on_copy_done(copy_task))
+            return copy_node.push_task(copy_task, copy_task.priority)
+
+        def _send_hedge() -> bool:
+            nonlocal hedge_sent
+            hedge_sent = True
+            if task.is_finished():
+                return False
+            nodes = [n for n in self._get_support_nodes(task)
+                     if n is not node and self.get_circuit_breaker(n.node_id).is_available()]
+            if len(nodes) < 1:
+                return False
+            nodes = self._filter_rate_limited_nodes(task, nodes)
+            hedge_node = self.get_schedule_policy(task).select(task, nodes, self)
+            hedge_task = self._copy_task(task)
+            hedge_task.not_before = None
+            hedge_task.budget_tokens = 0 # the tokens of hedge are charged to the owner too
+            hedge_node.reserve_rate_limit(hedge_task)
+            self.hedged_count += 1
+            logger.info(f"task {task.display()} is slow on {node.display()}, hedge to {hedge_node.display()}")
+            asyncio.create_task(_send_copy(hedge_node, hedge_task))
+            return True
+
+        def _on_copy_done(copy_task: ComputeTask):
+            nonlocal hedge_handle
+            if task.is_finished():
+                return
+            if copy_task.is_succeeded():
+                self._set_task_done_from(task, copy_task)
+                return
+            if not hedge_sent:
+                if hedge_handle is not None:
+                    hedge_handle.cancel()
+                if _send_hedge():
+                    return
+            if all(c[0].is_finished() for c in copies):
+                self._set_task_done_from(task, copy_task)
+
+        def _on_task_done(future):
+            # the task is resolved or cancelled, stop the hedge and the copies still running
+            if hedge_handle is not None:
+                hedge_handle.cancel()
+            for copy_task, copy_node in copies:
+                if not copy_task.is_finished():
+                    asyncio.create_task(copy_node.remove_task(copy_task.task_id))
+
+        task.get_done_future().add_done_callback(_on_task_done)
+        hedge_handle = asyncio.get_event_loop().call_later(self.get_hedge_delay(node), _send_hedge)
+        await _send_copy(node, self._copy_task(task))
+
+    def get_node_stats(self, node_id: str) -> ComputeNodeStats:
+        stats = self.node_stats.get(node_id)
+        if stats is None:
+            stats = ComputeNodeStats()
+            self.node_stats[node_id] = stats
+        return stats
+
+    def set_schedule_policy(self, policy: SchedulePolicy, priority: ComputeTaskPriority = None):
+        # policy for the tasks of priority, or the default policy if priority is None
+        if priority is None:
+            self.default_schedule_policy = policy
+        elif policy is None:
+            self.schedule_policies.pop(priority, None)
+        else:
+            self.schedule_policies[priority] = policy
 
+    def get_schedule_policy(self, task: ComputeTask) -> SchedulePolicy:
+        return self.schedule_policies.get(task.priority, self.default_schedule_policy)
+
+    def _get_support_nodes(self, task: ComputeTask):
+        return self.capability_index.get_support_nodes(task)
+
+    def _schedule(self, task) -> ComputeNode:
+        # find all the node which supports this task
+        support_nodes = self._get_support_nodes(task)
         if len(support_nodes) < 1:
             logger.warning(f"task {task.display()} is not support by any compute node")
             return None
 
-        # hit a random node with weight
-        hit_pos = random.randint(0, total_weights - 1)
-        for i in range(min(len(support_nodes) - 1, hit_pos), -1, -1):
-            if support_nodes[i]["pos"] <= hit_pos:
-                return support_nodes[i]["node"]
+        # the nodes whose circuit breaker is open don't get any task
+        support_nodes = [node for node in support_nodes if self.get_circuit_breaker(node.node_id).is_available()]
+        if len(support_nodes) < 1:
+            logger.warning(f"task {task.display()} is not scheduled, the circuit breaker of all the support nodes are open")
+            return None
 
-        logger.warning(
-            f"task {task.display()} is not support by any compute node")
-        return None
+        support_nodes = self._filter_rate_limited_nodes(task, support_nodes)
+        node = self.get_schedule_policy(task).select(task, support_nodes, self)
+        if node.reserve_rate_limit(task) > 0:
+            logger.info(f"task {task.display()} is rate limited by {node.display()}, wait in the queue of node")
+        return node
+
+    @staticmethod
+    def estimate_task_tokens(task: ComputeTask) -> int:
+        model_name = task.params.get("model_name")
+        # same as llm_num_tokens of the prompt, the prompt is already a message list in task
+        if task.task_type == ComputeTaskType.LLM_COMPLETION:
+            token_count = sum(LLMPrompt.get_message_token_count(msg, model_name) for msg in task.params.get("prompts", []))
+            if task.params.get("inner_functions"):
+                token_count += TokenCounter.count(json.dumps(task.params["inner_functions"], ensure_ascii=False), model_name)
+            return token_count
+        if task.task_type == ComputeTaskType.TEXT_EMBEDDING:
+            input = task.params.get("input")
+            if isinstance(input, list):
+                return sum(TokenCounter.count(text, model_name) for text in input)
+            return TokenCounter.count(input, model_name)
+        return 0
+
+    def _filter_rate_limited_nodes(self, task: ComputeTask, nodes: List[ComputeNode]) -> List[ComputeNode]:
+        # route to the nodes which can send the task now, or the node which can send it first if all are saturated.
+        # the tokens are only counted when there is a rate limited node
+        if all(node.rate_limiter is None or not node.rate_limiter.is_limited() for node in nodes):
+            return nodes
+
+        if task.token_count is None:
+            task.token_count = self.estimate_task_tokens(task)
+        wait_times = {node.node_id: node.get_rate_limit_wait(task) for node in nodes}
+        ready_nodes = [node for node in nodes if wait_times[node.node_id] <= 0]
+        if len(ready_nodes) > 0:
+            return ready_nodes
+        return [min(nodes, key=lambda node: wait_times[node.node_id])]
 
     def _cost_fitst_schedule(self, task: ComputeTask) -> ComputeNode:
         """
         Schedule the task to the compute node with the lowest cost.
         """
-        pass
+        support_nodes = self._get_support_nodes(task)
+        if len(support_nodes) < 1:
+            return None
+        return CheapestSchedulePolicy().select(task, support_nodes, self)
 
     def add_compute_node(self, node: ComputeNode):
         if self.compute_nodes.get(node.node_id) is not None:
@@ -100,6 +514,8 @@ class ComputeKernel:
                 f"compute_node {node.display()} already in compute_kernel")
             return
         self.compute_nodes[node.node_id] = node
+        self.get_node_stats(node.node_id)
+        self.capability_index.rebuild(self.compute_nodes.values())
         logger.info(f"add compute_node {node.display()} to compute_kernel")
 
     def disable_compute_node(self, node_id: str):
@@ -108,27 +524,18 @@ class ComputeKernel:
             logger.warn(f"compute_node {node_id} not in compute_kernel")
             return
         node.enable = False
+        self.capability_index.rebuild(self.compute_nodes.values())
 
     def is_task_support(self, task: ComputeTask) -> bool:
         return True
 
     @staticmethod
     def llm_num_tokens_from_text(text:str,model:str = None) -> int:
-        if model is None:
-            model = "gpt-4-turbo-preview"
-
-        try:
-            encoding = tiktoken.encoding_for_model(model)
-        except KeyError:
-            logger.debug("Warning: model not found. Using cl100k_base encoding.")
-            encoding = tiktoken.get_encoding("cl100k_base")
-
-        token_count = len(encoding.encode(text))
-        return token_count
+        return TokenCounter.count(text, model)
 
     @staticmethod
     def llm_num_tokens(prompt: LLMPrompt, model_name: str = None) -> int:
-        return ComputeKernel.llm_num_tokens_from_text(prompt.as_str(), model_name)
+        return prompt.get_token_count(model_name)
 
     @staticmethod
     def llm_token_price(model_name: str = None) -> float:
@@ -136,7 +543,14 @@ class ComputeKernel:
         Returns the price per 1K tokens for the specified model.
         If model_name is None, returns the default model's price.
         """
-        pass
+        if model_name is None:
+            model_name = AIStorage.get_instance().get_user_config().llm_get_real_model_name(None)
+
+        model_cost = litellm.model_cost.get(model_name)
+        if model_cost is None:
+            logger.debug(f"price of model {model_name} is unknown")
+            return 0.0
+        return model_cost.get("input_cost_per_token", 0.0) * 1000
 
     @staticmethod
     def llm_tokens_cost(prompt: LLMPrompt, model_name: str = None) -> float:
@@ -146,54 +560,104 @@ class ComputeKernel:
         2. Retrieves the price per 1K tokens for the specified model.
         3. Calculates the cost based on the number of tokens and the price per 1K tokens.
         """
-        pass
+        token_count = ComputeKernel.llm_num_tokens(prompt, model_name)
+        return token_count / 1000 * ComputeKernel.llm_token_price(model_name)
+
+    @staticmethod
+    def llm_completion_cost(model_name: str, prompt_tokens: int, completion_tokens: int) -> float:
+        model_cost = litellm.model_cost.get(model_name)
+        if model_cost is None:
+            return 0.0
+        return prompt_tokens * model_cost.get("input_cost_per_token", 0.0) + completion_tokens * model_cost.get("output_cost_per_token", 0.0)
 
     # friendly interface for use:
-    def llm_completion(self, prompt: LLMPrompt, resp_mode:str="text",model_name: Optional[str] = None, max_token: int = 0,inner_functions = None):
-        # craete a llm_work_task ,push on queue's end
+    def get_llm_cache(self) -> LLMCompletionCache:
+        if self.llm_cache is None:
+            self.llm_cache = LLMCompletionCache.get_instance()
+        return self.llm_cache
+
+    def llm_completion(self, prompt: LLMPrompt, resp_mode:str="text",model_name: Optional[str] = None, max_token: int = 0,inner_functions = None,priority:ComputeTaskPriority = ComputeTaskPriority.NORMAL,cacheable:bool = False,stream:bool = False,timeout:float = None,owner_id:str = None):
+        # craete a llm_work_task ,push on queue by priority
         # then task_schedule would run this task.(might schedule some work_task to another host)
         task_req = ComputeTask()
         task_req.set_llm_params(prompt,resp_mode,model_name, max_token,inner_functions)
+        task_req.priority = priority
+        task_req.owner_id = owner_id
+        if timeout is not None:
+            task_req.set_deadline(timeout)
+        if stream:
+            task_req.enable_stream()
+
+        if cacheable:
+            llm_cache = self.get_llm_cache()
+            cached_result = llm_cache.get(task_req)
+            if cached_result is not None:
+                task_req.set_done(cached_result, ComputeTaskState.DONE)
+                return task_req
+
+            def _on_task_done(future):
+                if task_req.is_succeeded() and task_req.result is not None:
+                    llm_cache.put(task_req, task_req.result)
+            task_req.get_done_future().add_done_callback(_on_task_done)
+
         self.run(task_req)
         return task_req
 
     async def _wait_task(self,task_req:ComputeTask, timeout=60)->ComputeTaskResult:
-        async def check_timer():
-            check_times = 0
-            while True:
-                if task_req.state == ComputeTaskState.DONE:
-                    break
-
-                if task_req.state == ComputeTaskState.ERROR:
-                    break
-
-                if timeout is not None and check_times >= timeout*2:
-                    task_req.state = ComputeTaskState.ERROR
-                    break
-
-                await asyncio.sleep(0.5)
-                check_times += 1
+        try:
+            # shield the done_future, wait_for should not cancel it before we set the timeout result
+            await asyncio.wait_for(asyncio.shield(task_req.get_done_future()), timeout)
+        except asyncio.TimeoutError:
+            # nobody waits for the result, stop the task on compute node
+            if task_req.cancel("task is timeout"):
+                self._record_timeout(task_req)
+            return self._get_timeout_result(task_req)
 
-        await asyncio.create_task(check_timer())
         if task_req.result:
             return task_req.result
         else:
-            time_out_result = ComputeTaskResult()
-            time_out_result.result_code = ComputeTaskResultCode.TIMEOUT
-            time_out_result.set_from_task(task_req)
-            task_req.result = time_out_result
-            return time_out_result
+            return self._get_timeout_result(task_req)
 
-
-    async def do_llm_completion(self, prompt: LLMPrompt,resp_mode:str="text", mode_name: Optional[str]=None, max_token:int=0, inner_functions=None, timeout=60) -> str:
-        task_req = self.llm_completion(prompt, resp_mode,mode_name, max_token,inner_functions)
+    @staticmethod
+    def _get_timeout_result(task_req: ComputeTask) -> ComputeTaskResult:
+        time_out_result = ComputeTaskResult()
+        time_out_result.result_code = ComputeTaskResultCode.TIMEOUT
+        time_out_result.error_str = task_req.error_str
+        time_out_result.set_from_task(task_req)
+        return time_out_result
+
+
+    async def do_llm_completion(self, prompt: LLMPrompt,resp_mode:str="text", mode_name: Optional[str]=None, max_token:int=0, inner_functions=None, timeout=60, priority:ComputeTaskPriority = ComputeTaskPriority.NORMAL, cacheable:bool = False,
+                                stream_handler:Callable[[str],Awaitable] = None, owner_id:str = None) -> str:
+        # stream_handler is called with every delta of the completion, the full result is returned as usual
+        task_req = self.llm_completion(prompt, resp_mode,mode_name, max_token,inner_functions,priority,cacheable,stream_handler is not None,timeout,owner_id)
+        if stream_handler is not None:
+            start_time = time.monotonic()
+            async for delta in task_req.stream(timeout):
+                try:
+                    await stream_handler(delta)
+                except Exception as e:
+                    logger.error(f"stream handler of task {task_req.task_id} error: {e}")
+            timeout = max(timeout - (time.monotonic() - start_time), 0)
         return await self._wait_task(task_req, timeout)
 
+    async def llm_completion_stream(self, prompt: LLMPrompt,resp_mode:str="text", mode_name: Optional[str]=None, max_token:int=0, inner_functions=None, timeout=60, priority:ComputeTaskPriority = ComputeTaskPriority.INTERACTIVE, owner_id:str = None) -> AsyncIterator[str]:
+        task_req = self.llm_completion(prompt, resp_mode,mode_name, max_token,inner_functions,priority,stream=True,timeout=timeout,owner_id=owner_id)
+        try:
+            async for delta in task_req.stream(timeout):
+                yield delta
+        finally:
+            # timeout, or the consumer stops reading
+            task_req.cancel("stream is closed")
+
 
     def text_embedding(self,input:str,model_name:Optional[str] = None):
         task_req = ComputeTask()
         task_req.set_text_embedding_params(input,model_name)
-        self.run(task_req)
+        if self.enable_embedding_batch and isinstance(input, str):
+            self.embedding_batcher.submit(task_req)
+        else:
+            self.run(task_req)
         return task_req
 
     async def do_text_embedding(self,input:str,model_name:Optional[str] = None) -> [float]:
@@ -206,6 +670,20 @@ class ComputeKernel:
             logging.warning(f"do_text_embedding error: {task_req.error_str},input: {input}")
         return None
 
+    async def do_text_embedding_batch(self,inputs:List[str],model_name:Optional[str] = None) -> List[List[float]]:
+        # the vectors are in the same order of inputs, None for the input failed
+        task_reqs = [self.text_embedding(input,model_name) for input in inputs]
+        await asyncio.gather(*[self._wait_task(task_req) for task_req in task_reqs])
+
+        vectors = []
+        for task_req in task_reqs:
+            if task_req.state == ComputeTaskState.DONE and task_req.result is not None:
+                vectors.append(task_req.result.result.get("content"))
+            else:
+                logging.warning(f"do_text_embedding_batch error: {task_req.error_str},input: {task_req.params.get('input')}")
+                vectors.append(None)
+        return vectors
+
     def image_embedding(self,input:ObjectID,model_name:Optional[str] = None):
         task_req = ComputeTask()
         task_req.set_image_embedding_params(input,model_name)
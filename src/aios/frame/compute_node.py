@@ -1,36 +1,193 @@
+import time
+import asyncio
+import logging
 from abc import ABC, abstractmethod
 
-from ..proto.compute_task_test import ComputeTask, ComputeTaskType
+from ..proto.compute_task_test import ComputeTask, ComputeTaskType, ComputeTaskState, ComputeTaskResult, ComputeTaskResultCode
+from .rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
 
 class ComputeNode(ABC):
     def __init__(self) -> None:
         self.node_id = "default"
         self.enable = True
 
+        # how many tasks can run at the same time, should be set before the node start
+        self.max_in_flight = 1
+        self.in_flight = 0
+        self.in_flight_peak = 0
+
+        # the RPM/TPM limits of the provider, None means no limit
+        self.rate_limiter : RateLimiter = None
+
+        # set by _dispatch_task_loop, used by remove_task and get_task_state
+        self.dispatch_queue : asyncio.Queue = None
+        self.running_workers = {} # task_id -> (ComputeTask, asyncio.Task)
+        self.delayed_tasks = {} # task_id -> (ComputeTask, asyncio.TimerHandle), the rate limited tasks put back to queue later
+        self.dropped_count = 0
+
     @abstractmethod
     async def push_task(self, task: ComputeTask, proiority: int = 0):
         pass
 
-    @abstractmethod
     async def remove_task(self, task_id: str):
-        pass
+        # remove the waiting task from queue, or cancel the running one
+        if self.dispatch_queue is not None:
+            task = self.dispatch_queue.remove(task_id)
+            if task is not None:
+                task.cancel()
+                return
+
+        delayed = self.delayed_tasks.pop(task_id, None)
+        if delayed is not None:
+            delayed[1].cancel()
+            delayed[0].cancel()
+            return
+
+        running = self.running_workers.get(task_id)
+        if running is not None:
+            running[0].cancel()
+            running[1].cancel()
 
-    @abstractmethod
     def get_task_state(self, task_id: str):
-        pass
+        running = self.running_workers.get(task_id)
+        if running is not None:
+            return running[0].state
+        delayed = self.delayed_tasks.get(task_id)
+        if delayed is not None:
+            return delayed[0].state
+        if self.dispatch_queue is not None:
+            for task in self.dispatch_queue.pending_tasks():
+                if task.task_id == task_id:
+                    return task.state
+        return None
 
     @abstractmethod
     def display(self) -> str:
         pass
 
-    @abstractmethod
-    def get_capacity(self):
-        pass
+    # free worker slots of the node
+    def get_capacity(self) -> int:
+        return max(self.max_in_flight - self.in_flight, 0)
+
+    def get_in_flight(self) -> int:
+        return self.in_flight
+
+    # seconds to wait before the task can be sent to the provider
+    def get_rate_limit_wait(self, task: ComputeTask) -> float:
+        if self.rate_limiter is None:
+            return 0.0
+        return self.rate_limiter.get_wait_time(task.params.get("model_name"), task.token_count or 0)
+
+    def reserve_rate_limit(self, task: ComputeTask) -> float:
+        if self.rate_limiter is None:
+            return 0.0
+        wait_time = self.rate_limiter.reserve(task.params.get("model_name"), task.token_count or 0)
+        if wait_time > 0:
+            task.not_before = max(task.not_before or 0, time.monotonic() + wait_time)
+        return wait_time
+
+    def _set_task_expired(self, task: ComputeTask):
+        result = ComputeTaskResult()
+        result.result_code = ComputeTaskResultCode.TIMEOUT
+        result.error_str = f"task {task.task_id} is expired on {self.display()}"
+        result.worker_id = self.node_id
+        result.set_from_task(task)
+        task.error_str = result.error_str
+        task.set_done(result, ComputeTaskState.ERROR)
+
+    def _set_task_error(self, task: ComputeTask, error_str: str):
+        result = ComputeTaskResult()
+        result.result_code = ComputeTaskResultCode.ERROR
+        result.error_str = f"task {task.task_id} failed on {self.display()}: {error_str}"
+        result.worker_id = self.node_id
+        result.set_from_task(task)
+        task.error_str = result.error_str
+        task.set_done(result, ComputeTaskState.ERROR)
+
+    def _should_drop(self, task: ComputeTask) -> bool:
+        # the caller doesn't wait for the task any more
+        if task.is_finished():
+            return True
+        if task.is_expired():
+            self._set_task_expired(task)
+            return True
+        return False
+
+    def _on_task_cancelled(self, future, task: ComputeTask):
+        # the caller gives up, cancel the running call of provider
+        if future.cancelled():
+            running = self.running_workers.get(task.task_id)
+            if running is not None:
+                running[1].cancel()
+
+    async def _dispatch_task_loop(self, task_queue: asyncio.Queue, run_task):
+        # take a task from queue only when there is a free worker slot, so the waiting tasks are still ordered by task_queue
+        in_flight_sem = asyncio.Semaphore(self.max_in_flight)
+        self.dispatch_queue = task_queue
+
+        async def _worker(task: ComputeTask):
+            # no timeout if the task has no deadline
+            deadline = asyncio.timeout(task.get_remain_time())
+            try:
+                async with deadline:
+                    await run_task(task)
+            except asyncio.TimeoutError as e:
+                if deadline.expired():
+                    logger.warning(f"{self.display()} task {task.display()} is expired when running")
+                    self._set_task_expired(task)
+                else:
+                    # the timeout of provider, not the deadline of task
+                    logger.error(f"{self.display()} run task {task.display()} timeout: {e}")
+                    self._set_task_error(task, f"timeout: {e}")
+            except asyncio.CancelledError:
+                logger.info(f"{self.display()} task {task.display()} is cancelled when running")
+            except Exception as e:
+                logger.error(f"{self.display()} run task {task.display()} error: {e}")
+                self._set_task_error(task, str(e))
+            finally:
+                # the task may be put back to queue and running in another worker
+                if self.running_workers.get(task.task_id, (None, None))[1] is asyncio.current_task():
+                    del self.running_workers[task.task_id]
+                self.in_flight -= 1
+                in_flight_sem.release()
+
+        def _put_back(task: ComputeTask):
+            if self.delayed_tasks.pop(task.task_id, None) is not None:
+                task_queue.put_nowait(task)
+
+        while True:
+            await in_flight_sem.acquire()
+            task = await task_queue.get()
+            if task.not_before is not None and not task.is_finished():
+                # the task is rate limited, put it back to queue when it can be sent and dispatch the next one
+                wait_time = task.not_before - time.monotonic()
+                if wait_time > 0 and not task.is_expired():
+                    handle = asyncio.get_running_loop().call_later(wait_time, _put_back, task)
+                    self.delayed_tasks[task.task_id] = (task, handle)
+                    in_flight_sem.release()
+                    continue
+            if self._should_drop(task):
+                self.dropped_count += 1
+                in_flight_sem.release()
+                continue
+
+            self.in_flight += 1
+            self.in_flight_peak = max(self.in_flight_peak, self.in_flight)
+            worker = asyncio.create_task(_worker(task))
+            self.running_workers[task.task_id] = (task, worker)
+            task.get_done_future().add_done_callback(lambda future, task=task: self._on_task_cancelled(future, task))
 
     @abstractmethod
     def is_support(self, task: ComputeTask) -> bool:
         pass
 
+    # the (ComputeTaskType, model_name) list used by the capability index of compute kernel,
+    # model_name None means any model. return None if the node can only be checked by is_support
+    def get_capabilities(self):
+        return None
+
     @abstractmethod
     def is_local(self) -> bool:
         pass
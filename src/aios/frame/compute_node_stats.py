@@ -0,0 +1,65 @@
+import time
+import math
+from collections import deque
+
+# live statistics of a compute node, recorded by compute kernel when a dispatched task is finished
+class ComputeNodeStats:
+    def __init__(self, alpha: float = 0.2, window_size: int = 100) -> None:
+        self.alpha = alpha # weight of the newest sample in EWMA
+        self.samples = deque(maxlen=window_size) # the recent (latency, is_ok), for percentiles and rolling success rate
+        self.ewma_latency : float = None
+        self.ewma_error_rate = 0.0
+        self.total_count = 0
+        self.error_count = 0
+        self.last_update_time : float = None
+
+    def record(self, latency: float, is_ok: bool) -> None:
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = self.alpha * latency + (1 - self.alpha) * self.ewma_latency
+
+        error = 0.0 if is_ok else 1.0
+        self.ewma_error_rate = self.alpha * error + (1 - self.alpha) * self.ewma_error_rate
+
+        self.samples.append((latency, is_ok))
+
+        self.total_count += 1
+        if not is_ok:
+            self.error_count += 1
+        self.last_update_time = time.time()
+
+    def has_samples(self) -> bool:
+        return self.total_count > 0
+
+    def get_latency(self, default: float = 0.0) -> float:
+        if self.ewma_latency is None:
+            return default
+        return self.ewma_latency
+
+    def get_success_rate(self) -> float:
+        return 1.0 - self.ewma_error_rate
+
+    def get_latency_percentile(self, percentile: float, default: float = None) -> float:
+        # nearest-rank percentile (0-1) of the latencies in window
+        if len(self.samples) == 0:
+            return default
+        latencies = sorted(sample[0] for sample in self.samples)
+        rank = max(math.ceil(percentile * len(latencies)), 1)
+        return latencies[rank - 1]
+
+    def get_window_success_rate(self) -> float:
+        if len(self.samples) == 0:
+            return 1.0
+        return sum(1 for sample in self.samples if sample[1]) / len(self.samples)
+
+    def to_dict(self) -> dict:
+        return {
+            "ewma_latency": self.ewma_latency,
+            "ewma_error_rate": self.ewma_error_rate,
+            "total_count": self.total_count,
+            "error_count": self.error_count,
+            "window_success_rate": self.get_window_success_rate(),
+            "p50_latency": self.get_latency_percentile(0.5),
+            "p95_latency": self.get_latency_percentile(0.95),
+        }
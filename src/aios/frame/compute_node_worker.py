@@ -0,0 +1,187 @@
+import hmac
+import asyncio
+import logging
+import ipaddress
+from typing import List
+
+from aiohttp import web, WSMsgType
+
+from ..proto.compute_task import ComputeTask, ComputeTaskState, ComputeTaskResult, ComputeTaskResultCode
+from .compute_node import ComputeNode
+from .remote_compute_node import dumps_message, loads_message
+
+logger = logging.getLogger(__name__)
+
+# Host the local compute nodes (llama, stable diffusion, whisper ...) for the RemoteComputeNode of other machines.
+# Every connection gets the capabilities of the hosted nodes, then the status (capacity and queue depth) periodically.
+# The connection must carry the shared token ("Authorization: Bearer $token") in the websocket handshake,
+# the worker listens on other addresses than loopback only if the token is set.
+class ComputeNodeWorker:
+    def __init__(self, worker_id: str = "compute_worker", token: str = None) -> None:
+        self.worker_id = worker_id
+        self.token = token
+        self.nodes : List[ComputeNode] = []
+        self.running_tasks = {} # task_id -> ComputeTask
+        self.status_interval = 1.0
+        self.total_count = 0
+
+        self.runner : web.AppRunner = None
+
+    def add_node(self, node: ComputeNode):
+        self.nodes.append(node)
+
+    def get_capabilities(self):
+        # None means the worker can't declare, the tasks are checked by is_support of nodes
+        capabilities = []
+        for node in self.nodes:
+            node_capabilities = node.get_capabilities()
+            if node_capabilities is None:
+                return None
+            for task_type, model_name in node_capabilities:
+                if [task_type.value, model_name] not in capabilities:
+                    capabilities.append([task_type.value, model_name])
+        return capabilities
+
+    def get_status(self) -> dict:
+        max_in_flight = sum(node.max_in_flight for node in self.nodes)
+        in_flight = sum(node.get_in_flight() for node in self.nodes)
+        return {
+            "max_in_flight": max_in_flight,
+            "in_flight": in_flight,
+            "queue_depth": max(len(self.running_tasks) - in_flight, 0),
+        }
+
+    def select_node(self, task: ComputeTask) -> ComputeNode:
+        nodes = [node for node in self.nodes if node.enable and node.is_support(task)]
+        if len(nodes) < 1:
+            return None
+        return max(nodes, key=lambda node: node.get_capacity() or 0)
+
+    def get_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/compute_node", self.handle_connection)
+        return app
+
+    @staticmethod
+    def is_loopback(host: str) -> bool:
+        try:
+            return ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            return host == "localhost"
+
+    def is_authorized(self, request: web.Request) -> bool:
+        if self.token is None:
+            return True
+        auth = request.headers.get("Authorization", "")
+        return hmac.compare_digest(auth.encode("utf-8"), f"Bearer {self.token}".encode("utf-8"))
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765):
+        if self.token is None and not self.is_loopback(host):
+            raise ValueError(f"compute worker {self.worker_id} listen on {host} without token")
+        self.runner = web.AppRunner(self.get_app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        logger.info(f"compute worker {self.worker_id} listen on {host}:{port}")
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def handle_connection(self, request: web.Request) -> web.WebSocketResponse:
+        if not self.is_authorized(request):
+            logger.warning(f"compute worker {self.worker_id} refused {request.remote}, invalid token")
+            raise web.HTTPUnauthorized()
+
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        logger.info(f"compute worker {self.worker_id} connected by {request.remote}")
+
+        conn_tasks = {} # task_id -> ComputeTask from this connection
+        send_lock = asyncio.Lock()
+
+        async def _send(msg: dict):
+            if ws.closed:
+                return
+            async with send_lock:
+                await ws.send_str(dumps_message(msg))
+
+        async def _report_status():
+            while not ws.closed:
+                await asyncio.sleep(self.status_interval)
+                await _send({"type": "status", **self.get_status()})
+
+        await _send({"type": "hello", "worker_id": self.worker_id, "capabilities": self.get_capabilities(), **self.get_status()})
+        status_task = asyncio.create_task(_report_status())
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    if msg.type == WSMsgType.ERROR:
+                        break
+                    continue
+                msg = loads_message(msg.data)
+                match msg.get("type"):
+                    case "task":
+                        task = ComputeTask.from_dict(msg["task"])
+                        conn_tasks[task.task_id] = task
+                        asyncio.create_task(self._run_task(task, conn_tasks, _send))
+                    case "cancel":
+                        task = conn_tasks.pop(msg["task_id"], None)
+                        if task is not None:
+                            await self._cancel_task(task)
+                    case _:
+                        logger.warning(f"compute worker {self.worker_id} unknown message: {msg}")
+        finally:
+            status_task.cancel()
+            # nobody waits for the tasks of the closed connection
+            for task in list(conn_tasks.values()):
+                await self._cancel_task(task)
+            logger.info(f"compute worker {self.worker_id} disconnected by {request.remote}")
+        return ws
+
+    async def _cancel_task(self, task: ComputeTask):
+        for node in self.nodes:
+            if node.get_task_state(task.task_id) is not None:
+                await node.remove_task(task.task_id)
+                break
+        task.cancel()
+
+    async def _run_task(self, task: ComputeTask, conn_tasks: dict, send):
+        node = self.select_node(task)
+        if node is None:
+            result = ComputeTaskResult()
+            result.result_code = ComputeTaskResultCode.NO_WORKER
+            result.error_str = f"task {task.display()} is not support by compute worker {self.worker_id}"
+            result.set_from_task(task)
+            conn_tasks.pop(task.task_id, None)
+            await send({"type": "result", "task_id": task.task_id, "state": ComputeTaskState.ERROR.value,
+                        "error_str": result.error_str, "result": result.to_dict()})
+            return
+
+        self.running_tasks[task.task_id] = task
+        self.total_count += 1
+        forward_task = None
+        if task.is_stream():
+            async def _forward_stream():
+                async for delta in task.stream():
+                    await send({"type": "delta", "task_id": task.task_id, "delta": delta})
+            forward_task = asyncio.create_task(_forward_stream())
+
+        try:
+            await node.push_task(task, task.priority)
+            result = await asyncio.shield(task.get_done_future())
+        except asyncio.CancelledError:
+            # cancelled by the remote node or the connection is closed, no result is sent
+            return
+        finally:
+            self.running_tasks.pop(task.task_id, None)
+
+        if forward_task is not None:
+            # the deltas are sent before the result
+            await forward_task
+        if conn_tasks.pop(task.task_id, None) is None:
+            return
+        await send({"type": "result", "task_id": task.task_id, "state": task.state.value, "error_str": task.error_str,
+                    "result": result.to_dict() if result is not None else None})
+        await send({"type": "status", **self.get_status()})
@@ -0,0 +1,51 @@
+import heapq
+import itertools
+import math
+import time
+from asyncio import Queue
+
+from ..proto.compute_task import ComputeTask, ComputeTaskPriority
+
+# Priority queue of ComputeTask with aging.
+# The level of a task is (enqueue_time + priority * aging_interval) // aging_interval, so a waiting task
+# gains one priority level every aging_interval seconds. The key never changes after put,
+# the heap keeps valid and a low priority task can't starve: any task pushed aging_interval * (priority + 1)
+# seconds later will be dispatched after it.
+# The tasks of the same level are ordered by deadline (earliest first), the tasks without deadline come after them
+# and are ordered by the fair queueing tag of their owners (see TokenBudgetScheduler), then by enqueue order.
+class ComputeTaskQueue(Queue):
+    DEFAULT_AGING_INTERVAL = 10.0
+
+    def __init__(self, maxsize: int = 0, aging_interval: float = None) -> None:
+        self.aging_interval = aging_interval if aging_interval is not None else ComputeTaskQueue.DEFAULT_AGING_INTERVAL
+        self._seq = itertools.count()
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self._queue = []
+
+    def _put(self, task: ComputeTask):
+        heapq.heappush(self._queue, (self.get_sort_key(task), next(self._seq), task))
+
+    def _get(self) -> ComputeTask:
+        return heapq.heappop(self._queue)[2]
+
+    def get_sort_key(self, task: ComputeTask):
+        priority = task.priority if task.priority is not None else ComputeTaskPriority.NORMAL
+        level = (time.monotonic() + int(priority) * self.aging_interval) // self.aging_interval
+        fair_tag = task.fair_tag if task.fair_tag is not None else 0.0
+        deadline = task.deadline if task.deadline is not None else math.inf
+        return (level, deadline, fair_tag)
+
+    def pending_tasks(self):
+        return [item[2] for item in sorted(self._queue, key=lambda item: (item[0], item[1]))]
+
+    def remove(self, task_id: str) -> ComputeTask:
+        # remove a waiting task, return None if it's not in queue
+        for pos, item in enumerate(self._queue):
+            if item[2].task_id == task_id:
+                self._queue[pos] = self._queue[-1]
+                self._queue.pop()
+                heapq.heapify(self._queue)
+                return item[2]
+        return None
@@ -0,0 +1,120 @@
+import logging
+from typing import Dict, List
+
+from .token_counter import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+# Pack the context of a prompt (chat records, summaries, known info ...) into a token budget in one pass.
+# The segments are packed by priority (smaller first). min_share of the budget is reserved for a segment before
+# the segments of higher priority are packed, max_share caps it, and the tokens a segment doesn't use are left
+# to the next ones. When the items of a segment don't fit, its truncate strategy decides what's kept:
+#   keep_newest : the items are oldest first, keep the newest ones, like the chat records
+#   keep_oldest : keep the first ones, like the messages after the summarize position
+#   drop        : all items or nothing, like the known info
+#   cut_text    : keep the first ones and cut the next item at the token, like a summary
+# The token count of every item is given by the caller (the chat db stores them) or counted once by TokenCounter.
+class ContextSegment:
+    KEEP_NEWEST = "keep_newest"
+    KEEP_OLDEST = "keep_oldest"
+    DROP = "drop"
+    CUT_TEXT = "cut_text"
+
+    def __init__(self, name: str, items: List[str], token_counts: List[int] = None, priority: int = 0,
+                 min_share: float = 0.0, max_share: float = 1.0, truncate: str = KEEP_NEWEST) -> None:
+        self.name = name
+        self.items = [items] if isinstance(items, str) else list(items or [])
+        self.token_counts = list(token_counts) if token_counts is not None else [None] * len(self.items)
+        self.priority = priority
+        self.min_share = min_share
+        self.max_share = max_share
+        self.truncate = truncate
+
+    def count_tokens(self, model_name: str = None) -> int:
+        for i, item in enumerate(self.items):
+            if self.token_counts[i] is None:
+                self.token_counts[i] = TokenCounter.count(item, model_name)
+        return sum(self.token_counts)
+
+
+class PackedSegment:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.items : List[str] = [] # in the order of segment items
+        self.token_count = 0
+        self.is_complete = True
+
+    def to_str(self, sep: str = "") -> str:
+        return sep.join(self.items)
+
+
+class ContextPacker:
+    def __init__(self, token_budget: int, model_name: str = None) -> None:
+        self.token_budget = max(int(token_budget), 0)
+        self.model_name = model_name
+        self.segments : List[ContextSegment] = []
+
+    def add_segment(self, segment: ContextSegment) -> ContextSegment:
+        self.segments.append(segment)
+        return segment
+
+    def pack(self) -> Dict[str, PackedSegment]:
+        segments = sorted(self.segments, key=lambda segment: segment.priority)
+        totals = [segment.count_tokens(self.model_name) for segment in segments]
+
+        # the reservations of min_share, the higher priority ones first if they are more than the budget
+        reserved = []
+        remain = self.token_budget
+        for segment, total in zip(segments, totals):
+            reserve = min(int(segment.min_share * self.token_budget), total, remain)
+            reserved.append(reserve)
+            remain -= reserve
+
+        result = {}
+        remain = self.token_budget
+        reserved_after = sum(reserved)
+        for segment, total, reserve in zip(segments, totals, reserved):
+            reserved_after -= reserve
+            limit = max(min(int(segment.max_share * self.token_budget), remain - reserved_after), 0)
+            packed = self._pack_segment(segment, total, limit)
+            remain -= packed.token_count
+            result[segment.name] = packed
+            if not packed.is_complete:
+                logger.debug(f"context segment {segment.name} is truncated, {packed.token_count} of {total} tokens")
+        return result
+
+    def _pack_segment(self, segment: ContextSegment, total: int, limit: int) -> PackedSegment:
+        packed = PackedSegment(segment.name)
+        if total <= limit:
+            packed.items = list(segment.items)
+            packed.token_count = total
+            return packed
+
+        packed.is_complete = False
+        if segment.truncate == ContextSegment.DROP:
+            return packed
+
+        indexes = range(len(segment.items))
+        if segment.truncate == ContextSegment.KEEP_NEWEST:
+            indexes = reversed(indexes)
+        for i in indexes:
+            token_count = segment.token_counts[i]
+            if packed.token_count + token_count > limit:
+                if segment.truncate == ContextSegment.CUT_TEXT:
+                    text = self._cut_text(segment.items[i], limit - packed.token_count)
+                    if text:
+                        packed.items.append(text)
+                        packed.token_count = limit
+                break
+            packed.items.append(segment.items[i])
+            packed.token_count += token_count
+
+        if segment.truncate == ContextSegment.KEEP_NEWEST:
+            packed.items.reverse()
+        return packed
+
+    def _cut_text(self, text: str, token_limit: int) -> str:
+        if token_limit <= 0:
+            return ""
+        encoding = TokenCounter.get_encoding(self.model_name)
+        return encoding.decode(encoding.encode(text)[:token_limit])
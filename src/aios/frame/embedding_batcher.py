@@ -0,0 +1,103 @@
+import logging
+import asyncio
+from typing import Dict, List
+
+from ..proto.compute_task import ComputeTask, ComputeTaskResult, ComputeTaskResultCode, ComputeTaskState
+
+logger = logging.getLogger(__name__)
+
+# Collect the TEXT_EMBEDDING tasks of the same model submitted in a small time window, and run them as one batch task.
+# The input of the batch task is a list of str, the node returns the vectors in result.result["content"] in the same order.
+# The vectors are scattered back to the submitted tasks, the identical inputs in a batch are only sent once.
+class EmbeddingBatcher:
+    def __init__(self, run_func, max_batch_size: int = 64, max_wait: float = 0.005) -> None:
+        # run_func is ComputeKernel.run, the batch task is scheduled like any other task
+        self.run_func = run_func
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self.pending_tasks : Dict[str, List[ComputeTask]] = {} # model_name -> tasks
+        self.flush_handles = {} # model_name -> asyncio.TimerHandle
+
+        self.batch_count = 0
+        self.input_count = 0
+
+    def submit(self, task: ComputeTask) -> None:
+        model_name = task.params.get("model_name")
+        tasks = self.pending_tasks.setdefault(model_name, [])
+        tasks.append(task)
+
+        if len(tasks) >= self.max_batch_size:
+            self.flush(model_name)
+        elif self.flush_handles.get(model_name) is None:
+            self.flush_handles[model_name] = asyncio.get_event_loop().call_later(self.max_wait, self.flush, model_name)
+
+    def flush(self, model_name: str) -> None:
+        handle = self.flush_handles.pop(model_name, None)
+        if handle is not None:
+            handle.cancel()
+
+        tasks = self.pending_tasks.pop(model_name, None)
+        if not tasks:
+            return
+
+        inputs = []
+        input_pos = {} # input -> position in inputs
+        for task in tasks:
+            if task.params["input"] not in input_pos:
+                input_pos[task.params["input"]] = len(inputs)
+                inputs.append(task.params["input"])
+
+        batch_task = ComputeTask()
+        batch_task.set_text_embedding_params(inputs, model_name)
+        batch_task.priority = min(task.priority for task in tasks)
+        self.batch_count += 1
+        self.input_count += len(tasks)
+        logger.debug(f"embedding batch {batch_task.task_id}: {len(tasks)} tasks, {len(inputs)} inputs of model {model_name}")
+
+        def _on_batch_done(future):
+            result = batch_task.result
+            vectors = None
+            if batch_task.state == ComputeTaskState.DONE and result is not None:
+                vectors = result.result.get("content")
+                if not isinstance(vectors, list) or len(vectors) != len(inputs):
+                    logger.error(f"embedding batch {batch_task.task_id} returns {len(vectors) if isinstance(vectors, list) else vectors} vectors for {len(inputs)} inputs")
+                    vectors = None
+
+            for task in tasks:
+                if vectors is not None:
+                    self._set_task_vector(task, result, vectors[input_pos[task.params["input"]]])
+                else:
+                    self._set_task_error(task, batch_task, result)
+
+        batch_task.get_done_future().add_done_callback(_on_batch_done)
+        self.run_func(batch_task)
+
+    @staticmethod
+    def _set_task_vector(task: ComputeTask, batch_result: ComputeTaskResult, vector: List[float]):
+        result = ComputeTaskResult()
+        result.result_code = ComputeTaskResultCode.OK
+        result.worker_id = batch_result.worker_id
+        result.result["content"] = vector
+        result.set_from_task(task)
+        task.set_done(result, ComputeTaskState.DONE)
+
+    @staticmethod
+    def _set_task_error(task: ComputeTask, batch_task: ComputeTask, batch_result: ComputeTaskResult):
+        result = ComputeTaskResult()
+        if batch_result is not None and batch_result.result_code != ComputeTaskResultCode.OK:
+            result.result_code = batch_result.result_code
+            result.error_str = batch_result.error_str
+        else:
+            result.result_code = ComputeTaskResultCode.ERROR
+            result.error_str = batch_task.error_str or f"embedding batch {batch_task.task_id} failed"
+        result.set_from_task(task)
+        task.error_str = result.error_str
+        task.set_done(result, ComputeTaskState.ERROR)
+
+    def get_stats(self) -> dict:
+        return {
+            "batch_count": self.batch_count,
+            "input_count": self.input_count,
+            "pending_count": sum(len(tasks) for tasks in self.pending_tasks.values()),
+        }
@@ -0,0 +1,123 @@
+import json
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from ..proto.ai_function import AIFunction, CacheableResult
+
+logger = logging.getLogger(__name__)
+
+# Results of the read-only AIFunctions, shared by all agents and workflows in the process.
+# A function opts in by get_cache_ttl() and returns a CacheableResult when it succeeds, the other results
+# (errors, None) are not cached. The key is the function id and the canonical json of arguments, the objects
+# in arguments like _workspace are keyed by their get_cache_identity(), a call with other objects is not cached.
+# A write function lists the ids of the functions it changes in get_invalidate_functions(), their results
+# are dropped when it's called.
+class AIFunctionResultCache:
+    _instance = None
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = AIFunctionResultCache()
+        return cls._instance
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max_entries
+        self.entries : OrderedDict[Tuple[str, str], Tuple[float, Any]] = OrderedDict() # key -> (expire time, result)
+        # function id -> times invalidated, the result of a call started before the invalidation is not put
+        self.generations : Dict[str, int] = {}
+
+        self.hit_count = 0
+        self.miss_count = 0
+        self.invalidate_count = 0
+
+    @staticmethod
+    def _canonical_value(value) -> str:
+        # the id of object may be reused after it's freed, only the objects with a stable identity are keyed
+        get_identity = getattr(value, "get_cache_identity", None)
+        if get_identity is None:
+            raise TypeError(f"{type(value).__name__} has no cache identity")
+        return f"{type(value).__name__}:{get_identity()}"
+
+    @staticmethod
+    def get_cache_key(func: AIFunction, arguments: Dict) -> Tuple[str, str]:
+        # raise TypeError if the arguments can't be keyed
+        arguments_str = json.dumps(arguments or {}, ensure_ascii=False, sort_keys=True, default=AIFunctionResultCache._canonical_value)
+        return (func.get_id(), arguments_str)
+
+    def get(self, func: AIFunction, arguments: Dict):
+        return self._get_entry(self.get_cache_key(func, arguments))
+
+    def put(self, func: AIFunction, arguments: Dict, result, ttl: float) -> None:
+        self._put_entry(self.get_cache_key(func, arguments), result, ttl)
+
+    def _get_entry(self, key: Tuple[str, str]):
+        cached = self.entries.get(key)
+        if cached is None:
+            return None
+        if cached[0] < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return cached[1]
+
+    def _put_entry(self, key: Tuple[str, str], result, ttl: float) -> None:
+        self.entries[key] = (time.monotonic() + ttl, result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, func_id: str) -> None:
+        self.generations[func_id] = self.generations.get(func_id, 0) + 1
+        keys = [key for key in self.entries.keys() if key[0] == func_id]
+        for key in keys:
+            del self.entries[key]
+        self.invalidate_count += len(keys)
+
+    async def execute(self, func: AIFunction, arguments: Dict, executor: Callable[[], Awaitable[Any]]):
+        # executor runs the function, it's only called when there is no cached result
+        ttl = func.get_cache_ttl()
+        invalidate_functions = func.get_invalidate_functions()
+        if not ttl:
+            # the results of the read functions are dropped before and after the write, a read running
+            # at the same time may see the old data, but won't be put to the cache
+            for func_id in invalidate_functions:
+                self.invalidate(func_id)
+            try:
+                return await executor()
+            finally:
+                for func_id in invalidate_functions:
+                    self.invalidate(func_id)
+
+        try:
+            key = self.get_cache_key(func, arguments)
+        except TypeError as e:
+            logger.debug(f"function {func.get_id()} result is not cached: {e}")
+            return await executor()
+
+        result = self._get_entry(key)
+        if result is not None:
+            self.hit_count += 1
+            logger.debug(f"function {func.get_id()} result from cache")
+            return result
+
+        self.miss_count += 1
+        generation = self.generations.get(func.get_id(), 0)
+        result = await executor()
+        if isinstance(result, CacheableResult) and self.generations.get(func.get_id(), 0) == generation:
+            self._put_entry(key, result, ttl)
+        return result
+
+    def clear(self):
+        self.entries.clear()
+
+    def get_stats(self) -> dict:
+        total = self.hit_count + self.miss_count
+        return {
+            "entry_count": len(self.entries),
+            "hit_count": self.hit_count,
+            "miss_count": self.miss_count,
+            "hit_rate": self.hit_count / total if total > 0 else 0.0,
+            "invalidate_count": self.invalidate_count,
+        }
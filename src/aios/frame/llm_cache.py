@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3 # cache IO is small, use sqlite3 directly like ChatSessionDB
+
+from ..proto.compute_task import ComputeTask, ComputeTaskResult, ComputeTaskResultCode
+from ..storage.storage import AIStorage
+
+logger = logging.getLogger(__name__)
+
+# Content addressed cache of llm completion results, opt-in by the caller of ComputeKernel.do_llm_completion.
+# The key is the hash of model, normalized prompt messages, inner functions, resp_mode and max_token.
+# Entries expire after ttl seconds, and the least recently used entries are evicted when the cache is full.
+class LLMCompletionCache:
+    _instance = None
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = LLMCompletionCache()
+        return cls._instance
+
+    def __init__(self, db_file: str = None, ttl: float = 24 * 3600, max_entries: int = 10000) -> None:
+        if db_file is None:
+            db_file = f"{AIStorage.get_instance().get_myai_dir()}/cache/llm_cache.db"
+        self.db_file = db_file
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.conn = None
+
+        self.hit_count = 0
+        self.miss_count = 0
+        self.put_count = 0
+        self.evict_count = 0
+
+    def _get_conn(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_file)), exist_ok=True)
+            self.conn = sqlite3.connect(self.db_file)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS LLMCache (
+                    CacheKey TEXT PRIMARY KEY,
+                    ModelName TEXT,
+                    Result TEXT,
+                    CreateTime REAL,
+                    AccessTime REAL
+                );
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS LLMCacheAccessTime ON LLMCache (AccessTime);")
+            self.conn.commit()
+        return self.conn
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    @staticmethod
+    def _normalize_message(message: dict) -> dict:
+        result = {}
+        for key, value in message.items():
+            if value is None:
+                continue
+            if isinstance(value, str):
+                value = value.strip()
+            result[key] = value
+        return result
+
+    @staticmethod
+    def get_cache_key(task: ComputeTask) -> str:
+        key_obj = {
+            "model_name": task.params.get("model_name"),
+            "prompts": [LLMCompletionCache._normalize_message(msg) for msg in task.params.get("prompts", [])],
+            "inner_functions": task.params.get("inner_functions"),
+            "resp_mode": task.params.get("resp_mode"),
+            "max_token_size": task.params.get("max_token_size"),
+        }
+        key_str = json.dumps(key_obj, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(key_str.encode("utf-8")).hexdigest()
+
+    def get(self, task: ComputeTask) -> ComputeTaskResult:
+        cache_key = self.get_cache_key(task)
+        now = time.time()
+        try:
+            conn = self._get_conn()
+            row = conn.execute("SELECT Result, CreateTime FROM LLMCache WHERE CacheKey = ?", (cache_key,)).fetchone()
+            if row is None:
+                self.miss_count += 1
+                return None
+
+            if now - row[1] > self.ttl:
+                conn.execute("DELETE FROM LLMCache WHERE CacheKey = ?", (cache_key,))
+                conn.commit()
+                self.miss_count += 1
+                return None
+
+            conn.execute("UPDATE LLMCache SET AccessTime = ? WHERE CacheKey = ?", (now, cache_key))
+            conn.commit()
+        except Exception as e:
+            logger.error(f"read llm cache failed: {e}")
+            self.miss_count += 1
+            return None
+
+        self.hit_count += 1
+        cached = json.loads(row[0])
+        result = ComputeTaskResult()
+        result.result_code = ComputeTaskResultCode.OK
+        result.worker_id = cached.get("worker_id")
+        result.result_str = cached.get("result_str")
+        result.result = cached.get("result") or {}
+        result.result_refers = cached.get("result_refers") or {}
+        result.result_refers["from_cache"] = True
+        result.set_from_task(task)
+        return result
+
+    def put(self, task: ComputeTask, result: ComputeTaskResult) -> None:
+        if result.result_code != ComputeTaskResultCode.OK:
+            return
+
+        cache_key = self.get_cache_key(task)
+        now = time.time()
+        try:
+            cached = json.dumps({
+                "worker_id": result.worker_id,
+                "result_str": result.result_str,
+                "result": result.result,
+                "result_refers": result.result_refers,
+            }, ensure_ascii=False, default=str)
+
+            conn = self._get_conn()
+            conn.execute("INSERT OR REPLACE INTO LLMCache (CacheKey, ModelName, Result, CreateTime, AccessTime) VALUES (?, ?, ?, ?, ?)",
+                          (cache_key, task.params.get("model_name"), cached, now, now))
+            self.put_count += 1
+            self._evict(conn, now)
+            conn.commit()
+        except Exception as e:
+            logger.error(f"write llm cache failed: {e}")
+
+    def _evict(self, conn, now: float):
+        cursor = conn.execute("DELETE FROM LLMCache WHERE CreateTime < ?", (now - self.ttl,))
+        self.evict_count += max(cursor.rowcount, 0)
+
+        count = conn.execute("SELECT COUNT(*) FROM LLMCache").fetchone()[0]
+        if count > self.max_entries:
+            cursor = conn.execute("DELETE FROM LLMCache WHERE CacheKey IN (SELECT CacheKey FROM LLMCache ORDER BY AccessTime ASC LIMIT ?)",
+                                  (count - self.max_entries,))
+            self.evict_count += max(cursor.rowcount, 0)
+
+    def clear(self):
+        conn = self._get_conn()
+        conn.execute("DELETE FROM LLMCache")
+        conn.commit()
+
+    def get_stats(self) -> dict:
+        total = self.hit_count + self.miss_count
+        return {
+            "hit_count": self.hit_count,
+            "miss_count": self.miss_count,
+            "hit_rate": self.hit_count / total if total > 0 else 0.0,
+            "put_count": self.put_count,
+            "evict_count": self.evict_count,
+        }
@@ -0,0 +1,193 @@
+import math
+import logging
+from typing import Callable, Dict, List, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Metrics of the compute kernel and nodes, exposed in the Prometheus text format.
+# Counters and histograms are recorded when the things happen, the gauges (queue length, in-flight ...)
+# are set by the collectors just before the exposition.
+
+DEFAULT_LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+
+def _escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(label_names: List[str], label_values: Tuple, extra: Dict[str, str] = None) -> str:
+    items = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        items.extend(f'{name}="{_escape_label_value(value)}"' for name, value in extra.items())
+    if len(items) == 0:
+        return ""
+    return "{" + ",".join(items) + "}"
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, help: str, label_names: List[str] = None) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = label_names or []
+        self.values : Dict[Tuple, float] = {} # label values -> value
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def get(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0.0)
+
+    def clear(self):
+        self.values = {}
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.metric_type}"]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def set_total(self, value: float, **labels) -> None:
+        # for the counts kept by other components, set by the collectors
+        self.values[self._key(labels)] = value
+
+
+class Gauge(Metric):
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, help: str, label_names: List[str] = None, buckets: List[float] = None) -> None:
+        super().__init__(name, help, label_names)
+        self.buckets = sorted(buckets or DEFAULT_LATENCY_BUCKETS) + [math.inf]
+        self.series = {} # label values -> [bucket counts, sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = [[0] * len(self.buckets), 0.0, 0]
+            self.series[key] = series
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def get_count(self, **labels) -> int:
+        series = self.series.get(self._key(labels))
+        return series[2] if series is not None else 0
+
+    def get_sum(self, **labels) -> float:
+        series = self.series.get(self._key(labels))
+        return series[1] if series is not None else 0.0
+
+    def clear(self):
+        self.series = {}
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.metric_type}"]
+        for key, (bucket_counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, {'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    _instance = None
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = MetricsRegistry()
+        return cls._instance
+
+    def __init__(self) -> None:
+        self.metrics : Dict[str, Metric] = {}
+        self.collectors : List[Callable[[], None]] = []
+        self.runner : web.AppRunner = None
+
+    def _get_or_create(self, metric_class, name: str, help: str, label_names: List[str], **kwargs) -> Metric:
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = metric_class(name, help, label_names, **kwargs)
+            self.metrics[name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, label_names: List[str] = None) -> Counter:
+        return self._get_or_create(Counter, name, help, label_names)
+
+    def gauge(self, name: str, help: str, label_names: List[str] = None) -> Gauge:
+        return self._get_or_create(Gauge, name, help, label_names)
+
+    def histogram(self, name: str, help: str, label_names: List[str] = None, buckets: List[float] = None) -> Histogram:
+        return self._get_or_create(Histogram, name, help, label_names, buckets=buckets)
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        # called before every exposition to set the gauges
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    def remove_collector(self, collector: Callable[[], None]) -> None:
+        if collector in self.collectors:
+            self.collectors.remove(collector)
+
+    def collect(self) -> None:
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.error(f"metrics collector {collector} error: {e}")
+
+    def expose(self) -> str:
+        self.collect()
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.expose(), content_type="text/plain", headers={"X-Content-Type-Options": "nosniff"})
+
+    def get_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        return app
+
+    async def start_server(self, host: str = "127.0.0.1", port: int = 9464):
+        if self.runner is not None:
+            return
+        self.runner = web.AppRunner(self.get_app())
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        logger.info(f"metrics endpoint listen on http://{host}:{port}/metrics")
+
+    async def stop_server(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
@@ -1,9 +1,9 @@
 
 import asyncio
-from asyncio import Queue
 import logging
 from abc import abstractmethod
 
+from .compute_task_queue import ComputeTaskQueue
 from aios import ComputeTask, ComputeNode,ComputeTaskResult, ComputeTaskResultCode, ComputeTaskState, ComputeTaskType
 
 logger = logging.getLogger(__name__)
@@ -11,7 +11,7 @@ logger = logging.getLogger(__name__)
 class Queue_ComputeNode(ComputeNode):
     def __init__(self):
         super().__init__()
-        self.task_queue = Queue()
+        self.task_queue = ComputeTaskQueue()
         self.is_start = False
 
     @abstractmethod
@@ -22,9 +22,6 @@ class Queue_ComputeNode(ComputeNode):
         logger.info(f"{self.display()} push task: {task.display()}")
         self.task_queue.put_nowait(task)
 
-    async def remove_task(self, task_id: str):
-        pass
-
     async def _run_task(self, task: ComputeTask):
         task.state = ComputeTaskState.RUNNING
 
@@ -33,16 +30,22 @@ class Queue_ComputeNode(ComputeNode):
         result.set_from_task(task)
         result.worker_id = self.node_id
 
-        real_result = await self.execute_task(task)
+        try:
+            real_result = await self.execute_task(task)
+        except Exception as e:
+            logger.error(f"{self.display()} execute task {task.display()} error: {e}")
+            task.error_str = str(e)
+            result.error_str = str(e)
+            real_result = None
 
         if real_result:
             if real_result.result_code == ComputeTaskResultCode.OK:
-                task.state = ComputeTaskState.DONE
+                task.set_done(real_result, ComputeTaskState.DONE)
             else:
-                task.state = ComputeTaskState.ERROR
+                task.set_done(real_result, ComputeTaskState.ERROR)
             return real_result
         else:
-            task.state = ComputeTaskState.ERROR
+            task.set_done(result, ComputeTaskState.ERROR)
             return result
 
     def start(self):
@@ -50,14 +53,4 @@ class Queue_ComputeNode(ComputeNode):
             return
         self.is_start = True
 
-        async def _run_task_loop():
-            while True:
-                task = await self.task_queue.get()
-                logger.info(f"openai_node get task: {task.display()}")
-                await self._run_task(task)
-
-        asyncio.create_task(_run_task_loop())
-
-
-    def get_task_state(self, task_id: str):
-        pass
+        asyncio.create_task(self._dispatch_task_loop(self.task_queue, self._run_task))
@@ -0,0 +1,116 @@
+import time
+import logging
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A bucket refilled continuously at limit_per_minute / 60 per second.
+# reserve() always takes the amount, the balance can be negative, the returned wait time is when the reservation is valid.
+# So the tasks reserved in a burst are spread out in time instead of being sent at once.
+class TokenBucket:
+    def __init__(self, limit_per_minute: float, capacity: float = None) -> None:
+        self.rate = limit_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else limit_per_minute
+        self.balance = self.capacity
+        self.update_time = time.monotonic()
+
+    def _refill(self, now: float):
+        if now <= self.update_time:
+            return
+        self.balance = min(self.capacity, self.balance + (now - self.update_time) * self.rate)
+        self.update_time = now
+
+    def get_wait_time(self, amount: float, now: float = None) -> float:
+        if now is None:
+            now = time.monotonic()
+        self._refill(now)
+        # a request larger than the bucket is allowed when the bucket is full
+        amount = min(amount, self.capacity)
+        if self.balance >= amount:
+            return 0.0
+        return (amount - self.balance) / self.rate
+
+    def reserve(self, amount: float, now: float = None) -> float:
+        wait_time = self.get_wait_time(amount, now)
+        self.balance -= min(amount, self.capacity)
+        return wait_time
+
+
+# RPM/TPM limits of a compute node, every model has its own buckets.
+# The limit of a model_name is used if it's set, otherwise the default limit (model_name None) of the node.
+class RateLimiter:
+    def __init__(self) -> None:
+        self.limits : Dict[str, Tuple[float, float]] = {} # model_name -> (rpm, tpm), None means no limit
+        self.buckets : Dict[str, Tuple[TokenBucket, TokenBucket]] = {}
+        self.paused_until : Dict[str, float] = {} # model_name -> monotonic time, set by the retry-after of provider
+
+        self.limited_count = 0
+
+    def set_limit(self, rpm: float = None, tpm: float = None, model_name: str = None) -> None:
+        self.limits[model_name] = (rpm, tpm)
+        self.buckets = {}
+
+    def is_limited(self) -> bool:
+        return len(self.limits) > 0 or len(self.paused_until) > 0
+
+    def _get_buckets(self, model_name: str) -> Tuple[TokenBucket, TokenBucket]:
+        buckets = self.buckets.get(model_name)
+        if buckets is None:
+            rpm, tpm = self.limits.get(model_name, self.limits.get(None, (None, None)))
+            buckets = (TokenBucket(rpm) if rpm else None, TokenBucket(tpm) if tpm else None)
+            self.buckets[model_name] = buckets
+        return buckets
+
+    def _get_pause_time(self, model_name: str, now: float) -> float:
+        paused_until = self.paused_until.get(model_name)
+        if paused_until is None:
+            return 0.0
+        if paused_until <= now:
+            del self.paused_until[model_name]
+            return 0.0
+        return paused_until - now
+
+    def get_wait_time(self, model_name: str, tokens: int = 0) -> float:
+        now = time.monotonic()
+        wait_time = self._get_pause_time(model_name, now)
+        request_bucket, token_bucket = self._get_buckets(model_name)
+        if request_bucket is not None:
+            wait_time = max(wait_time, request_bucket.get_wait_time(1, now))
+        if token_bucket is not None:
+            wait_time = max(wait_time, token_bucket.get_wait_time(tokens, now))
+        return wait_time
+
+    def reserve(self, model_name: str, tokens: int = 0) -> float:
+        # take one request and the tokens, return the seconds to wait before sending the request
+        now = time.monotonic()
+        wait_time = self._get_pause_time(model_name, now)
+        request_bucket, token_bucket = self._get_buckets(model_name)
+        if request_bucket is not None:
+            wait_time = max(wait_time, request_bucket.reserve(1, now))
+        if token_bucket is not None:
+            wait_time = max(wait_time, token_bucket.reserve(tokens, now))
+        if wait_time > 0:
+            self.limited_count += 1
+        return wait_time
+
+    def pause(self, model_name: str, seconds: float) -> None:
+        # the provider told us to retry after seconds
+        paused_until = time.monotonic() + seconds
+        if paused_until > self.paused_until.get(model_name, 0):
+            self.paused_until[model_name] = paused_until
+        logger.warning(f"rate limiter pause model {model_name} for {seconds}s")
+
+    @staticmethod
+    def parse_retry_after(headers, default: float = 1.0) -> float:
+        if headers is None:
+            return default
+        try:
+            retry_after_ms = headers.get("retry-after-ms")
+            if retry_after_ms:
+                return float(retry_after_ms) / 1000
+            retry_after = headers.get("retry-after")
+            if retry_after:
+                return float(retry_after)
+        except (TypeError, ValueError):
+            pass
+        return default
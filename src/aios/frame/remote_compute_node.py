@@ -0,0 +1,229 @@
+import json
+import base64
+import asyncio
+import logging
+
+import aiohttp
+
+from ..proto.compute_task import ComputeTask, ComputeTaskType, ComputeTaskState, ComputeTaskResult, ComputeTaskResultCode
+from .compute_node import ComputeNode
+
+logger = logging.getLogger(__name__)
+
+"""
+Protocol between RemoteComputeNode and ComputeNodeWorker, json messages over one websocket,
+the handshake request carries the shared token of worker by "Authorization: Bearer $token":
+worker -> node:
+    {"type": "hello", "worker_id", "capabilities": [[task_type, model_name], ...] or None, "max_in_flight", "in_flight", "queue_depth"}
+    {"type": "status", "max_in_flight", "in_flight", "queue_depth"}
+    {"type": "delta", "task_id", "delta"}
+    {"type": "result", "task_id", "state", "error_str", "result"}
+node -> worker:
+    {"type": "task", "task"}
+    {"type": "cancel", "task_id"}
+bytes in the messages (the audio of TEXT_2_VOICE result, etc.) are encoded as {"__bytes__": base64 string}
+"""
+
+def _json_default(obj):
+    if isinstance(obj, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(obj).decode("ascii")}
+    return str(obj)
+
+def _json_object_hook(obj: dict):
+    if len(obj) == 1 and "__bytes__" in obj:
+        return base64.b64decode(obj["__bytes__"])
+    return obj
+
+def dumps_message(msg: dict) -> str:
+    return json.dumps(msg, ensure_ascii=False, default=_json_default)
+
+def loads_message(msg_str: str) -> dict:
+    return json.loads(msg_str, object_hook=_json_object_hook)
+
+
+# Proxy of the compute nodes hosted by a ComputeNodeWorker on another machine.
+# The tasks are forwarded over a persistent websocket, the worker queues and runs them.
+# The node has its own session, the certificate of wss:// worker is verified.
+class RemoteComputeNode(ComputeNode):
+    def __init__(self, url: str, node_id: str = None, token: str = None) -> None:
+        super().__init__()
+        self.url = url # ws://host:port/compute_node or wss://
+        self.token = token
+        self.node_id = node_id or f"remote:{url}"
+        self.is_start = False
+        self.connect_task : asyncio.Task = None
+
+        self.ws : aiohttp.ClientWebSocketResponse = None
+        self.worker_id : str = None
+        self.capabilities = [] # (ComputeTaskType, model_name) reported by worker, None means any task
+        self.remote_in_flight = 0
+        self.remote_queue_depth = 0
+
+        self.remote_tasks = {} # task_id -> ComputeTask sent to worker and not finished
+        self.reconnect_interval = 1.0
+        self.max_reconnect_interval = 30.0
+        self.heartbeat = 30.0
+
+    def start(self):
+        if self.is_start is True:
+            return
+        self.is_start = True
+        self.connect_task = asyncio.create_task(self._connect_loop())
+
+    def is_connected(self) -> bool:
+        return self.ws is not None and not self.ws.closed
+
+    async def wait_connected(self, timeout: float = 5.0) -> bool:
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        while not self.is_connected() or self.worker_id is None:
+            if loop.time() >= deadline:
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    async def _connect_loop(self):
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else None
+        interval = self.reconnect_interval
+        async with aiohttp.ClientSession() as session:
+            while self.is_start:
+                try:
+                    async with session.ws_connect(self.url, heartbeat=self.heartbeat, headers=headers) as ws:
+                        self.ws = ws
+                        interval = self.reconnect_interval
+                        logger.info(f"{self.display()} connected")
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                self._on_message(loads_message(msg.data))
+                            elif msg.type == aiohttp.WSMsgType.ERROR:
+                                break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"{self.display()} connection error: {e}")
+                finally:
+                    self.ws = None
+                    self.worker_id = None
+                    self._fail_remote_tasks("remote compute node is disconnected")
+
+                await asyncio.sleep(interval)
+                interval = min(interval * 2, self.max_reconnect_interval)
+
+    async def close(self):
+        self.is_start = False
+        if self.ws is not None:
+            await self.ws.close()
+        if self.connect_task is not None:
+            self.connect_task.cancel()
+            self.connect_task = None
+
+    def _on_message(self, msg: dict):
+        match msg.get("type"):
+            case "hello":
+                self.worker_id = msg.get("worker_id")
+                capabilities = msg.get("capabilities")
+                if capabilities is None:
+                    self.capabilities = None
+                else:
+                    self.capabilities = [(ComputeTaskType(task_type), model_name) for task_type, model_name in capabilities]
+                self._update_status(msg)
+                logger.info(f"{self.display()} worker {self.worker_id} ready, capabilities: {self.capabilities}")
+            case "status":
+                self._update_status(msg)
+            case "delta":
+                task = self.remote_tasks.get(msg["task_id"])
+                if task is not None:
+                    task.push_stream_delta(msg["delta"])
+            case "result":
+                task = self.remote_tasks.pop(msg["task_id"], None)
+                if task is None:
+                    return
+                result = ComputeTaskResult.from_dict(msg["result"]) if msg.get("result") is not None else None
+                if result is not None:
+                    result.set_from_task(task)
+                task.error_str = msg.get("error_str")
+                task.set_done(result, ComputeTaskState(msg["state"]))
+            case _:
+                logger.warning(f"{self.display()} unknown message: {msg}")
+
+    def _update_status(self, msg: dict):
+        self.max_in_flight = msg.get("max_in_flight", self.max_in_flight)
+        self.remote_in_flight = msg.get("in_flight", 0)
+        self.remote_queue_depth = msg.get("queue_depth", 0)
+
+    def _fail_remote_tasks(self, error_str: str):
+        tasks = list(self.remote_tasks.values())
+        self.remote_tasks = {}
+        for task in tasks:
+            self._set_task_error(task, error_str)
+
+    def _set_task_error(self, task: ComputeTask, error_str: str):
+        result = ComputeTaskResult()
+        result.result_code = ComputeTaskResultCode.ERROR
+        result.error_str = error_str
+        result.worker_id = self.node_id
+        result.set_from_task(task)
+        task.error_str = error_str
+        task.set_done(result, ComputeTaskState.ERROR)
+
+    async def _send(self, msg: dict):
+        await self.ws.send_str(dumps_message(msg))
+
+    async def push_task(self, task: ComputeTask, proiority: int = 0):
+        logger.info(f"{self.display()} push task: {task.display()}")
+        if not self.is_connected():
+            self._set_task_error(task, f"{self.display()} is not connected")
+            return
+
+        self.remote_tasks[task.task_id] = task
+        # the worker may serve other kernels, count the task at once until the next status
+        self.remote_queue_depth += 1
+        task.get_done_future().add_done_callback(lambda future, task=task: self._on_task_cancelled(future, task))
+        try:
+            await self._send({"type": "task", "task": task.to_dict()})
+        except Exception as e:
+            self.remote_tasks.pop(task.task_id, None)
+            self._set_task_error(task, f"{self.display()} send task error: {e}")
+
+    def _on_task_cancelled(self, future, task: ComputeTask):
+        if future.cancelled() and self.remote_tasks.pop(task.task_id, None) is not None and self.is_connected():
+            asyncio.create_task(self._send({"type": "cancel", "task_id": task.task_id}))
+
+    async def remove_task(self, task_id: str):
+        task = self.remote_tasks.get(task_id)
+        if task is not None:
+            # the done callback sends the cancel message to worker
+            task.cancel()
+
+    def get_task_state(self, task_id: str):
+        task = self.remote_tasks.get(task_id)
+        if task is not None:
+            return task.state
+        return None
+
+    def get_capacity(self) -> int:
+        return max(self.max_in_flight - self.remote_in_flight - self.remote_queue_depth, 0)
+
+    def get_in_flight(self) -> int:
+        return len(self.remote_tasks)
+
+    def display(self) -> str:
+        return f"RemoteComputeNode: {self.url}"
+
+    def is_support(self, task: ComputeTask) -> bool:
+        if not self.is_connected() or self.worker_id is None:
+            return False
+        if self.capabilities is None:
+            return True
+        model_name = task.params.get("model_name")
+        for task_type, support_model in self.capabilities:
+            if task_type == task.task_type and (support_model is None or not model_name or support_model == model_name):
+                return True
+        return False
+
+    # the capabilities are known after the worker is connected, checked by is_support
+    def get_capabilities(self):
+        return None
+
+    def is_local(self) -> bool:
+        return False
@@ -0,0 +1,67 @@
+import random
+import logging
+from abc import ABC, abstractmethod
+from typing import List
+
+from ..proto.compute_task import ComputeTask
+from .compute_node import ComputeNode
+from .compute_node_stats import ComputeNodeStats
+
+logger = logging.getLogger(__name__)
+
+# avoid dividing by zero, a node keep failing still has a little chance to be selected
+MIN_SUCCESS_RATE = 0.05
+
+# select a compute node from the nodes which support the task.
+# kernel is the ComputeKernel, policy can get the live stats of node by kernel.get_node_stats(node_id)
+class SchedulePolicy(ABC):
+    @abstractmethod
+    def select(self, task: ComputeTask, nodes: List[ComputeNode], kernel) -> ComputeNode:
+        pass
+
+    def get_name(self) -> str:
+        return self.__class__.__name__
+
+    @staticmethod
+    def get_success_rate(stats: ComputeNodeStats) -> float:
+        return max(stats.get_success_rate(), MIN_SUCCESS_RATE)
+
+
+# hit a random node by node.weight(), the weight is discounted by the recent error rate of node
+class WeightedRandomSchedulePolicy(SchedulePolicy):
+    def select(self, task: ComputeTask, nodes: List[ComputeNode], kernel) -> ComputeNode:
+        weights = []
+        for node in nodes:
+            weight = node.weight() if node.weight() is not None else 0
+            weights.append(weight * self.get_success_rate(kernel.get_node_stats(node.node_id)))
+
+        if sum(weights) <= 0:
+            return random.choice(nodes)
+        return random.choices(nodes, weights=weights)[0]
+
+
+# select the node with lowest expected price (price / success rate), lower latency first if the price is same
+class CheapestSchedulePolicy(SchedulePolicy):
+    def get_node_price(self, task: ComputeTask, node: ComputeNode, kernel) -> float:
+        if node.get_fee_type() == "free":
+            return 0.0
+        return kernel.llm_token_price(task.params.get("model_name"))
+
+    def select(self, task: ComputeTask, nodes: List[ComputeNode], kernel) -> ComputeNode:
+        def _sort_key(node: ComputeNode):
+            stats = kernel.get_node_stats(node.node_id)
+            success_rate = self.get_success_rate(stats)
+            return (self.get_node_price(task, node, kernel) / success_rate, stats.get_latency() / success_rate)
+
+        return min(nodes, key=_sort_key)
+
+
+# select the node with lowest expected response time, the node without samples will be tried first
+class LowestLatencySchedulePolicy(SchedulePolicy):
+    def select(self, task: ComputeTask, nodes: List[ComputeNode], kernel) -> ComputeNode:
+        def _expected_latency(node: ComputeNode) -> float:
+            stats = kernel.get_node_stats(node.node_id)
+            load_factor = 1 + node.get_in_flight() / max(node.max_in_flight, 1)
+            return stats.get_latency() * load_factor / self.get_success_rate(stats)
+
+        return min(nodes, key=_expected_latency)
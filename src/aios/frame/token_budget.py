@@ -0,0 +1,106 @@
+import logging
+from typing import Dict
+
+from ..proto.compute_task import ComputeTask, ComputeTaskPriority
+from .rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Fair share of the llm tokens between the agents and workflows, by the owner_id of ComputeTask.
+# Start-time fair queueing: a task gets the tag start = max(virtual_time, finish of its owner), and the finish
+# of owner moves to start + tokens / weight. The queues dispatch the tasks of the same priority level by the tag,
+# so an owner sending many tasks can't take all the nodes from the others. virtual_time is the largest tag of the
+# finished tasks. The tokens are estimated when the task is queued and corrected by the token usage of result.
+# Quota: the owner with tokens_per_minute has a TokenBucket of burst tokens. When the bucket is empty, the tasks
+# of owner wait in the compute kernel until it's refilled, except the INTERACTIVE ones (replies to human).
+class OwnerBudget:
+    def __init__(self, owner_id: str, weight: float = 1.0, tokens_per_minute: float = None, burst: float = None) -> None:
+        self.owner_id = owner_id
+        self.weight = weight
+        self.tokens_per_minute = tokens_per_minute
+        self.bucket : TokenBucket = TokenBucket(tokens_per_minute, burst) if tokens_per_minute else None
+        self.finish_tag = 0.0
+
+        self.used_tokens = 0
+        self.task_count = 0
+        self.deferred_count = 0
+
+    def get_balance(self) -> float:
+        # tokens can be used now, None means no quota
+        if self.bucket is None:
+            return None
+        self.bucket.get_wait_time(0)
+        return self.bucket.balance
+
+    def to_dict(self) -> dict:
+        return {
+            "weight": self.weight,
+            "tokens_per_minute": self.tokens_per_minute,
+            "balance": self.get_balance(),
+            "used_tokens": self.used_tokens,
+            "task_count": self.task_count,
+            "deferred_count": self.deferred_count,
+        }
+
+
+class TokenBudgetScheduler:
+    def __init__(self) -> None:
+        self.budgets : Dict[str, OwnerBudget] = {}
+        self.virtual_time = 0.0
+
+    def set_budget(self, owner_id: str, weight: float = 1.0, tokens_per_minute: float = None, burst: float = None) -> OwnerBudget:
+        old_budget = self.budgets.get(owner_id)
+        budget = OwnerBudget(owner_id, weight, tokens_per_minute, burst)
+        if old_budget is not None:
+            budget.finish_tag = old_budget.finish_tag
+            budget.used_tokens = old_budget.used_tokens
+            budget.task_count = old_budget.task_count
+            budget.deferred_count = old_budget.deferred_count
+        self.budgets[owner_id] = budget
+        return budget
+
+    def get_budget(self, owner_id: str) -> OwnerBudget:
+        owner_id = owner_id or ""
+        budget = self.budgets.get(owner_id)
+        if budget is None:
+            budget = OwnerBudget(owner_id)
+            self.budgets[owner_id] = budget
+        return budget
+
+    def admit(self, task: ComputeTask) -> float:
+        # tag and charge the task, return the seconds it must wait for the quota of owner
+        budget = self.get_budget(task.owner_id)
+        tokens = task.token_count or 0
+        wait_time = 0.0
+        if budget.bucket is not None:
+            if task.priority != ComputeTaskPriority.INTERACTIVE:
+                # wait until the balance is not negative, the tokens of task are taken at once
+                wait_time = budget.bucket.get_wait_time(0)
+            budget.bucket.balance -= tokens
+            if wait_time > 0:
+                budget.deferred_count += 1
+
+        start_tag = max(self.virtual_time, budget.finish_tag)
+        budget.finish_tag = start_tag + tokens / budget.weight
+        task.fair_tag = start_tag
+        task.budget_tokens = tokens
+        budget.task_count += 1
+        return wait_time
+
+    def charge(self, task: ComputeTask, tokens: int):
+        # the real token usage of task, the difference from the estimated tokens is charged to the owner
+        budget = self.get_budget(task.owner_id)
+        diff = tokens - (task.budget_tokens or 0)
+        task.budget_tokens = tokens
+        budget.used_tokens += tokens
+        budget.finish_tag = max(budget.finish_tag + diff / budget.weight, self.virtual_time)
+        if budget.bucket is not None:
+            budget.bucket.get_wait_time(0)
+            budget.bucket.balance = min(budget.bucket.balance - diff, budget.bucket.capacity)
+
+    def on_task_done(self, task: ComputeTask):
+        if task.fair_tag is not None:
+            self.virtual_time = max(self.virtual_time, task.fair_tag)
+
+    def get_stats(self) -> dict:
+        return {owner_id: budget.to_dict() for owner_id, budget in self.budgets.items()}
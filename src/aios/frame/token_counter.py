@@ -0,0 +1,60 @@
+import logging
+from collections import OrderedDict
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_MODEL = "gpt-4-turbo-preview"
+DEFAULT_ENCODING = "cl100k_base"
+
+# Memoized tiktoken encodings and an LRU of token counts.
+# The LRU is keyed by (encoding name, hash(text), len(text)) so the cache doesn't keep the large texts alive.
+class TokenCounter:
+    _encodings = {} # model_name -> Encoding
+    _counts = OrderedDict()
+    max_cache_size = 8192
+
+    hit_count = 0
+    miss_count = 0
+
+    @classmethod
+    def get_encoding(cls, model_name: str = None):
+        if model_name is None:
+            model_name = DEFAULT_TOKEN_MODEL
+
+        encoding = cls._encodings.get(model_name)
+        if encoding is None:
+            try:
+                encoding = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                logger.debug(f"Warning: model {model_name} not found. Using {DEFAULT_ENCODING} encoding.")
+                encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+            cls._encodings[model_name] = encoding
+        return encoding
+
+    @classmethod
+    def count(cls, text: str, model_name: str = None) -> int:
+        if not text:
+            return 0
+
+        encoding = cls.get_encoding(model_name)
+        key = (encoding.name, hash(text), len(text))
+        token_count = cls._counts.get(key)
+        if token_count is not None:
+            cls.hit_count += 1
+            cls._counts.move_to_end(key)
+            return token_count
+
+        cls.miss_count += 1
+        token_count = len(encoding.encode(text))
+        cls._counts[key] = token_count
+        if len(cls._counts) > cls.max_cache_size:
+            cls._counts.popitem(last=False)
+        return token_count
+
+    @classmethod
+    def clear(cls):
+        cls._counts.clear()
+        cls.hit_count = 0
+        cls.miss_count = 0
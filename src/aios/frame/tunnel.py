@@ -1,12 +1,76 @@
 from abc import ABC, abstractmethod
+import time
 import logging
-from typing import Coroutine
+from typing import Coroutine,Callable,Awaitable,Any
 
 from ..proto.agent_msg import AgentMsg
 from .bus import AIBus
 
 logger = logging.getLogger(__name__)
 
+# Show the reply while the agent is generating it: send a message at the first delta, then edit it with the
+# accumulated text. Edits are throttled by min_interval because IM platforms limit the rate of edit.
+class StreamReplyEditor:
+    EMPTY_REPLY_TEXT = "(no reply)"
+
+    def __init__(self,send_func:Callable[[str],Awaitable[Any]],edit_func:Callable[[Any,str],Awaitable],min_interval:float = 1.0,
+                 delete_func:Callable[[Any],Awaitable] = None) -> None:
+        self.send_func = send_func # send_func(text) -> sent message handle
+        self.edit_func = edit_func # edit_func(sent message handle,text)
+        self.delete_func = delete_func # delete_func(sent message handle), the streamed message is replaced if it's None
+        self.min_interval = min_interval
+        self.text = ""
+        self.sent_handle = None
+        self.shown_text = None
+        self.last_edit_time = 0
+
+    async def on_delta(self,delta:str) -> None:
+        self.text += delta
+        if not self.text.strip():
+            return
+
+        now = time.monotonic()
+        if self.sent_handle is None:
+            self.sent_handle = await self.send_func(self.text)
+            self.shown_text = self.text
+            self.last_edit_time = now
+        elif now - self.last_edit_time >= self.min_interval:
+            await self._edit(self.text)
+            self.last_edit_time = now
+
+    async def _edit(self,text:str) -> None:
+        if text == self.shown_text:
+            return
+        try:
+            await self.edit_func(self.sent_handle,text)
+            self.shown_text = text
+        except Exception as e:
+            logger.warning(f"edit stream reply failed:{e}")
+
+    async def finish(self,final_text:str) -> bool:
+        # return False if nothing was sent, the caller should send the reply as usual
+        if self.sent_handle is None:
+            return False
+        if final_text:
+            await self._edit(final_text)
+        else:
+            await self.discard()
+        return True
+
+    async def discard(self) -> None:
+        # the final reply has no text body (ignored, timeout or not a text message), remove the streamed text
+        if self.sent_handle is None:
+            return
+        if self.delete_func is not None:
+            try:
+                await self.delete_func(self.sent_handle)
+                self.sent_handle = None
+                self.shown_text = None
+                return
+            except Exception as e:
+                logger.warning(f"delete stream reply failed:{e}")
+        await self._edit(self.EMPTY_REPLY_TEXT)
+
 class AgentTunnel(ABC):
     _all_loader = {}
     _all_tunnels = {}
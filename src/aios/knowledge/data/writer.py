@@ -1,7 +1,7 @@
 import os
 import hashlib
 import re
-import tiktoken
+from ...frame.token_counter import TokenCounter
 import logging
 from typing import Callable, Iterable, Optional, Tuple, List
 from .chunk_store import ChunkStore
@@ -186,7 +186,7 @@ class ChunkListWriter:
         chunk_overlap: int = 200,
         separators: str = ["\n\n", "\n", " ", ""]
     ) -> ChunkList:
-        enc = tiktoken.encoding_for_model("gpt-3.5-turbo")
+        enc = TokenCounter.get_encoding("gpt-3.5-turbo")
 
         def length_function(text: str) -> int:
             return len(
@@ -4,7 +4,7 @@ import os
 import uuid
 from typing import List
 
-from ..proto.ai_function import ParameterDefine, SimpleAIAction, SimpleAIFunction
+from ..proto.ai_function import CacheableResult, ParameterDefine, SimpleAIAction, SimpleAIFunction
 from ..agent.llm_context import GlobaToolsLibrary
 from ..storage.objfs import ObjFS
 
@@ -131,7 +131,7 @@ All Knowledge Graph APIs return are json format string."""
                     logger.error("Path is not specified")
                     return "Error! Path is not specified"
                 
-                return json.dumps(await kb.list_by_path(root_path), ensure_ascii=False)
+                return CacheableResult(json.dumps(await kb.list_by_path(root_path), ensure_ascii=False))
             
             if op_name == "tree":
                 root_path = param.get("path")
@@ -142,21 +142,21 @@ All Knowledge Graph APIs return are json format string."""
                 depth = param.get("depth")
                 if depth is None:
                     depth = 3
-                return json.dumps(await kb.tree(root_path,depth), ensure_ascii=False)
+                return CacheableResult(json.dumps(await kb.tree(root_path,depth), ensure_ascii=False))
             
             if op_name == "read":
                 obj_path = param.get("path")
                 if obj_path is None:
                     logger.error("Path is not specified")
                     return "Error! Path is not specified"
-                return json.dumps(await kb.get_obj_by_path(obj_path), ensure_ascii=False)
+                return CacheableResult(json.dumps(await kb.get_obj_by_path(obj_path), ensure_ascii=False))
             
             if op_name == "get_obj":
                 obj_id = param.get("obj_id")
                 if obj_id is None:
                     logger.error("Object ID is not specified")
                     return "Error! Object ID is not specified"
-                return json.dumps(await kb.get_obj_by_id(obj_id), ensure_ascii=False)
+                return CacheableResult(json.dumps(await kb.get_obj_by_id(obj_id), ensure_ascii=False))
             
                
             return "Error! Operation type is not supported"
@@ -172,7 +172,7 @@ All Knowledge Graph APIs return are json format string."""
         knowledge_graph_access_func = SimpleAIFunction("knowledge_base.knowledge_graph_read",
                                                         func_desc,
                                                         knowledge_graph_access,
-                                                        parameters)
+                                                        parameters,cache_ttl=60)
         GlobaToolsLibrary.get_instance().register_tool_function(knowledge_graph_access_func)
 
         async def knwoledge_graph_update(parameters):
@@ -315,7 +315,7 @@ All Knowledge Graph APIs return are json format string."""
         knowledge_graph_update_func = SimpleAIFunction("knowledge_base.knowledge_graph_update",
                                                         "Update Knowledge Graph APIs",
                                                         knwoledge_graph_update,
-                                                        parameters)
+                                                        parameters,invalidate_functions=["knowledge_base.knowledge_graph_read"])
         GlobaToolsLibrary.get_instance().register_tool_function(knowledge_graph_update_func)
 
 
@@ -1,2 +1,3 @@
 from .cid import ContentId
-from .ndn_client import NDN_Client
\ No newline at end of file
+from .ndn_client import NDN_Client
+from .http_client import AsyncHttpClient
@@ -0,0 +1,47 @@
+import asyncio
+import logging
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Shared aiohttp session with keep-alive connection pool.
+# A ClientSession is bound to the event loop which creates it, the session is recreated if the loop is changed.
+# The certificate is not verified (verify=False of the llama servers), don't use it for the other peers.
+class AsyncHttpClient:
+    _instance = None
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = AsyncHttpClient()
+        return cls._instance
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 16, keepalive_timeout: float = 30, connect_timeout: float = 10) -> None:
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.connect_timeout = connect_timeout
+
+        self.session : aiohttp.ClientSession = None
+        self.session_loop = None
+
+    def get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self.session is None or self.session.closed or self.session_loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout, ssl=False)
+            self.session = aiohttp.ClientSession(connector=connector,
+                                                 timeout=aiohttp.ClientTimeout(connect=self.connect_timeout))
+            self.session_loop = loop
+        return self.session
+
+    @staticmethod
+    def get_timeout(total: float = None) -> aiohttp.ClientTimeout:
+        # a per-request timeout replaces the session one, keep its connect timeout
+        return aiohttp.ClientTimeout(total=total, connect=AsyncHttpClient.get_instance().connect_timeout)
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        self.session_loop = None
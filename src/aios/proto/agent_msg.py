@@ -73,8 +73,11 @@ class AgentMsg:
         self.event_args = None
 
         self.status = AgentMsgStatus.INIT
+        self.token_count:int = None # tokens of the chat record of msg, stored in the chat db
         self.inner_call_chain = []
         self.resp_msg = None
+        # runtime only, a coroutine function set by tunnel to receive the deltas of the reply while it is generating
+        self.stream_handler = None
 
         self.action_list = []
 
@@ -20,6 +20,13 @@ class ParameterDefine:
         return result
         
 
+class CacheableResult(str):
+    """
+    the successful result of a function with cache ttl, only this result is put to AIFunctionResultCache.
+    the errors are returned as plain str (or None) and run again next time
+    """
+    pass
+
 class AIFunction:
     @abstractmethod
     def get_id(self) -> str:
@@ -182,6 +189,19 @@ class AIFunction:
     def is_ready_only(self) -> bool:
         pass
 
+    def get_cache_ttl(self) -> float:
+        """
+        seconds the result can be reused for the same arguments, None means the result is not cached.
+        only for the functions without side effects, and only the CacheableResult is cached, see AIFunctionResultCache
+        """
+        return None
+
+    def get_invalidate_functions(self) -> List[str]:
+        """
+        ids of the cached functions whose results are changed by this function
+        """
+        return []
+
 #TODO need to be upgrade
 class ActionNode:
     def __init__(self,name:str,args:List[str]) -> None:
@@ -211,11 +231,14 @@ class ActionNode:
     
 
 class SimpleAIFunction(AIFunction):
-    def __init__(self,func_id:str,description:str,func_handler:Coroutine,parameters:Dict[str,ParameterDefine] = None) -> None:
+    def __init__(self,func_id:str,description:str,func_handler:Coroutine,parameters:Dict[str,ParameterDefine] = None,
+                 cache_ttl:float = None,invalidate_functions:List[str] = None) -> None:
         self.func_id = func_id
         self.description = description
         self.func_handler = func_handler
         self.parameters:Dict[str,ParameterDefine] = parameters
+        self.cache_ttl = cache_ttl
+        self.invalidate_functions = invalidate_functions or []
 
     def get_id(self) -> str: 
         return self.func_id
@@ -242,7 +265,13 @@ class SimpleAIFunction(AIFunction):
         return True
     
     def is_ready_only(self) -> bool:
-        return False
+        return self.cache_ttl is not None
+
+    def get_cache_ttl(self) -> float:
+        return self.cache_ttl
+
+    def get_invalidate_functions(self) -> List[str]:
+        return self.invalidate_functions
 
 class AIAction:
     @abstractmethod
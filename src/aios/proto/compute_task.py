@@ -1,6 +1,7 @@
 # pylint:disable=E0402
+import asyncio
 import copy
-from enum import Enum
+from enum import Enum, IntEnum
 import json
 import shlex
 import uuid
@@ -10,6 +11,7 @@ from .ai_function import AIFunction,ActionNode
 from .agent_msg import AgentMsg
 from ..knowledge import ObjectID
 from ..storage.storage import AIStorage
+from ..frame.token_counter import TokenCounter
 
 
 import logging
@@ -42,6 +44,14 @@ class ComputeTaskType(Enum):
     VOICE_2_TEXT = "voice_2_text"
     TEXT_2_VOICE = "text_2_voice"
 
+# smaller value is dispatched first, waiting tasks are aged by the task queue so that low priority tasks won't starve
+class ComputeTaskPriority(IntEnum):
+    INTERACTIVE = 0 # reply to a message from human (tunnel, aios_shell)
+    TOOL_FOLLOWUP = 1 # llm completion after the inner functions called
+    NORMAL = 2
+    SELF_THINK = 3 # agent timer works: self thinking, triage/plan/do/check/review todos
+    PIPELINE = 4 # knowledge pipeline learning
+
 
 # class Function(TypedDict, total=False):
 #     name: Required[str]
@@ -69,6 +79,12 @@ class ComputeTaskType(Enum):
 #     how to call the function.
 #     """
 
+# tokens of an image part in message, the images are resized to 1024x1024 (4 tiles of gpt-4-vision in high detail)
+IMAGE_TOKEN_COUNT = 765
+
+# The message dicts are shared by the forks of a prompt (copy-on-write), never change a message in place after
+# it's added, replace it with a new dict. So fork() only copies the message list, not the images in messages,
+# and the token counts of the shared messages are counted once.
 class LLMPrompt:
     def __init__(self,prompt_str = None) -> None:
         self.messages : List[Dict] = []
@@ -76,6 +92,24 @@ class LLMPrompt:
             self.messages.append({"role":"user","content":prompt_str})
         self.system_message : Dict = None
         self.inner_functions : List[Dict] = []
+        # id(message) -> (message, model_name, token count), shared by the forks
+        self._token_counts : Dict[int,tuple] = {}
+        # (inner_functions, model_name -> token count), the counts are shared with the compiled functions of llm context
+        self._functions_token_counts : tuple = None
+
+    def fork(self) -> 'LLMPrompt':
+        # a new prompt sharing the messages, appending to it doesn't change this one
+        prompt = LLMPrompt()
+        prompt.messages = list(self.messages)
+        prompt.system_message = self.system_message
+        prompt.inner_functions = self.inner_functions
+        prompt._token_counts = self._token_counts
+        prompt._functions_token_counts = self._functions_token_counts
+        return prompt
+
+    def set_inner_functions(self,inner_functions:List[Dict],token_counts:Dict[str,int] = None):
+        self.inner_functions = inner_functions
+        self._functions_token_counts = (inner_functions,token_counts if token_counts is not None else {})
 
     def append_system_message(self,content:str):
         if content is None:
@@ -84,7 +118,7 @@ class LLMPrompt:
         if self.system_message is None:
             self.system_message = {"role":"system","content":content}
         else:
-            self.system_message["content"] += content
+            self.system_message = {"role":"system","content":self.system_message["content"] + content}
 
     def append_user_message(self,content:str):
         if content is None:
@@ -103,6 +137,52 @@ class LLMPrompt:
 
         return result_str
 
+    # token count of every message is cached by TokenCounter, so appending a message only encodes the new one
+    @staticmethod
+    def get_message_token_count(message:Dict,model_name:str = None) -> int:
+        content = message.get("content")
+        if not isinstance(content,list):
+            return TokenCounter.count(json.dumps(message,ensure_ascii=False),model_name)
+
+        # the base64 of images is not encoded as text
+        parts = [part for part in content if not (isinstance(part,dict) and part.get("type") == "image_url")]
+        image_count = len(content) - len(parts)
+        text_message = dict(message)
+        text_message["content"] = parts
+        return TokenCounter.count(json.dumps(text_message,ensure_ascii=False),model_name) + image_count * IMAGE_TOKEN_COUNT
+
+    def _get_cached_token_count(self,message:Dict,model_name:str) -> int:
+        cached = self._token_counts.get(id(message))
+        if cached is not None and cached[0] is message and cached[1] == model_name:
+            return cached[2]
+        token_count = LLMPrompt.get_message_token_count(message,model_name)
+        # keep the message, so its id is not reused
+        self._token_counts[id(message)] = (message,model_name,token_count)
+        return token_count
+
+    def get_token_count(self,model_name:str = None) -> int:
+        token_count = 0
+        if self.system_message:
+            token_count += self._get_cached_token_count(self.system_message,model_name)
+        for msg in self.messages:
+            token_count += self._get_cached_token_count(msg,model_name)
+        if self.inner_functions:
+            token_count += self.get_inner_functions_token_count(model_name)
+        return token_count
+
+    def get_inner_functions_token_count(self,model_name:str = None) -> int:
+        if not self.inner_functions:
+            return 0
+        # inner_functions can be set directly, the counts are only used for the same list
+        if self._functions_token_counts is None or self._functions_token_counts[0] is not self.inner_functions:
+            self._functions_token_counts = (self.inner_functions,{})
+        token_counts = self._functions_token_counts[1]
+        token_count = token_counts.get(model_name)
+        if token_count is None:
+            token_count = TokenCounter.count(json.dumps(self.inner_functions,ensure_ascii=False),model_name)
+            token_counts[model_name] = token_count
+        return token_count
+
     def to_message_list(self):
         result = []
         if self.system_message:
@@ -118,15 +198,15 @@ class LLMPrompt:
 
         if prompt.inner_functions:
             if self.inner_functions is None:
-                self.inner_functions = copy.deepcopy(prompt.inner_functions)
+                self.inner_functions = list(prompt.inner_functions)
             else:
-                self.inner_functions.extend(prompt.inner_functions)
+                self.inner_functions = self.inner_functions + prompt.inner_functions
 
         if prompt.system_message is not None:
             if self.system_message is None:
-                self.system_message = copy.deepcopy(prompt.system_message)
+                self.system_message = prompt.system_message
             else:
-                self.system_message["content"] += prompt.system_message.get("content")
+                self.append_system_message(prompt.system_message.get("content"))
 
         self.messages.extend(prompt.messages)
 
@@ -276,9 +356,126 @@ class ComputeTask:
         self.refers: dict = None
         self.pading_data: bytearray = None
 
+        self.priority = ComputeTaskPriority.NORMAL
+        # estimated by compute kernel, used by the TPM limit of compute node
+        self.token_count : int = None
+        # time.monotonic() before which the task can't be sent to the provider, set by the rate limit of compute node
+        self.not_before : float = None
+        self.retry_count = 0
+        # the agent which creates the task, for the cost statistics and the fair share of tokens
+        self.owner_id : str = None
+        # set by the TokenBudgetScheduler of compute kernel: the fair queueing tag and the tokens charged to owner
+        self.fair_tag : float = None
+        self.budget_tokens : int = None
+        # time.time() after which nobody waits for the result, None means no deadline
+        self.deadline : float = None
+
         self.state = ComputeTaskState.INIT
         self.result = None
         self.error_str = None
+        # resolved by the compute node when the task is finished (DONE or ERROR)
+        self.done_future : asyncio.Future = None
+        # the deltas of a streaming task, None means the stream is end
+        self.stream_queue : asyncio.Queue = None
+        self.stream_delta_count = 0
+
+        """the following fields are only used in compute kernel testing"""
+        self.difficulty = 0 # 0-10
+        self.load = 0 # the load to handel the task
+        self.score = 0 # 0-10
+
+    def get_done_future(self) -> asyncio.Future:
+        if self.done_future is None:
+            self.done_future = asyncio.get_event_loop().create_future()
+        return self.done_future
+
+    def is_finished(self) -> bool:
+        return self.done_future is not None and self.done_future.done()
+
+    def is_succeeded(self) -> bool:
+        # a node may finish the task as DONE with an error result
+        if self.state != ComputeTaskState.DONE:
+            return False
+        return self.result is None or self.result.result_code == ComputeTaskResultCode.OK
+
+    def set_done(self, result:'ComputeTaskResult' = None, state:ComputeTaskState = None) -> None:
+        done_future = self.get_done_future()
+        if done_future.done():
+            # a late result of the cancelled (or already resolved) task is dropped
+            return
+
+        if result is not None:
+            self.result = result
+        if state is not None:
+            self.state = state
+
+        if self.stream_queue is not None:
+            # the node doesn't support streaming, or the result is from cache
+            if self.stream_delta_count == 0 and self.result is not None and self.result.result_str:
+                self.push_stream_delta(self.result.result_str)
+            self.stream_queue.put_nowait(None)
+        done_future.set_result(self.result)
+
+    def set_deadline(self, timeout: float) -> None:
+        deadline = time.time() + timeout
+        if self.deadline is None or deadline < self.deadline:
+            self.deadline = deadline
+
+    def get_remain_time(self) -> float:
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time()
+
+    def is_expired(self) -> bool:
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def cancel(self, reason: str = "task is cancelled") -> bool:
+        # the caller gives up, the compute node drops the task or cancels the running call
+        if self.is_finished():
+            return False
+        self.state = ComputeTaskState.ERROR
+        self.error_str = reason
+        if self.stream_queue is not None:
+            self.stream_queue.put_nowait(None)
+        self.get_done_future().cancel()
+        return True
+
+    def is_cancelled(self) -> bool:
+        return self.done_future is not None and self.done_future.cancelled()
+
+    def enable_stream(self) -> None:
+        self.params["stream"] = True
+        if self.stream_queue is None:
+            self.stream_queue = asyncio.Queue()
+
+    def is_stream(self) -> bool:
+        return self.stream_queue is not None
+
+    def push_stream_delta(self, delta: str) -> None:
+        if self.stream_queue is None or not delta:
+            return
+        self.stream_delta_count += 1
+        self.stream_queue.put_nowait(delta)
+
+    async def stream(self, timeout: float = None):
+        # async iterator of the deltas, stop when the task is finished or timeout
+        if self.stream_queue is None:
+            return
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        while True:
+            remain_time = None
+            if deadline is not None:
+                remain_time = deadline - loop.time()
+                if remain_time <= 0:
+                    return
+            try:
+                delta = await asyncio.wait_for(self.stream_queue.get(), remain_time)
+            except asyncio.TimeoutError:
+                return
+            if delta is None:
+                return
+            yield delta
 
     def set_llm_params(self, prompts, resp_mode,model_name, max_token_size, inner_functions = None, callchain_id=None):
         self.task_type = ComputeTaskType.LLM_COMPLETION
@@ -298,7 +495,8 @@ class ComputeTask:
         if inner_functions is not None:
             self.params["inner_functions"] = inner_functions
 
-    def set_text_embedding_params(self, input: str, model_name=None, callchain_id = None):
+    def set_text_embedding_params(self, input: Union[str, List[str]], model_name=None, callchain_id = None):
+        # a list of input is a batch, the result content is the list of vectors in the same order
         self.task_type = ComputeTaskType.TEXT_EMBEDDING
         self.create_time = time.time()
         self.task_id = uuid.uuid4().hex
@@ -352,6 +550,36 @@ class ComputeTask:
     def display(self) -> str:
         return f"ComputeTask: {self.task_id} {self.task_type} {self.state}"
 
+    def to_dict(self) -> dict:
+        # used to send the task to a remote compute node, the deadline is sent as remain time
+        # so that the clocks of the machines don't need to be synchronized
+        return {
+            "task_type": self.task_type.value,
+            "create_time": self.create_time,
+            "task_id": self.task_id,
+            "callchain_id": self.callchain_id,
+            "params": self.params,
+            "priority": int(self.priority),
+            "token_count": self.token_count,
+            "remain_time": self.get_remain_time(),
+        }
+
+    @classmethod
+    def from_dict(cls, json_obj: dict) -> 'ComputeTask':
+        task = ComputeTask()
+        task.task_type = ComputeTaskType(json_obj["task_type"])
+        task.create_time = json_obj.get("create_time")
+        task.task_id = json_obj.get("task_id")
+        task.callchain_id = json_obj.get("callchain_id")
+        task.params = json_obj.get("params") or {}
+        task.priority = ComputeTaskPriority(json_obj.get("priority", ComputeTaskPriority.NORMAL))
+        task.token_count = json_obj.get("token_count")
+        if json_obj.get("remain_time") is not None:
+            task.set_deadline(json_obj["remain_time"])
+        if task.params.get("stream") is True:
+            task.enable_stream()
+        return task
+
 
 class ComputeTaskResult:
     def __init__(self) -> None:
@@ -374,4 +602,31 @@ class ComputeTaskResult:
         self.callchain_id = task.callchain_id
         task.result = self
 
+    def to_dict(self) -> dict:
+        return {
+            "create_time": self.create_time,
+            "task_id": self.task_id,
+            "callchain_id": self.callchain_id,
+            "worker_id": self.worker_id,
+            "error_str": self.error_str,
+            "result_code": self.result_code.value,
+            "result_str": self.result_str,
+            "result": self.result,
+            "result_refers": self.result_refers,
+        }
+
+    @classmethod
+    def from_dict(cls, json_obj: dict) -> 'ComputeTaskResult':
+        result = ComputeTaskResult()
+        result.create_time = json_obj.get("create_time")
+        result.task_id = json_obj.get("task_id")
+        result.callchain_id = json_obj.get("callchain_id")
+        result.worker_id = json_obj.get("worker_id")
+        result.error_str = json_obj.get("error_str")
+        result.result_code = ComputeTaskResultCode(json_obj.get("result_code", ComputeTaskResultCode.ERROR.value))
+        result.result_str = json_obj.get("result_str")
+        result.result = json_obj.get("result") or {}
+        result.result_refers = json_obj.get("result_refers") or {}
+        return result
+
 
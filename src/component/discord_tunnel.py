@@ -10,7 +10,7 @@ from urllib.parse import urlparse
 from typing import Optional
 
 #from aios import KnowledgeStore, ObjectType
-from aios.frame.tunnel import AgentTunnel
+from aios.frame.tunnel import AgentTunnel, StreamReplyEditor
 from aios.proto.agent_msg import AgentMsg, AgentMsgType
 import discord
 
@@ -154,10 +154,18 @@ class DiscordTunnel(AgentTunnel):
                 agent_msg.body = agent_msg.create_audio_body(audio_file, content)
                 agent_msg.body_mime = f"audio/{ext}"
 
+            stream_editor = StreamReplyEditor(message.channel.send,lambda sent_msg,text: sent_msg.edit(content=text),
+                                              delete_func=lambda sent_msg: sent_msg.delete())
+            agent_msg.stream_handler = stream_editor.on_delta
             resp_msg: AgentMsg = await self.ai_bus.send_message(agent_msg)
             if resp_msg is None:
+                await stream_editor.discard()
                 await message.channel.send(f"System Error: Timeout,{self.target_id}  no resopnse! Please check logs/aios.log for more details!")
             else:
+                is_text_msg = not (resp_msg.is_image_msg() or resp_msg.is_video_msg() or resp_msg.is_audio_msg())
+                if is_text_msg and await stream_editor.finish(resp_msg.body):
+                    return
+                await stream_editor.discard()
                 if resp_msg.body_mime is None:
                     if resp_msg.body is None:
                         return
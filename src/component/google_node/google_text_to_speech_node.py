@@ -100,8 +100,9 @@ class GoogleTextToSpeechNode(ComputeNode):
                 try:
                     result = self._run_task(task)
                     if result is not None:
-                        task.state = ComputeTaskState.DONE
-                        task.result = result
+                        task.set_done(result, ComputeTaskState.DONE)
+                    else:
+                        task.set_done(state=ComputeTaskState.ERROR)
                 except Exception as e:
                     logger.error(f"google_text_to_speech_node run task error: {e}")
                     task.state = ComputeTaskState.ERROR
@@ -109,6 +110,7 @@ class GoogleTextToSpeechNode(ComputeNode):
                     task.result.set_from_task(task)
                     task.result.worker_id = self.node_id
                     task.result.result_str = str(e)
+                    task.set_done()
 
         asyncio.create_task(_run_task_loop())
 
@@ -175,6 +177,9 @@ class GoogleTextToSpeechNode(ComputeNode):
             return True
         return False
 
+    def get_capabilities(self):
+        return [(ComputeTaskType.TEXT_2_VOICE, None)]
+
     def is_local(self) -> bool:
         return False
 
@@ -1,8 +1,11 @@
-
+import json
+import random
 import logging
-import requests
+import aiohttp
+from typing import List, Union
 
 from aios import ComputeTask,Queue_ComputeNode, ComputeTaskResult, ComputeTaskResultCode, ComputeTaskState, ComputeTaskType,AIStorage,UserConfig
+from aios.net.http_client import AsyncHttpClient
 
 logger = logging.getLogger(__name__)
 
@@ -10,11 +13,31 @@ logger = logging.getLogger(__name__)
 This is a custom implementation, it should be redesigned.
 """
 
+# a llama server serving the model of node
+class LlamaReplica:
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.outstanding = 0 # requests sent and not responded
+        self.total_count = 0
+        self.error_count = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "total_count": self.total_count,
+            "error_count": self.error_count,
+        }
+
+
 class LocalLlama_ComputeNode(Queue_ComputeNode):
-    def __init__(self, url: str, model_name: str):
+    def __init__(self, url: str, model_name: str, replica_urls: List[str] = None):
         super().__init__()
         self.url = url
         self.model_name = model_name
+        # the requests are sent to the replica with least outstanding requests
+        self.replicas = [LlamaReplica(replica_url) for replica_url in [url] + (replica_urls or []) if replica_url]
+        self.request_timeout = 600 # seconds, used if the task has no deadline
 
     async def execute_task(self, task: ComputeTask)->ComputeTaskResult:
         result = ComputeTaskResult()
@@ -27,8 +50,8 @@ class LocalLlama_ComputeNode(Queue_ComputeNode):
                 input = task.params["input"]
                 logger.info(f"call local-llama ({self.url}, {self.model_name}) {model_name} input: {input}")
 
-                self.embedding(input, result)
-                
+                await self.embedding(task, result)
+
                 if result.result_code == ComputeTaskResultCode.OK:
                     task.state = ComputeTaskState.DONE
                 else:
@@ -39,24 +62,28 @@ class LocalLlama_ComputeNode(Queue_ComputeNode):
             case ComputeTaskType.LLM_COMPLETION:
                 mode_name = task.params["model_name"]
                 prompts = task.params["prompts"]
-                    
+
                 logger.info(f"local-llama({self.url}, {self.model_name}) prompts: {prompts}")
 
-                self.completion(task, result)
+                # function call is not parsed from the stream, call it in normal mode
+                if task.params.get("stream") is True and not task.params.get("inner_functions"):
+                    await self.completion_stream(task, result)
+                else:
+                    await self.completion(task, result)
 
                 if result.result_code == ComputeTaskResultCode.OK:
                     task.state = ComputeTaskState.DONE
                 else:
                     task.state = ComputeTaskState.ERROR
                     task.error_str = result.error_str
-                
+
             case _:
                 task.state = ComputeTaskState.ERROR
                 result.result_code = ComputeTaskResultCode.ERROR
                 task.error_str = f"ComputeTask's TaskType : {task.task_type} not support!"
                 result.error_str = f"ComputeTask's TaskType : {task.task_type} not support!"
                 return result
-        
+
         return result
 
     async def initial(self) -> bool:
@@ -65,49 +92,74 @@ class LocalLlama_ComputeNode(Queue_ComputeNode):
     def display(self) -> str:
         return f"local-llama: {self.node_id}"
 
-    def get_capacity(self):
-        pass
-
     def is_support(self, task: ComputeTask) -> bool:
         return (task.task_type == ComputeTaskType.TEXT_EMBEDDING or task.task_type == ComputeTaskType.LLM_COMPLETION) and (not task.params["model_name"] or task.params["model_name"] == self.model_name)
 
+    def get_capabilities(self):
+        return [(ComputeTaskType.TEXT_EMBEDDING, self.model_name), (ComputeTaskType.LLM_COMPLETION, self.model_name)]
+
     def is_local(self) -> bool:
         return True
 
-    def embedding(self, input: str, result: ComputeTaskResult):
+    def select_replica(self) -> LlamaReplica:
+        least_outstanding = min(replica.outstanding for replica in self.replicas)
+        return random.choice([replica for replica in self.replicas if replica.outstanding == least_outstanding])
+
+    def _get_timeout(self, task: ComputeTask) -> aiohttp.ClientTimeout:
+        remain_time = task.get_remain_time()
+        if remain_time is None:
+            return AsyncHttpClient.get_timeout(self.request_timeout)
+        return AsyncHttpClient.get_timeout(max(min(remain_time, self.request_timeout), 0.001))
+
+    async def _post(self, task: ComputeTask, path: str, body: dict):
+        # return (status, json response) from the selected replica
+        replica = self.select_replica()
+        replica.outstanding += 1
+        replica.total_count += 1
+        try:
+            session = AsyncHttpClient.get_instance().get_session()
+            async with session.post(replica.url + path, json=body, timeout=self._get_timeout(task)) as response:
+                if response.status != 200:
+                    replica.error_count += 1
+                resp = await response.json(content_type=None) if response.status in (200, 422) else None
+                logger.info(f"local-llama({replica.url}, {self.model_name}) task responsed, request: {body}, status-code: {response.status}, content: {resp}")
+                return response.status, resp
+        except Exception:
+            replica.error_count += 1
+            raise
+        finally:
+            replica.outstanding -= 1
+
+    async def embedding(self, task: ComputeTask, result: ComputeTaskResult):
+        input : Union[str, List[str]] = task.params["input"]
         body = {
             "input": input
         }
-        
-        try:
-            response = requests.post(self.url + "/v1/embeddings", json = body, verify=False, headers={"Content-Type": "application/json"})
-            response.close()
 
-            logger.info(f"local-llama({self.url}, {self.model_name}) task responsed, request: {body}, status-code: {response.status_code}, headers: {response.headers}, content: {response.content}")
+        try:
+            status, resp = await self._post(task, "/v1/embeddings", body)
 
-            if response.status_code == 200:
-                resp = response.json()
-                result.result = resp["data"][0]["embedding"]
-            elif response.status_code == 422:
-                resp = response.json()
+            if status == 200:
+                if isinstance(input, list):
+                    result.result["content"] = [item["embedding"] for item in sorted(resp["data"], key=lambda item: item["index"])]
+                else:
+                    result.result["content"] = resp["data"][0]["embedding"]
+                result.result_code = ComputeTaskResultCode.OK
+            elif status == 422:
                 result.result_code = ComputeTaskResultCode.ERROR
                 result.error_str = "http request failed: " + str(resp["detail"][0]["msg"])
             else:
                 result.result_code = ComputeTaskResultCode.ERROR
-                result.error_str = "http request failed: " + str(response.status_code)
+                result.error_str = "http request failed: " + str(status)
         except Exception as e:
             logger.error(f"call local-llama({self.url}, {self.model_name}) run TEXT_EMBEDDING task error: {e}")
             result.result_code = ComputeTaskResultCode.ERROR
             result.error_str = str(e)
             return result
-        
-    def completion(self, task: ComputeTask, result: ComputeTaskResult):
-        mode_name = task.params["model_name"]
+
+    def _build_completion_body(self, task: ComputeTask) -> dict:
         prompts = task.params["prompts"]
-        max_token_size = task.params.get("max_token_size")
         llm_inner_functions = task.params.get("inner_functions")
-        if max_token_size is None:
-            max_token_size = max_token_size
 
         body = {
             "messages": [],
@@ -130,22 +182,27 @@ class LocalLlama_ComputeNode(Queue_ComputeNode):
                 })
 
         for prompt in prompts:
-            body["messages"].append({
+            message = {
                 "role": prompt["role"],
                 "content": prompt["content"]
-            })
-        
-        try:
-            logger.info(f"will post http request to {self.url}/v1/chat/completions, body: {body}")
+            }
+            # the calls of assistant and the results of tools
+            for key in ["tool_calls", "tool_call_id", "name"]:
+                if prompt.get(key):
+                    message[key] = prompt[key]
+            body["messages"].append(message)
+        return body
 
-            response = requests.post(self.url + "/v1/chat/completions", json = body, verify=False, headers={"Content-Type": "application/json"})
-            response.close()
+    async def completion(self, task: ComputeTask, result: ComputeTaskResult):
+        llm_inner_functions = task.params.get("inner_functions")
+        body = self._build_completion_body(task)
 
-            logger.info(f"local-llama({self.url}, {self.model_name}) task responsed, request: {body}, status-code: {response.status_code}, headers: {response.headers}, content: {response.content}")
+        try:
+            logger.info(f"will post http request to {self.url}/v1/chat/completions, body: {body}")
 
-            if response.status_code == 200:
-                resp = response.json()
+            status, resp = await self._post(task, "/v1/chat/completions", body)
 
+            if status == 200:
                 status_code = resp["choices"][0]["finish_reason"]
                 token_usage = resp["usage"]
 
@@ -153,9 +210,11 @@ class LocalLlama_ComputeNode(Queue_ComputeNode):
                     case "tool_calls":
                         task.state = ComputeTaskState.DONE
                         # rebuild the function name
-                        fun_name = resp["choices"][0]["message"]["function_call"]["name"]
-                        if len(llm_inner_functions) == 1 and (fun_name is None or fun_name == ""):
-                            resp["choices"][0]["message"]["function_call"]["name"] = llm_inner_functions[0]["name"]
+                        function_call = resp["choices"][0]["message"].get("function_call")
+                        if function_call is not None:
+                            fun_name = function_call.get("name")
+                            if len(llm_inner_functions) == 1 and (fun_name is None or fun_name == ""):
+                                function_call["name"] = llm_inner_functions[0]["name"]
                     case "stop":
                         task.state = ComputeTaskState.DONE
                     case _:
@@ -164,24 +223,78 @@ class LocalLlama_ComputeNode(Queue_ComputeNode):
                         result.error_str = f"The status code was {status_code}."
                         result.result_code = ComputeTaskResultCode.ERROR
                         return None
-                    
+
                 result.result_code = ComputeTaskResultCode.OK
                 result.result_str = resp["choices"][0]["message"]["content"]
                 result.result["message"] = resp["choices"][0]["message"]
-               
+
                 if token_usage:
                     result.result_refers["token_usage"] = token_usage
 
                 logger.info(f"local-llama({self.url}, {self.model_name}) success response: {result.result_str}")
-            elif response.status_code == 422:
-                resp = response.json()
+            elif status == 422:
                 result.result_code = ComputeTaskResultCode.ERROR
                 result.error_str = "http request failed: " + str(resp["detail"][0]["msg"])
             else:
                 result.result_code = ComputeTaskResultCode.ERROR
-                result.error_str = "http request failed: " + str(response.status_code)
+                result.error_str = "http request failed: " + str(status)
         except Exception as e:
             logger.error(f"call local-llama({self.url}, {self.model_name}) run LLM_COMPLETION task error: {e}")
             result.result_code = ComputeTaskResultCode.ERROR
             result.error_str = str(e)
-            return result
\ No newline at end of file
+            return result
+
+    async def completion_stream(self, task: ComputeTask, result: ComputeTaskResult):
+        body = self._build_completion_body(task)
+        body["stream"] = True
+
+        content = ""
+        finish_reason = None
+        replica = self.select_replica()
+        replica.outstanding += 1
+        replica.total_count += 1
+        try:
+            logger.info(f"will post stream http request to {replica.url}/v1/chat/completions, body: {body}")
+            session = AsyncHttpClient.get_instance().get_session()
+            async with session.post(replica.url + "/v1/chat/completions", json = body, timeout=self._get_timeout(task)) as response:
+                if response.status != 200:
+                    replica.error_count += 1
+                    result.result_code = ComputeTaskResultCode.ERROR
+                    result.error_str = "http request failed: " + str(response.status)
+                    return result
+
+                # server-sent events, every event is a line "data: {chunk}"
+                async for line in response.content:
+                    line = line.decode("utf-8").strip()
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    choice = chunk["choices"][0]
+                    delta = choice.get("delta", {}).get("content")
+                    if delta:
+                        content += delta
+                        task.push_stream_delta(delta)
+                    if choice.get("finish_reason"):
+                        finish_reason = choice["finish_reason"]
+        except Exception as e:
+            logger.error(f"call local-llama({replica.url}, {self.model_name}) run stream LLM_COMPLETION task error: {e}")
+            replica.error_count += 1
+            result.result_code = ComputeTaskResultCode.ERROR
+            result.error_str = str(e)
+            return result
+        finally:
+            replica.outstanding -= 1
+
+        if finish_reason is not None and finish_reason != "stop":
+            result.result_code = ComputeTaskResultCode.ERROR
+            result.error_str = f"The status code was {finish_reason}."
+            return result
+
+        result.result_code = ComputeTaskResultCode.OK
+        result.result_str = content
+        result.result["message"] = {"role": "assistant", "content": content, "function_call": None, "tool_calls": None}
+        logger.info(f"local-llama({self.url}, {self.model_name}) success stream response: {result.result_str}")
+        return result
@@ -1,3 +1,4 @@
+from .openai_client import *
 from .open_ai_node import *
 from .openai_tts_node import *
 from .whisper_node import *
@@ -4,12 +4,12 @@ import asyncio
 from asyncio import Queue
 import logging
 from pathlib import Path
-from openai import OpenAI
 import base64
 
 from PIL import Image
 
 from aios import ComputeTask, ComputeTaskResult, ComputeTaskState, ComputeTaskType, ComputeTaskResultCode,ComputeNode, AIStorage, UserConfig
+from .openai_client import OpenAIClientPool
 
 logger = logging.getLogger(__name__)
 
@@ -75,7 +75,7 @@ class DallEComputeNode(ComputeNode):
     async def remove_task(self, task_id: str):
         pass
 
-    def _run_task(self, task: ComputeTask):
+    async def _run_task(self, task: ComputeTask):
         task.state = ComputeTaskState.RUNNING
         result = ComputeTaskResult()
         result.result_code = ComputeTaskResultCode.ERROR
@@ -84,9 +84,9 @@ class DallEComputeNode(ComputeNode):
         try:
             prompt = task.params["prompt"]
             logging.info(f"Call DallE {self.default_model} prompts: {prompt}")
-            client = OpenAI(api_key=self.openai_api_key)
+            client = OpenAIClientPool.get_instance().get_client(self.openai_api_key)
 
-            response = client.images.generate(
+            response = await client.images.generate(
                 model=self.default_model,
                 prompt=prompt,
                 size="1024x1024",
@@ -124,7 +124,8 @@ class DallEComputeNode(ComputeNode):
                 logger.info("Dall E node is waiting for task...")
                 task = await self.task_queue.get()
                 logger.info(f"Dall E node get task: {task.display()}")
-                result = self._run_task(task)
+                result = await self._run_task(task)
+                task.set_done(result)
 
         asyncio.create_task(_run_task_loop())
 
@@ -140,5 +141,8 @@ class DallEComputeNode(ComputeNode):
     def is_support(self, task: ComputeTask) -> bool:
         return task.task_type == ComputeTaskType.TEXT_2_IMAGE
 
+    def get_capabilities(self):
+        return [(ComputeTaskType.TEXT_2_IMAGE, None)]
+
     def is_local(self) -> bool:
         return False
@@ -1,18 +1,17 @@
+import time
 import asyncio
 import openai
-from openai import AsyncOpenAI
 import os
-import asyncio
-from asyncio import Queue
 import logging
 import json
-import aiohttp
 import base64
-import requests
 from openai._types import NOT_GIVEN
 
 from aios import ComputeTask, ComputeTaskResult, ComputeTaskState, ComputeTaskType,ComputeTaskResultCode,ComputeNode,AIStorage,UserConfig
 from aios import image_utils
+from aios.frame.compute_task_queue import ComputeTaskQueue
+from aios.frame.rate_limiter import RateLimiter
+from .openai_client import OpenAIClientPool
 
 logger = logging.getLogger(__name__)
 
@@ -27,9 +26,12 @@ class OpenAI_ComputeNode(ComputeNode):
 
     @classmethod
     def declare_user_config(cls):
+        user_config = AIStorage.get_instance().get_user_config()
         if os.getenv("OPENAI_API_KEY") is None:
-            user_config = AIStorage.get_instance().get_user_config()
             user_config.add_user_config("openai_api_key","openai api key",False,None)
+        user_config.add_user_config("openai_max_in_flight","max number of concurrent requests to openai",True,"8")
+        user_config.add_user_config("openai_rpm_limit","max requests per minute of every openai model, empty means no limit",True,None)
+        user_config.add_user_config("openai_tpm_limit","max tokens per minute of every openai model, empty means no limit",True,None)
 
     def __init__(self) -> None:
         super().__init__()
@@ -38,7 +40,10 @@ class OpenAI_ComputeNode(ComputeNode):
         # openai.organization = "org-AoKrOtF2myemvfiFfnsSU8rF" #buckycloud
         self.openai_api_key = None
         self.node_id = "openai_node"
-        self.task_queue = Queue()
+        self.task_queue = ComputeTaskQueue()
+        # the 429 response is retried after the retry-after of openai
+        self.rate_limiter = RateLimiter()
+        self.max_rate_limit_retry = 3
 
 
     async def initial(self):
@@ -52,6 +57,13 @@ class OpenAI_ComputeNode(ComputeNode):
             return False
 
         openai.api_key = self.openai_api_key
+        max_in_flight = AIStorage.get_instance().get_user_config().get_value("openai_max_in_flight")
+        if max_in_flight:
+            self.max_in_flight = int(max_in_flight)
+        rpm_limit = AIStorage.get_instance().get_user_config().get_value("openai_rpm_limit")
+        tpm_limit = AIStorage.get_instance().get_user_config().get_value("openai_tpm_limit")
+        if rpm_limit or tpm_limit:
+            self.rate_limiter.set_limit(float(rpm_limit) if rpm_limit else None, float(tpm_limit) if tpm_limit else None)
         self.start()
         return True
 
@@ -59,9 +71,6 @@ class OpenAI_ComputeNode(ComputeNode):
         logger.info(f"openai_node push task: {task.display()}")
         self.task_queue.put_nowait(task)
 
-    async def remove_task(self, task_id: str):
-        pass
-
     def message_to_dict(self, message)->dict:
         result = message.dict()
         # result_msg = {}
@@ -92,53 +101,45 @@ class OpenAI_ComputeNode(ComputeNode):
         # result["message"] = result_msg
         return result
 
-    def _image_2_text(self, task: ComputeTask):
+    async def _image_2_text(self, task: ComputeTask):
         logger.info('openai image_2_text')
-        # 本地图片处理
-
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.openai_api_key }"
-        }
         model_name = task.params["model_name"]
         image_path = task.params["image_path"]
 
+        # 本地图片处理, resize and encode the local image in executor, it's cpu bound
         if image_utils.is_file(image_path):
-            url = image_utils.to_base64(image_path, (1024, 1024))
+            url = await asyncio.get_running_loop().run_in_executor(None, image_utils.to_base64, image_path, (1024, 1024))
         else:
             url = image_path
 
-        payload = {
-            "model": model_name,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": task.params["prompt"]
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": url
-                            }
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": task.params["prompt"]
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": url
                         }
-                    ]
-                }
-            ],
-            "max_tokens": 300
-        }
+                    }
+                ]
+            }
+        ]
         logger.info('openai send image_2_text request ')
-        # openai 的库的Vision只支持传图片的url地址。本地图片得用request
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-        if response.status_code == 200:
-            logger.info('openai image_2_text success')
-            return response.json()
-        else:
-            logger.error('openai image_2_text error')
-            logger.error(response.json())
+        try:
+            resp = await self.get_client().chat.completions.create(model=model_name, messages=messages, max_tokens=300)
+        except Exception as e:
+            logger.error(f'openai image_2_text error: {e}')
             return None
+        logger.info('openai image_2_text success')
+        return resp.dict()
+
+    def get_client(self):
+        return OpenAIClientPool.get_instance().get_client(self.openai_api_key)
 
     async def _run_task(self, task: ComputeTask):
         task.state = ComputeTaskState.RUNNING
@@ -153,7 +154,7 @@ class OpenAI_ComputeNode(ComputeNode):
                 input = task.params["input"]
                 logger.info(f"call openai {model_name} input: {input}")
                 try:
-                    resp = openai.Embedding.create(model=model_name,
+                    resp = await self.get_client().embeddings.create(model=model_name,
                                                 input=input)
                 except Exception as e:
                     logger.error(f"openai run TEXT_EMBEDDING task error: {e}")
@@ -181,14 +182,18 @@ class OpenAI_ComputeNode(ComputeNode):
                 task.state = ComputeTaskState.DONE
                 result.result_code = ComputeTaskResultCode.OK
                 result.worker_id = self.node_id
-                result.result_str = resp["data"][0]["embedding"]
+                if isinstance(input, list):
+                    result.result["content"] = [item.embedding for item in sorted(resp.data, key=lambda item: item.index)]
+                else:
+                    result.result_str = resp.data[0].embedding
+                    result.result["content"] = result.result_str
 
                 return result
             case ComputeTaskType.IMAGE_2_TEXT:
                 result.result_code = ComputeTaskResultCode.OK
                 result.worker_id = self.node_id
                 # result.result_str = resp["data"][0]["image_2_text"]
-                result.result["message"] = self._image_2_text(task)
+                result.result["message"] = await self._image_2_text(task)
                 return result
             case ComputeTaskType.LLM_COMPLETION:
                 mode_name = task.params["model_name"]
@@ -213,7 +218,8 @@ class OpenAI_ComputeNode(ComputeNode):
                 else:
                     result_token = NOT_GIVEN
 
-                client = AsyncOpenAI(api_key=self.openai_api_key)
+                client = self.get_client()
+                is_stream = task.params.get("stream") is True
                 try:
                     if llm_inner_functions is None or len(llm_inner_functions) == 0:
                         if mode_name != "gpt-4-vision-preview":
@@ -222,16 +228,29 @@ class OpenAI_ComputeNode(ComputeNode):
                                                         messages=prompts,
                                                         response_format = response_format,
                                                         max_tokens=result_token,
+                                                        stream=is_stream,
                                                         )
                     else:
                         if mode_name != "gpt-4-vision-preview":
                             logger.info(f"call openai {mode_name} prompts: \n\t {prompts} \nfunctions: \n\t{json.dumps(llm_inner_functions,ensure_ascii=False)}")
+                        # tools instead of the legacy functions, so the model can call several functions in a turn
                         resp = await client.chat.completions.create(model=mode_name,
                                                             messages=prompts,
                                                             response_format = response_format,
-                                                            functions=llm_inner_functions,
+                                                            tools=[{"type": "function", "function": func} for func in llm_inner_functions],
                                                             max_tokens=result_token,
+                                                            stream=is_stream,
                                                             ) # TODO: add temperature to task params?
+                    if is_stream:
+                        message, status_code = await self._read_stream(task, resp)
+                except openai.RateLimitError as e:
+                    if self._retry_rate_limited(task, e):
+                        return None
+                    logger.error(f"openai run LLM_COMPLETION task rate limited: {e}")
+                    task.state = ComputeTaskState.ERROR
+                    task.error_str = str(e)
+                    result.error_str = str(e)
+                    return result
                 except Exception as e:
                     logger.error(f"openai run LLM_COMPLETION task error: {e}")
                     task.state = ComputeTaskState.ERROR
@@ -241,16 +260,19 @@ class OpenAI_ComputeNode(ComputeNode):
 
                 #logger.info(f"openai response: {resp}")
                 #TODO: gpt-4v api is image_2_text ?
-                if mode_name == "gpt-4-vision-preview":
+                if is_stream:
+                    token_usage = None # openai doesn't return usage in stream mode
+                elif mode_name == "gpt-4-vision-preview":
                     status_code = resp.choices[0].finish_reason
                     if status_code is None:
                         status_code = resp.choices[0].finish_details['type']
+                    token_usage = resp.usage
                 else:
                     status_code = resp.choices[0].finish_reason
-                token_usage = resp.usage
+                    token_usage = resp.usage
 
                 match status_code:
-                    case "function_call":
+                    case "function_call" | "tool_calls":
                         task.state = ComputeTaskState.DONE
                     case "stop":
                         task.state = ComputeTaskState.DONE
@@ -263,9 +285,12 @@ class OpenAI_ComputeNode(ComputeNode):
 
                 result.result_code = ComputeTaskResultCode.OK
                 result.worker_id = self.node_id
-                result.result_str = resp.choices[0].message.content
-
-                result.result["message"] = self.message_to_dict(resp.choices[0].message)
+                if is_stream:
+                    result.result_str = message["content"]
+                    result.result["message"] = message
+                else:
+                    result.result_str = resp.choices[0].message.content
+                    result.result["message"] = self.message_to_dict(resp.choices[0].message)
 
                 if token_usage:
                     result.result_refers["token_usage"] = token_usage
@@ -278,30 +303,93 @@ class OpenAI_ComputeNode(ComputeNode):
                 result.error_str = f"ComputeTask's TaskType : {task.task_type} not support!"
                 return None
 
+    def _retry_rate_limited(self, task: ComputeTask, error: openai.RateLimitError) -> bool:
+        # pause the model by the retry-after of openai and put the task back to queue, return False if the task can't retry
+        retry_after = RateLimiter.parse_retry_after(error.response.headers if error.response is not None else None)
+        self.rate_limiter.pause(task.params.get("model_name"), retry_after)
+        if task.retry_count >= self.max_rate_limit_retry or task.stream_delta_count > 0:
+            return False
+
+        task.retry_count += 1
+        task.not_before = time.monotonic() + retry_after
+        task.state = ComputeTaskState.PENDING
+        logger.warning(f"openai task {task.task_id} is rate limited, retry {task.retry_count} after {retry_after}s")
+        self.task_queue.put_nowait(task)
+        return True
+
+    async def _read_stream(self, task: ComputeTask, resp):
+        # push content deltas to task, and merge the chunks to a message like message_to_dict
+        content = None
+        function_call = None
+        tool_calls = {} # index -> tool call
+        finish_reason = None
+        async for chunk in resp:
+            if len(chunk.choices) < 1:
+                continue
+            choice = chunk.choices[0]
+            delta = choice.delta
+            if delta.content:
+                content = (content or "") + delta.content
+                task.push_stream_delta(delta.content)
+            if delta.function_call:
+                if function_call is None:
+                    function_call = {"name": "", "arguments": ""}
+                if delta.function_call.name:
+                    function_call["name"] += delta.function_call.name
+                if delta.function_call.arguments:
+                    function_call["arguments"] += delta.function_call.arguments
+            for tool_call_delta in getattr(delta, "tool_calls", None) or []:
+                tool_call = tool_calls.get(tool_call_delta.index)
+                if tool_call is None:
+                    tool_call = {"id": None, "type": "function", "function": {"name": "", "arguments": ""}}
+                    tool_calls[tool_call_delta.index] = tool_call
+                if tool_call_delta.id:
+                    tool_call["id"] = tool_call_delta.id
+                if tool_call_delta.function:
+                    if tool_call_delta.function.name:
+                        tool_call["function"]["name"] += tool_call_delta.function.name
+                    if tool_call_delta.function.arguments:
+                        tool_call["function"]["arguments"] += tool_call_delta.function.arguments
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+
+        message = {
+            "content": content,
+            "role": "assistant",
+            "function_call": function_call,
+            "tool_calls": [tool_calls[index] for index in sorted(tool_calls.keys())] if len(tool_calls) > 0 else None,
+        }
+        return message, finish_reason
+
     def start(self):
         if self.is_start is True:
             return
         self.is_start = True
 
-        async def _run_task_loop():
-            while True:
-                task = await self.task_queue.get()
-                logger.info(f"openai_node get task: {task.display()}")
+        async def _process_task(task: ComputeTask):
+            logger.info(f"openai_node get task: {task.display()}")
+            try:
                 result = await self._run_task(task)
-                if result is not None:
-                    task.result = result
-                    task.state = ComputeTaskState.DONE
+            except Exception as e:
+                logger.error(f"openai_node run task error: {e}")
+                task.error_str = str(e)
+                result = None
 
-        asyncio.create_task(_run_task_loop())
+            if task.state == ComputeTaskState.PENDING:
+                # rate limited, the task is put back to queue
+                return
 
-    def display(self) -> str:
-        return f"OpenAI_ComputeNode: {self.node_id}"
+            if result is None:
+                task.set_done(state=ComputeTaskState.ERROR)
+            elif result.result_code == ComputeTaskResultCode.OK:
+                task.set_done(result, ComputeTaskState.DONE)
+            else:
+                task.set_done(result, ComputeTaskState.ERROR)
 
-    def get_task_state(self, task_id: str):
-        pass
+        asyncio.create_task(self._dispatch_task_loop(self.task_queue, _process_task))
 
-    def get_capacity(self):
-        pass
+    def display(self) -> str:
+        return f"OpenAI_ComputeNode: {self.node_id}"
 
 
     def is_support(self, task: ComputeTask) -> bool:
@@ -324,3 +412,6 @@ class OpenAI_ComputeNode(ComputeNode):
 
     def is_local(self) -> bool:
         return False
+
+    def get_fee_type(self) -> str:
+        return "token"
@@ -0,0 +1,47 @@
+import asyncio
+import logging
+
+import httpx
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+# One long-lived AsyncOpenAI client per api key, shared by all the openai nodes.
+# The httpx connection pool keeps the TLS connections alive between the calls.
+# A httpx client is bound to the event loop which uses it first, the client is recreated if the loop is changed.
+class OpenAIClientPool:
+    _instance = None
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = OpenAIClientPool()
+        return cls._instance
+
+    def __init__(self) -> None:
+        self.max_connections = 100
+        self.max_keepalive_connections = 20
+        self.keepalive_expiry = 60
+        self.timeout = httpx.Timeout(600, connect=10)
+        self.clients = {} # api_key -> (AsyncOpenAI, event loop)
+
+    def get_client(self, api_key: str) -> AsyncOpenAI:
+        loop = asyncio.get_running_loop()
+        client_item = self.clients.get(api_key)
+        if client_item is not None and client_item[1] is loop and not client_item[0].is_closed():
+            return client_item[0]
+
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_keepalive_connections,
+                                keepalive_expiry=self.keepalive_expiry),
+            timeout=self.timeout,
+        )
+        client = AsyncOpenAI(api_key=api_key, http_client=http_client)
+        self.clients[api_key] = (client, loop)
+        return client
+
+    async def close(self):
+        for client, loop in self.clients.values():
+            if loop is asyncio.get_running_loop():
+                await client.close()
+        self.clients = {}
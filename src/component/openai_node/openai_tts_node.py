@@ -4,7 +4,8 @@ import logging
 import os
 from asyncio import Queue
 
-from aios import ComputeNode, ComputeTask, ComputeTaskState, ComputeTaskResult, ComputeTaskType, AIStorage
+from aios import ComputeNode, ComputeTask, ComputeTaskState, ComputeTaskResult, ComputeTaskResultCode, ComputeTaskType, AIStorage
+from .openai_client import OpenAIClientPool
 
 logger = logging.getLogger(__name__)
 
@@ -45,16 +46,23 @@ class OpenAITTSComputeNode(ComputeNode):
                 task = await self.task_queue.get()
                 try:
                     result = await self._run_task(task)
-                    if result is not None:
-                        task.state = ComputeTaskState.DONE
-                        task.result = result
+                    if result is None:
+                        task.set_done(state=ComputeTaskState.ERROR)
+                    elif result.result_code == ComputeTaskResultCode.OK:
+                        task.set_done(result, ComputeTaskState.DONE)
+                    else:
+                        task.set_done(result, ComputeTaskState.ERROR)
                 except Exception as e:
                     logger.error(f"openai_tts_node run task error: {e}")
                     task.state = ComputeTaskState.ERROR
                     task.result = ComputeTaskResult()
                     task.result.set_from_task(task)
                     task.result.worker_id = self.node_id
+                    task.result.result_code = ComputeTaskResultCode.ERROR
                     task.result.result_str = str(e)
+                    task.result.error_str = str(e)
+                    task.error_str = str(e)
+                    task.set_done()
 
         asyncio.create_task(_run_task_loop())
 
@@ -75,7 +83,7 @@ class OpenAITTSComputeNode(ComputeNode):
         if model_name is None:
             model_name = 'tts-1'
 
-        client = AsyncOpenAI(api_key=self.openai_api_key)
+        client = OpenAIClientPool.get_instance().get_client(self.openai_api_key)
 
         response = await client.audio.speech.create(model=model_name, voice=voice, input=text)
 
@@ -114,5 +122,8 @@ class OpenAITTSComputeNode(ComputeNode):
         return False
 
 
+    def get_capabilities(self):
+        return [(ComputeTaskType.TEXT_2_VOICE, "tts-1"), (ComputeTaskType.TEXT_2_VOICE, "tts-1-hd")]
+
     def is_local(self) -> bool:
         return False
@@ -8,12 +8,12 @@ import logging
 import srt
 import webvtt
 
-from openai import AsyncOpenAI
 from openai.cli._progress import BufferReader
 from pydub import AudioSegment
 from datetime import timedelta
 
-from aios import AIStorage,ComputeNode,ComputeTask, ComputeTaskResult, ComputeTaskState, ComputeTaskType
+from aios import AIStorage,ComputeNode,ComputeTask, ComputeTaskResult, ComputeTaskResultCode, ComputeTaskState, ComputeTaskType
+from .openai_client import OpenAIClientPool
 
 logger = logging.getLogger(__name__)
 
@@ -63,9 +63,12 @@ class WhisperComputeNode(ComputeNode):
                 task = await self.task_queue.get()
                 try:
                     result = await self._run_task(task)
-                    if result is not None:
-                        task.state = ComputeTaskState.DONE
-                        task.result = result
+                    if result is None:
+                        task.set_done(state=ComputeTaskState.ERROR)
+                    elif result.result_code == ComputeTaskResultCode.OK:
+                        task.set_done(result, ComputeTaskState.DONE)
+                    else:
+                        task.set_done(result, ComputeTaskState.ERROR)
                 except Exception as e:
                     logger.error(f"whisper_node run task error: {e}")
                     logger.exception(e)
@@ -73,7 +76,11 @@ class WhisperComputeNode(ComputeNode):
                     task.result = ComputeTaskResult()
                     task.result.set_from_task(task)
                     task.result.worker_id = self.node_id
+                    task.result.result_code = ComputeTaskResultCode.ERROR
                     task.result.result_str = str(e)
+                    task.result.error_str = str(e)
+                    task.error_str = str(e)
+                    task.set_done()
 
         asyncio.create_task(_run_task_loop())
 
@@ -91,7 +98,7 @@ class WhisperComputeNode(ComputeNode):
             language = task.params["language"]
         file = task.params["file"]
 
-        client = AsyncOpenAI(api_key=self.openai_api_key)
+        client = OpenAIClientPool.get_instance().get_client(self.openai_api_key)
 
         if os.path.getsize(file) > 25 * 1024 * 1024:
             audio = AudioSegment.from_file(file)
@@ -222,5 +229,8 @@ class WhisperComputeNode(ComputeNode):
                 return True
         return False
 
+    def get_capabilities(self):
+        return [(ComputeTaskType.VOICE_2_TEXT, "openai-whisper")]
+
     def is_local(self) -> bool:
         return False
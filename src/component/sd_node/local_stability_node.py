@@ -181,6 +181,7 @@ class Local_Stability_ComputeNode(ComputeNode):
                 task = await self.task_queue.get()
                 logger.info(f"stability_node get task: {task.display()}")
                 result = self._run_task(task)
+                task.set_done(result)
                 # if result is not None:
                 #     task.state = ComputeTaskState.DONE
                 #     task.result = result
@@ -199,5 +200,8 @@ class Local_Stability_ComputeNode(ComputeNode):
     def is_support(self, task: ComputeTask) -> bool:
         return task.task_type == ComputeTaskType.TEXT_2_IMAGE
 
+    def get_capabilities(self):
+        return [(ComputeTaskType.TEXT_2_IMAGE, None)]
+
     def is_local(self) -> bool:
         return False
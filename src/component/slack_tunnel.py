@@ -13,7 +13,7 @@ from slack_bolt.adapter.socket_mode.websockets import AsyncSocketModeHandler
 from slack_bolt.app.async_app import AsyncApp
 
 #from aios import KnowledgeStore, ObjectType
-from aios.frame.tunnel import AgentTunnel
+from aios.frame.tunnel import AgentTunnel, StreamReplyEditor
 from aios.proto.agent_msg import AgentMsg, AgentMsgType
 from aios.storage.storage import AIStorage
 
@@ -178,10 +178,26 @@ class SlackTunnel(AgentTunnel):
                 agent_msg.body_mime = mime_type
 
 
+            async def _send_stream_reply(text):
+                return await app.client.chat_postMessage(channel=event["channel"], text=text)
+
+            async def _edit_stream_reply(sent_resp, text):
+                await app.client.chat_update(channel=sent_resp["channel"], ts=sent_resp["ts"], text=text)
+
+            async def _delete_stream_reply(sent_resp):
+                await app.client.chat_delete(channel=sent_resp["channel"], ts=sent_resp["ts"])
+
+            stream_editor = StreamReplyEditor(_send_stream_reply, _edit_stream_reply, delete_func=_delete_stream_reply)
+            agent_msg.stream_handler = stream_editor.on_delta
             resp_msg: AgentMsg = await self.ai_bus.send_message(agent_msg)
             if resp_msg is None:
+                await stream_editor.discard()
                 await app.client.chat_postMessage(channel=event["channel"], text=f"System Error: Timeout,{self.target_id}  no resopnse! Please check logs/aios.log for more details!")
             else:
+                is_text_msg = not (resp_msg.is_image_msg() or resp_msg.is_video_msg() or resp_msg.is_audio_msg())
+                if is_text_msg and await stream_editor.finish(resp_msg.body):
+                    return
+                await stream_editor.discard()
                 if resp_msg.body_mime is None:
                     if resp_msg.body is None:
                         return
@@ -1 +1,2 @@
 from .test_node import TestComputeNode
+from .mock_node import MockComputeNode, LatencyDistribution
@@ -0,0 +1,175 @@
+import math
+import json
+import asyncio
+import logging
+import random
+from typing import List
+
+from aios import ComputeTask, ComputeTaskResult, ComputeTaskResultCode, ComputeTaskState, ComputeTaskType, Queue_ComputeNode
+
+logger = logging.getLogger(__name__)
+
+# Latency of the mock node in seconds, sampled by the random generator of node so a run is repeatable
+class LatencyDistribution:
+    def __init__(self, mean: float, stddev: float = 0.0, kind: str = "fixed", per_token: float = 0.0) -> None:
+        self.mean = mean
+        self.stddev = stddev
+        self.kind = kind # fixed, normal, lognormal or exponential
+        self.per_token = per_token # added for every completion token
+
+    def sample(self, rng: random.Random, completion_tokens: int = 0) -> float:
+        match self.kind:
+            case "normal":
+                latency = rng.gauss(self.mean, self.stddev)
+            case "lognormal":
+                # mean and stddev of the latency, not of the underlying normal distribution
+                variance = self.stddev ** 2
+                sigma2 = math.log(1 + variance / (self.mean ** 2)) if self.mean > 0 else 0.0
+                mu = math.log(self.mean) - sigma2 / 2 if self.mean > 0 else 0.0
+                latency = rng.lognormvariate(mu, sigma2 ** 0.5)
+            case "exponential":
+                latency = rng.expovariate(1.0 / self.mean) if self.mean > 0 else 0.0
+            case _:
+                latency = self.mean
+        return max(latency, 0.0) + completion_tokens * self.per_token
+
+
+# Deterministic mock node for the benchmarks and tests, no network is used.
+# LLM_COMPLETION echoes the first echo_tokens words of the last user message, the token_usage counts words.
+# With enable_prefix_cache, the common prefix with the recent prompts is reported as cached_tokens like openai.
+# TEXT_EMBEDDING returns a vector computed from the text.
+# Capacity: max_in_flight tasks are running at the same time, the tasks beyond max_queue_depth are rejected at once.
+class MockComputeNode(Queue_ComputeNode):
+    def __init__(self, node_id: str = "mock_node", seed: int = 0) -> None:
+        super().__init__()
+        self.node_id = node_id
+        self.rng = random.Random(seed)
+
+        self.model_names : List[str] = None # None means any model
+        self.latency = {
+            ComputeTaskType.LLM_COMPLETION: LatencyDistribution(0.05),
+            ComputeTaskType.TEXT_EMBEDDING: LatencyDistribution(0.01),
+        }
+        self.error_rate = {} # ComputeTaskType -> error rate
+        self.echo_tokens = 16
+        self.max_queue_depth : int = None
+        self.fee_type = "free"
+        self.enable_prefix_cache = False
+        self.prefix_cache_size = 16
+        self.recent_prompts : List[str] = []
+
+        self.total_count = 0
+        self.error_count = 0
+        self.rejected_count = 0
+
+    def set_latency(self, task_type: ComputeTaskType, mean: float, stddev: float = 0.0, kind: str = "fixed", per_token: float = 0.0):
+        self.latency[task_type] = LatencyDistribution(mean, stddev, kind, per_token)
+
+    async def push_task(self, task: ComputeTask, proiority: int = 0):
+        if self.max_queue_depth is not None and self.task_queue.qsize() >= self.max_queue_depth:
+            self.rejected_count += 1
+            result = ComputeTaskResult()
+            result.result_code = ComputeTaskResultCode.ERROR
+            result.error_str = f"{self.display()} is overloaded"
+            result.worker_id = self.node_id
+            result.set_from_task(task)
+            task.error_str = result.error_str
+            task.set_done(result, ComputeTaskState.ERROR)
+            return
+        await super().push_task(task, proiority)
+
+    @staticmethod
+    def _get_echo_words(task: ComputeTask) -> List[str]:
+        for message in reversed(task.params.get("prompts", [])):
+            if message.get("role") == "user" and isinstance(message.get("content"), str):
+                return message["content"].split()
+        return []
+
+    def _get_cached_prefix(self, prompt_str: str) -> str:
+        prefix = ""
+        for recent_prompt in self.recent_prompts:
+            length = 0
+            for a, b in zip(recent_prompt, prompt_str):
+                if a != b:
+                    break
+                length += 1
+            if length > len(prefix):
+                prefix = prompt_str[:length]
+        self.recent_prompts.append(prompt_str)
+        if len(self.recent_prompts) > self.prefix_cache_size:
+            self.recent_prompts.pop(0)
+        return prefix
+
+    @staticmethod
+    def mock_embedding(text: str) -> List[float]:
+        return [float(len(text)), float(sum(ord(c) for c in text) % 997)]
+
+    async def execute_task(self, task: ComputeTask) -> ComputeTaskResult:
+        result = ComputeTaskResult()
+        result.result_code = ComputeTaskResultCode.ERROR
+        result.set_from_task(task)
+        result.worker_id = self.node_id
+        self.total_count += 1
+
+        latency_distribution = self.latency.get(task.task_type)
+        if latency_distribution is None:
+            result.error_str = f"ComputeTask's TaskType : {task.task_type} not support!"
+            return result
+
+        words = []
+        if task.task_type == ComputeTaskType.LLM_COMPLETION:
+            words = self._get_echo_words(task)[:self.echo_tokens]
+        latency = latency_distribution.sample(self.rng, len(words))
+        is_error = self.rng.random() < self.error_rate.get(task.task_type, 0.0)
+
+        if task.is_stream() and len(words) > 0:
+            for word in words:
+                await asyncio.sleep(latency / len(words))
+                task.push_stream_delta(word + " ")
+        else:
+            await asyncio.sleep(latency)
+
+        if is_error:
+            self.error_count += 1
+            result.error_str = "mock error"
+            return result
+
+        result.result_code = ComputeTaskResultCode.OK
+        if task.task_type == ComputeTaskType.LLM_COMPLETION:
+            content = " ".join(words)
+            prompt_str = json.dumps(task.params.get("prompts", []), ensure_ascii=False)
+            prompt_tokens = len(prompt_str.split())
+            result.result_str = content
+            result.result["message"] = {"role": "assistant", "content": content, "function_call": None, "tool_calls": None}
+            token_usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words), "total_tokens": prompt_tokens + len(words)}
+            if self.enable_prefix_cache:
+                # only the whole words of the prefix
+                cached_tokens = len(self._get_cached_prefix(prompt_str).split(" ")) - 1
+                token_usage["prompt_tokens_details"] = {"cached_tokens": max(cached_tokens, 0)}
+            result.result_refers["token_usage"] = token_usage
+        else:
+            input = task.params["input"]
+            if isinstance(input, list):
+                result.result["content"] = [self.mock_embedding(text) for text in input]
+            else:
+                result.result["content"] = self.mock_embedding(input)
+        return result
+
+    def display(self) -> str:
+        return f"MockComputeNode: {self.node_id}"
+
+    def is_support(self, task: ComputeTask) -> bool:
+        if task.task_type not in self.latency:
+            return False
+        model_name = task.params.get("model_name")
+        return self.model_names is None or not model_name or model_name in self.model_names
+
+    def get_capabilities(self):
+        model_names = self.model_names or [None]
+        return [(task_type, model_name) for task_type in self.latency.keys() for model_name in model_names]
+
+    def is_local(self) -> bool:
+        return True
+
+    def get_fee_type(self) -> str:
+        return self.fee_type
@@ -3,7 +3,6 @@ import openai
 from openai import AsyncOpenAI
 import os
 import asyncio
-from asyncio import Queue
 import logging
 import json
 import aiohttp
@@ -14,6 +13,7 @@ import random
 
 from aios import ComputeTask, ComputeTaskResult, ComputeTaskState, ComputeTaskType,ComputeTaskResultCode,ComputeNode,AIStorage,UserConfig
 from aios import image_utils
+from aios.frame.compute_task_queue import ComputeTaskQueue
 
 logger = logging.getLogger(__name__)
 
@@ -35,12 +35,15 @@ class TestComputeNode(ComputeNode):
 
         self.is_start = False
         self.node_id = "test_node"
-        self.task_queue = Queue()
+        self.task_queue = ComputeTaskQueue()
 
         self.support_task_types = []
         self.mock_running_time = {} # taks_type -> running_time in seconds
         self.mock_error_rate = {}  # task_type -> error rate
         self.mock_task_load = {}  # task_type -> load
+        self.mock_fee_type = "free"
+        self.mock_stream_deltas = ["fin", "ish", "ed"] # pushed one by one in the running time if the task is streaming
+        self.embedding_batch_sizes = [] # the input count of every TEXT_EMBEDDING task
         self.ability = 10 # the ability to handel the task, the larger the number, a task can ba handle better
         self.current_load = 0 # the current load of the node, the larger the number, the more busy the node is
 
@@ -53,9 +56,6 @@ class TestComputeNode(ComputeNode):
         self.current_load += self.mock_task_load.get(task.task_type)
         self.task_queue.put_nowait(task)
 
-    async def remove_task(self, task_id: str):
-        pass
-
     def message_to_dict(self, message)->dict:
         result = message.dict()
         return result
@@ -73,7 +73,13 @@ class TestComputeNode(ComputeNode):
 
         if task.task_type in self.support_task_types:
             try:   
-                await asyncio.sleep(self.mock_running_time.get(task.task_type))  # simulate running time
+                running_time = self.mock_running_time.get(task.task_type)
+                if task.is_stream():
+                    for delta in self.mock_stream_deltas:
+                        await asyncio.sleep(running_time / len(self.mock_stream_deltas))
+                        task.push_stream_delta(delta)
+                else:
+                    await asyncio.sleep(running_time)  # simulate running time
 
                 # randomly throw an error to test error handling
                 if random.random() < self.mock_error_rate.get(task.task_type):
@@ -91,40 +97,48 @@ class TestComputeNode(ComputeNode):
         task.state = ComputeTaskState.DONE
         result.result_code = ComputeTaskResultCode.OK
         result.worker_id = self.node_id
-        result.result_str = "finished"
+        result.result_str = "".join(self.mock_stream_deltas) if task.is_stream() else "finished"
+        if task.task_type == ComputeTaskType.TEXT_EMBEDDING:
+            input = task.params["input"]
+            if isinstance(input, list):
+                self.embedding_batch_sizes.append(len(input))
+                result.result["content"] = [self.mock_embedding(text) for text in input]
+            else:
+                self.embedding_batch_sizes.append(1)
+                result.result["content"] = self.mock_embedding(input)
         self.current_load -= self.mock_task_load.get(task.task_type)
         return result
 
 
+    @staticmethod
+    def mock_embedding(text: str) -> [float]:
+        return [float(len(text)), float(sum(ord(c) for c in text) % 997)]
+
     def start(self):
         if self.is_start is True:
             return
         self.is_start = True
 
-        async def _run_task_loop():
-            while True:
-                task = await self.task_queue.get()
-                logger.info(f"openai_node get task: {task.display()}")
-                result = await self._run_task(task)
-                if result is not None:
-                    task.result = result
-                    task.state = ComputeTaskState.DONE
+        async def _process_task(task: ComputeTask):
+            logger.info(f"{self.node_id} get task: {task.display()}")
+            result = await self._run_task(task)
+            task.set_done(result)
 
-        asyncio.create_task(_run_task_loop())
+        asyncio.create_task(self._dispatch_task_loop(self.task_queue, _process_task))
 
     def display(self) -> str:
         return f"{self.node_id}"
 
-    def get_task_state(self, task_id: str):
-        pass
-
-    def get_capacity(self):
-        pass
-
     def is_support(self, task: ComputeTask) -> bool:
         if task.task_type in self.support_task_types:
             return True
         return False
 
+    def get_capabilities(self):
+        return [(task_type, None) for task_type in self.support_task_types]
+
     def is_local(self) -> bool:
         return False
+
+    def get_fee_type(self) -> str:
+        return self.mock_fee_type
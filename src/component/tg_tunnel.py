@@ -12,7 +12,7 @@ from telegram import Bot
 from telegram.ext import Updater
 from telegram.error import Forbidden, NetworkError
 
-from aios import AgentTunnel,AIStorage,ContactManager,Contact,AgentMsg,AgentMsgType
+from aios import AgentTunnel,AIStorage,ContactManager,Contact,AgentMsg,AgentMsgType,StreamReplyEditor
 
 logger = logging.getLogger(__name__)
 
@@ -362,19 +362,30 @@ class TelegramTunnel(AgentTunnel):
 
         agent_msg.sender = reomte_user_name
         logger.info(f"process message {agent_msg.msg_id} from {agent_msg.sender} to {agent_msg.target}")
+        stream_editor = None
         if agent_msg.msg_type == AgentMsgType.TYPE_GROUPMSG:
             self.ai_bus.register_message_handler(agent_msg.target, self._process_message)
             resp_msg: AgentMsg = await self.ai_bus.send_message(agent_msg,self.target_id,agent_msg.target)
         else:
             #self.ai_bus.register_message_handler(reomte_user_name, self._process_message)
+            stream_editor = StreamReplyEditor(update.message.reply_text,lambda sent_msg,text: sent_msg.edit_text(text),
+                                              delete_func=lambda sent_msg: sent_msg.delete())
+            agent_msg.stream_handler = stream_editor.on_delta
             resp_msg: AgentMsg = await self.ai_bus.send_message(agent_msg)
         #await bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
 
 
 
         if resp_msg is None:
+            if stream_editor is not None:
+                await stream_editor.discard()
             await update.message.reply_text(f"System Error: Timeout,{self.target_id}  no resopnse! Please check logs/aios.log for more details!")
         else:
+            is_text_msg = not (resp_msg.is_image_msg() or resp_msg.is_video_msg() or resp_msg.is_audio_msg())
+            if stream_editor is not None and is_text_msg and await stream_editor.finish(resp_msg.body):
+                return
+            if stream_editor is not None:
+                await stream_editor.discard()
             await self.conver_agent_msg_to_tg_msg(resp_msg,update)
 
            
@@ -87,6 +87,7 @@ class AIOS_Shell:
         openai_node.declare_user_config()
 
         user_config.add_user_config("shell.current","last opened target and topic",True,"default@Jarvis")
+        user_config.add_user_config("metrics_port","port of the metrics endpoint http://127.0.0.1:$port/metrics, empty means disabled",True,None)
         proxy.declare_user_config()
 
         # google_text_to_speech = GoogleTextToSpeechNode.get_instance()
@@ -183,6 +184,10 @@ class AIOS_Shell:
             await dall_e_node.start()
             ComputeKernel.get_instance().add_compute_node(dall_e_node)
 
+        metrics_port = AIStorage.get_instance().get_user_config().get_value("metrics_port")
+        if metrics_port:
+            await MetricsRegistry.get_instance().start_server(port=int(metrics_port))
+
         llama_nodes = ComputeNodeConfig.get_instance().initial()
         for llama_node in llama_nodes:
             llama_node.start()
@@ -433,6 +438,7 @@ class AIOS_Shell:
     async def handle_node_commands(self, args):
         show_text = FormattedText([("class:title", "sub command not support!\n" 
                               "/node add $model_name $url\n"
+                              "/node add remote $worker_url [$token]\n"
                               "/node create\n"
                               "/node rm $model_name $url\n"
                               "/node list\n")])
@@ -447,9 +453,15 @@ class AIOS_Shell:
 
             model_name = args[1]
             url = args[2]
-            ComputeNodeConfig.get_instance().add_node("llama", url, model_name)
-            ComputeNodeConfig.get_instance().save()
-            node = LocalLlama_ComputeNode(url, model_name)
+            if model_name == "remote":
+                token = args[3] if len(args) > 3 else None
+                ComputeNodeConfig.get_instance().add_node("remote", url, None, token)
+                ComputeNodeConfig.get_instance().save()
+                node = RemoteComputeNode(url, token=token)
+            else:
+                ComputeNodeConfig.get_instance().add_node("llama", url, model_name)
+                ComputeNodeConfig.get_instance().save()
+                node = LocalLlama_ComputeNode(url, model_name)
             node.start()
             ComputeKernel.get_instance().add_compute_node(node)
         elif sub_cmd == "rm":
@@ -458,7 +470,7 @@ class AIOS_Shell:
 
             model_name = args[1]
             url = args[2]
-            ComputeNodeConfig.get_instance().remove_node("llama", url, model_name)
+            ComputeNodeConfig.get_instance().remove_node("remote" if model_name == "remote" else "llama", url, model_name)
             ComputeNodeConfig.get_instance().save()
         elif sub_cmd == "list":
             print_formatted_text(ComputeNodeConfig.get_instance().list())
@@ -668,6 +680,14 @@ class AIOS_Shell:
                 return FormattedText([("class:title", f"chatsession not found")])
             case 'node':
                 return await self.handle_node_commands(args)
+            case 'metrics':
+                # /metrics [$name_filter], the lines of the metrics which name contains the filter
+                lines = MetricsRegistry.get_instance().expose().splitlines()
+                if len(args) > 0:
+                    lines = [line for line in lines if args[0] in line]
+                else:
+                    lines = [line for line in lines if not line.startswith("#")]
+                return FormattedText([("class:content", "\n".join(lines))])
             case 'exit':
                 os._exit(0)
             case 'help':
@@ -859,9 +879,11 @@ async def main():
                                '/enable $feature',
                                '/disable $feature',
                                '/node add $model_name $url',
+                               '/node add remote $worker_url [$token]',
                                '/node create',
                                '/node rm $model_name $url',
                                '/node list',
+                               '/metrics $name_filter',
                                '/show',
                                '/exit',
                                '/help'], ignore_case=True)
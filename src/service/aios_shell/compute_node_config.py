@@ -8,9 +8,15 @@ Configuration for nodes:
 |   └── 0
 |   |   └── url
 |   |   └── model_name
+|   |   └── replica_urls (optional, other llama servers of the same model)
+|   |   └── max_in_flight (optional, default 1 per server)
 |   └── 1
 |       └── url
 |       └── model_name
+│ └── remote
+|   └── 0
+|       └── url (ws://host:port/compute_node of a compute worker)
+|       └── token (optional, the shared token of the compute worker)
 ```
 """
 import logging
@@ -21,7 +27,7 @@ import os
 import toml
 
 
-from aios import AIStorage
+from aios import AIStorage, ComputeNode, RemoteComputeNode
 directory = os.path.dirname(__file__)
 sys.path.append(directory + '/../../component/')
 
@@ -40,7 +46,7 @@ class ComputeNodeConfig:
 
         return cls._instance
     
-    def initial(self) -> List[LocalLlama_ComputeNode]:
+    def initial(self, include_remote: bool = True) -> List[ComputeNode]:
         config_path = self.__config_path()
         logging.info(f"initial nodes from {config_path}")
 
@@ -50,12 +56,19 @@ class ComputeNodeConfig:
                 return []
             
             nodes = []
-            llama_nodes_cfg = self.config["llama"]
+            llama_nodes_cfg = self.config.get("llama")
             if llama_nodes_cfg is not None:
                 for cfg in llama_nodes_cfg:
-                    node = LocalLlama_ComputeNode(url=cfg["url"], model_name=cfg["model_name"])
+                    node = LocalLlama_ComputeNode(url=cfg["url"], model_name=cfg["model_name"], replica_urls=cfg.get("replica_urls"))
+                    node.max_in_flight = cfg.get("max_in_flight", len(node.replicas))
                     nodes.append(node)
 
+            # a compute worker hosts only the local nodes, it doesn't connect to the other workers
+            remote_nodes_cfg = self.config.get("remote") if include_remote else None
+            if remote_nodes_cfg is not None:
+                for cfg in remote_nodes_cfg:
+                    nodes.append(RemoteComputeNode(cfg["url"], token=cfg.get("token")))
+
             return nodes
 
         return []
@@ -64,7 +77,7 @@ class ComputeNodeConfig:
         with open(self.__config_path(), "w") as f:
             toml.dump(self.config, f)
         
-    def add_node(self, model_type: str, url: str, model_name: str):
+    def add_node(self, model_type: str, url: str, model_name: str, token: str = None):
         if model_type == "llama":
             llama_nodes_cfg = self.config.get("llama") or []
             for cfg in llama_nodes_cfg:
@@ -72,6 +85,16 @@ class ComputeNodeConfig:
                     return
             llama_nodes_cfg.append({"url": url, "model_name": model_name})
             self.config["llama"] = llama_nodes_cfg
+        elif model_type == "remote":
+            remote_nodes_cfg = self.config.get("remote") or []
+            for cfg in remote_nodes_cfg:
+                if url == cfg["url"]:
+                    return
+            node_cfg = {"url": url}
+            if token:
+                node_cfg["token"] = token
+            remote_nodes_cfg.append(node_cfg)
+            self.config["remote"] = remote_nodes_cfg
     
     
     def remove_node(self, model_type: str, url: str, model_name: str):
@@ -83,6 +106,9 @@ class ComputeNodeConfig:
                     llama_nodes_cfg.pop(i)
                 else:
                     i += 1
+        elif model_type == "remote":
+            remote_nodes_cfg = self.config.get("remote") or []
+            self.config["remote"] = [cfg for cfg in remote_nodes_cfg if cfg["url"] != url]
 
     def list(self) -> str:
         return toml.dumps(self.config)
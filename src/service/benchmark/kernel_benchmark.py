@@ -0,0 +1,254 @@
+# load benchmark of the compute kernel and the agent pipeline on mock compute nodes, no network is used.
+# kernel mode: concurrent llm completions -> ComputeKernel -> MockComputeNode
+# agent mode: concurrent messages -> AIBus -> AIAgent -> AgentMessageProcess -> ComputeKernel -> MockComputeNode
+# python kernel_benchmark.py --mode agent --agents 4 --concurrency 16 --messages 200
+import asyncio
+import sys
+import os
+import gc
+import json
+import math
+import shutil
+import logging
+import argparse
+import tempfile
+from typing import List
+
+directory = os.path.dirname(__file__)
+sys.path.append(directory + '/../../')
+sys.path.append(directory + '/../../component/')
+
+from aios import AIBus, AgentMsg, ComputeKernel, ComputeTaskResultCode, ComputeTaskType, LLMPrompt
+from aios.agent.agent import AIAgent
+from aios.agent.agent_memory import AgentMemory
+from test_node import MockComputeNode
+
+logger = logging.getLogger(__name__)
+
+
+class BenchmarkConfig:
+    def __init__(self) -> None:
+        self.mode = "kernel" # kernel or agent
+        self.node_count = 2
+        self.max_in_flight = 4 # of every node
+        self.latency = 0.05 # mean latency of mock node, seconds
+        self.latency_stddev = 0.01
+        self.latency_kind = "normal"
+        self.error_rate = 0.0
+        self.enable_prefix_cache = False # mock the prefix cache of provider
+        self.agent_count = 4
+        self.concurrency = 16 # messages (or completions) in flight
+        self.message_count = 200
+        self.model_name = "gpt-4"
+        self.timeout = 60
+        self.seed = 0
+
+
+def percentile(values: List[float], p: float) -> float:
+    # nearest-rank, same as ComputeNodeStats
+    if len(values) == 0:
+        return None
+    values = sorted(values)
+    return values[max(math.ceil(p * len(values)), 1) - 1]
+
+
+# measure how late the event loop wakes up a sleeping task, the blocking calls in loop make it larger
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.01) -> None:
+        self.interval = interval
+        self.samples = []
+        self.task : asyncio.Task = None
+
+    def start(self):
+        async def _monitor():
+            loop = asyncio.get_running_loop()
+            while True:
+                start_time = loop.time()
+                await asyncio.sleep(self.interval)
+                self.samples.append(max(loop.time() - start_time - self.interval, 0.0))
+        self.task = asyncio.create_task(_monitor())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def to_dict(self) -> dict:
+        return {
+            "p50": percentile(self.samples, 0.5),
+            "p99": percentile(self.samples, 0.99),
+            "max": max(self.samples) if len(self.samples) > 0 else None,
+        }
+
+
+class KernelBenchmark:
+    def __init__(self, config: BenchmarkConfig) -> None:
+        self.config = config
+        self.kernel : ComputeKernel = None
+        self.nodes : List[MockComputeNode] = []
+        self.latencies = []
+        self.error_count = 0
+        self.data_dir : str = None
+        self.agents : List[AIAgent] = []
+
+    async def setup(self):
+        # a new kernel as the global instance, the llm processes use ComputeKernel.get_instance()
+        self.old_kernel = ComputeKernel._instance
+        self.kernel = ComputeKernel()
+        ComputeKernel._instance = self.kernel
+        for i in range(self.config.node_count):
+            node = MockComputeNode(f"mock_node_{i}", seed=self.config.seed + i)
+            node.max_in_flight = self.config.max_in_flight
+            node.set_latency(ComputeTaskType.LLM_COMPLETION, self.config.latency, self.config.latency_stddev, self.config.latency_kind)
+            node.error_rate[ComputeTaskType.LLM_COMPLETION] = self.config.error_rate
+            node.enable_prefix_cache = self.config.enable_prefix_cache
+            node.start()
+            self.kernel.add_compute_node(node)
+            self.nodes.append(node)
+        await self.kernel.start()
+
+        if self.config.mode == "agent":
+            self.bus = AIBus()
+            self.data_dir = tempfile.mkdtemp(prefix="aios_benchmark_")
+            for i in range(self.config.agent_count):
+                self.agents.append(await self._create_agent(f"bench_agent_{i}"))
+            for i in range(self.config.concurrency):
+                # the senders only receive the resps
+                self.bus.register_message_handler(f"bench_user_{i}", None)
+
+    async def _create_agent(self, agent_id: str) -> AIAgent:
+        agent = AIAgent()
+        config = {
+            "instance_id": agent_id,
+            "fullname": agent_id,
+            "llm_model_name": self.config.model_name,
+            "behavior": {
+                "on_message": {
+                    "type": "AgentMessageProcess",
+                    "role_desc": "You are a benchmark agent, reply the message.",
+                    "model_name": self.config.model_name,
+                    "timeout": self.config.timeout,
+                },
+            },
+        }
+        if await agent.load_from_config(config) is False:
+            raise RuntimeError(f"load benchmark agent {agent_id} failed")
+        # no wake_up, the self thinking timer would add its own load
+        agent.memory = AgentMemory(agent_id, f"{self.data_dir}/{agent_id}/memory")
+        for process in agent.behaviors.values():
+            await process.initial({"memory": agent.memory})
+        self.bus.register_message_handler(agent_id, agent._process_msg)
+        return agent
+
+    def teardown(self):
+        ComputeKernel._instance = self.old_kernel
+        if self.data_dir is not None:
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    async def _send_completion(self, index: int) -> bool:
+        prompt = LLMPrompt(f"benchmark message {index} " + "hello " * 8)
+        result = await self.kernel.do_llm_completion(prompt, mode_name=self.config.model_name, timeout=self.config.timeout)
+        return result.result_code == ComputeTaskResultCode.OK
+
+    async def _send_message(self, sender_id: str, index: int) -> bool:
+        msg = AgentMsg()
+        msg.sender = sender_id
+        msg.target = self.agents[index % len(self.agents)].agent_id
+        msg.topic = "benchmark"
+        msg.body = f"benchmark message {index} " + "hello " * 8
+        resp = await self.bus.send_message(msg)
+        return resp is not None and resp.body is not None and not resp.body.startswith("error")
+
+    async def run(self) -> dict:
+        await self.setup()
+        try:
+            return await self._run()
+        finally:
+            self.teardown()
+
+    async def _run(self) -> dict:
+        next_index = 0
+        loop = asyncio.get_running_loop()
+
+        async def _worker(worker_index: int):
+            nonlocal next_index
+            while next_index < self.config.message_count:
+                index = next_index
+                next_index += 1
+                start_time = loop.time()
+                if self.config.mode == "agent":
+                    is_ok = await self._send_message(f"bench_user_{worker_index}", index)
+                else:
+                    is_ok = await self._send_completion(index)
+                self.latencies.append(loop.time() - start_time)
+                if not is_ok:
+                    self.error_count += 1
+
+        gc.collect()
+        lag_monitor = LoopLagMonitor()
+        lag_monitor.start()
+        start_time = loop.time()
+        await asyncio.gather(*[_worker(i) for i in range(self.config.concurrency)])
+        duration = loop.time() - start_time
+        lag_monitor.stop()
+
+        report = {
+            "mode": self.config.mode,
+            "messages": self.config.message_count,
+            "concurrency": self.config.concurrency,
+            "duration": duration,
+            "throughput": self.config.message_count / duration if duration > 0 else None,
+            "error_count": self.error_count,
+            "latency": {
+                "p50": percentile(self.latencies, 0.5),
+                "p95": percentile(self.latencies, 0.95),
+                "p99": percentile(self.latencies, 0.99),
+            },
+            "loop_lag": lag_monitor.to_dict(),
+            "nodes": {node.node_id: {"total_count": node.total_count, "in_flight_peak": node.in_flight_peak} for node in self.nodes},
+        }
+        if len(self.agents) > 0:
+            prompt_tokens = sum(process.prompt_token_count for agent in self.agents for process in agent.behaviors.values())
+            cached_tokens = sum(process.cached_token_count for agent in self.agents for process in agent.behaviors.values())
+            report["prompt_cache_hit_ratio"] = cached_tokens / prompt_tokens if prompt_tokens > 0 else 0.0
+        return report
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="OpenDAN compute kernel benchmark")
+    parser.add_argument("--mode", choices=["kernel", "agent"], default="kernel")
+    parser.add_argument("--nodes", type=int, default=2)
+    parser.add_argument("--max_in_flight", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--latency_stddev", type=float, default=0.01)
+    parser.add_argument("--latency_kind", choices=["fixed", "normal", "lognormal", "exponential"], default="normal")
+    parser.add_argument("--error_rate", type=float, default=0.0)
+    parser.add_argument("--prefix_cache", action="store_true", help="mock the prefix cache of provider")
+    parser.add_argument("--agents", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    config = BenchmarkConfig()
+    config.mode = args.mode
+    config.node_count = args.nodes
+    config.max_in_flight = args.max_in_flight
+    config.latency = args.latency
+    config.latency_stddev = args.latency_stddev
+    config.latency_kind = args.latency_kind
+    config.error_rate = args.error_rate
+    config.enable_prefix_cache = args.prefix_cache
+    config.agent_count = args.agents
+    config.concurrency = args.concurrency
+    config.message_count = args.messages
+    config.seed = args.seed
+
+    report = await KernelBenchmark(config).run()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
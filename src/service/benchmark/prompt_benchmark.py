@@ -0,0 +1,111 @@
+# allocation and latency of a multimodal turn: a prompt with the frames of a video, forked for an inner function round.
+# python prompt_benchmark.py --frames 10 --frame_size 200000
+import asyncio
+import sys
+import os
+import copy
+import json
+import time
+import base64
+import argparse
+import tracemalloc
+
+directory = os.path.dirname(__file__)
+sys.path.append(directory + '/../../')
+sys.path.append(directory + '/../../component/')
+
+from aios import ComputeKernel, ComputeTaskType, LLMPrompt, TokenCounter
+from test_node import MockComputeNode
+
+
+def create_video_prompt(frame_count: int, frame_size: int) -> LLMPrompt:
+    # like AgentMessageProcess.get_prompt_from_msg of a video message
+    prompt = LLMPrompt()
+    prompt.append_system_message("You are a helpful assistant. " * 100)
+    content = [{"type": "text", "text": "What happens in this video?"}]
+    for i in range(frame_count):
+        frame = "data:image/jpeg;base64," + base64.b64encode(os.urandom(frame_size)).decode()
+        content.append({"type": "image_url", "image_url": {"url": frame}})
+    prompt.messages = [{"role": "user", "content": content}]
+    return prompt
+
+
+def measure(func, repeat: int = 3) -> dict:
+    # average latency and peak allocation
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    for i in range(repeat):
+        func()
+    duration = (time.perf_counter() - start_time) / repeat
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"latency_ms": duration * 1000, "peak_alloc_mb": peak / 1e6}
+
+
+def text_token_count(prompt: LLMPrompt) -> int:
+    # the base64 of images encoded as text, the old way to count the tokens of prompt
+    messages = prompt.to_message_list()
+    return sum(TokenCounter.count(json.dumps(message, ensure_ascii=False)) for message in messages)
+
+
+def append_function_round(prompt: LLMPrompt):
+    prompt.messages.append({"role": "assistant", "content": None, "function_call": {"name": "lookup", "arguments": "{}"}})
+    prompt.messages.append({"role": "function", "name": "lookup", "content": "lookup result"})
+
+
+async def create_kernel() -> ComputeKernel:
+    kernel = ComputeKernel()
+    node = MockComputeNode()
+    node.set_latency(ComputeTaskType.LLM_COMPLETION, 0)
+    node.start()
+    kernel.add_compute_node(node)
+    await kernel.start()
+    return kernel
+
+
+async def measure_turn(kernel: ComputeKernel, prompt: LLMPrompt, use_fork: bool, repeat: int = 3) -> dict:
+    # one completion, an inner function round on the copy of prompt, and the follow-up completion.
+    # the kernel and the mock node serialize the prompt too, it's the same in both modes
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    for i in range(repeat):
+        turn_prompt = copy.deepcopy(prompt) if not use_fork else prompt.fork()
+        ComputeKernel.llm_num_tokens(turn_prompt)
+        await kernel.do_llm_completion(turn_prompt, mode_name="gpt-4")
+        call_prompt = turn_prompt.fork() if use_fork else copy.deepcopy(turn_prompt)
+        append_function_round(call_prompt)
+        ComputeKernel.llm_num_tokens(call_prompt)
+        await kernel.do_llm_completion(call_prompt, mode_name="gpt-4")
+    duration = (time.perf_counter() - start_time) / repeat
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"latency_ms": duration * 1000, "peak_alloc_mb": peak / 1e6}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="OpenDAN multimodal prompt benchmark")
+    parser.add_argument("--frames", type=int, default=10)
+    parser.add_argument("--frame_size", type=int, default=200000, help="bytes of every frame before base64")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    prompt = create_video_prompt(args.frames, args.frame_size)
+    TokenCounter.get_encoding(None)
+    kernel = await create_kernel()
+
+    report = {
+        "frames": args.frames,
+        "prompt_mb": sum(len(json.dumps(message)) for message in prompt.to_message_list()) / 1e6,
+        "deepcopy": measure(lambda: copy.deepcopy(prompt), args.repeat),
+        "fork": measure(lambda: append_function_round(prompt.fork()), args.repeat),
+        "text_token_count": measure(lambda: text_token_count(prompt), 1),
+        "token_count_cold": measure(lambda: create_video_prompt(args.frames, 16).get_token_count(), args.repeat),
+        "token_count_forked": measure(lambda: prompt.fork().get_token_count(), args.repeat),
+        "turn_deepcopy": await measure_turn(kernel, prompt, False, args.repeat),
+        "turn_fork": await measure_turn(kernel, prompt, True, args.repeat),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+# compute worker daemon, hosts the local compute nodes for the OpenDAN instances on other machines.
+# add the worker to OpenDAN by the [[remote]] section of compute_nodes.cfg.toml, or /node add remote ws://host:port/compute_node $token
+# it listens on 127.0.0.1 by default, a shared token (--token or OPENDAN_COMPUTE_WORKER_TOKEN) is required to listen on other addresses
+import asyncio
+import sys
+import os
+import logging
+import argparse
+
+directory = os.path.dirname(__file__)
+sys.path.append(directory + '/../../')
+sys.path.append(directory + '/../../component/')
+
+from aios import AIStorage, ComputeNodeWorker, ComputeTaskType
+from llama_node import LocalLlama_ComputeNode
+
+logger = logging.getLogger(__name__)
+
+
+async def create_nodes(args) -> list:
+    nodes = []
+    for url, model_name in args.llama or []:
+        node = LocalLlama_ComputeNode(url, model_name)
+        node.max_in_flight = args.max_in_flight
+        nodes.append(node)
+
+    if args.node_config:
+        sys.path.append(directory + '/../aios_shell/')
+        from compute_node_config import ComputeNodeConfig
+        nodes.extend(ComputeNodeConfig.get_instance().initial(include_remote=False))
+
+    if args.stability or args.whisper or args.tts:
+        # these nodes read the api key and urls from the user config of OpenDAN
+        await AIStorage.get_instance().initial()
+    if args.stability:
+        from sd_node import Local_Stability_ComputeNode
+        node = Local_Stability_ComputeNode.get_instance()
+        if await node.initial() is True:
+            nodes.append(node)
+        else:
+            logger.error("local stability node initial failed!")
+    if args.whisper:
+        from openai_node import WhisperComputeNode
+        nodes.append(WhisperComputeNode.get_instance())
+    if args.tts:
+        from openai_node import OpenAITTSComputeNode
+        nodes.append(OpenAITTSComputeNode.get_instance())
+
+    if args.test_node:
+        # mock node, used to test the remote protocol with two local processes
+        from test_node import TestComputeNode
+        node = TestComputeNode()
+        node.node_id = "worker_test_node"
+        node.max_in_flight = args.max_in_flight
+        node.support_task_types = [ComputeTaskType.LLM_COMPLETION, ComputeTaskType.TEXT_EMBEDDING]
+        for task_type in node.support_task_types:
+            node.mock_running_time[task_type] = 0.1
+            node.mock_error_rate[task_type] = 0.0
+            node.mock_task_load[task_type] = 1
+        nodes.append(node)
+    return nodes
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="OpenDAN compute worker")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--worker_id", default=None)
+    parser.add_argument("--token", default=os.environ.get("OPENDAN_COMPUTE_WORKER_TOKEN"), help="shared token of the remote compute nodes")
+    parser.add_argument("--max_in_flight", type=int, default=1, help="concurrent tasks of every llama or test node")
+    parser.add_argument("--llama", nargs=2, action="append", metavar=("URL", "MODEL_NAME"), help="host a llama server")
+    parser.add_argument("--node_config", action="store_true", help="host the llama nodes of compute_nodes.cfg.toml")
+    parser.add_argument("--stability", action="store_true", help="host the local stable diffusion node")
+    parser.add_argument("--whisper", action="store_true", help="host the whisper node")
+    parser.add_argument("--tts", action="store_true", help="host the openai tts node")
+    parser.add_argument("--test_node", action="store_true", help="host a mock node")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s]%(name)s[%(levelname)s]: %(message)s')
+
+    nodes = await create_nodes(args)
+    if len(nodes) < 1:
+        print("no compute node to host!")
+        return 1
+
+    worker = ComputeNodeWorker(args.worker_id or f"compute_worker:{args.port}", args.token)
+    for node in nodes:
+        node.start()
+        worker.add_node(node)
+    try:
+        await worker.start(args.host, args.port)
+    except ValueError as e:
+        print(f"{e}, set --token to listen on {args.host}")
+        return 1
+    print(f"compute worker {worker.worker_id} ready, listen on {args.host}:{args.port}")
+
+    while True:
+        await asyncio.sleep(3600)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,91 @@
+import os
+import sys
+import asyncio
+import unittest
+
+directory = os.path.dirname(__file__)
+sys.path.insert(0, os.path.abspath(os.path.join(directory, "..", "src")))
+sys.path.insert(0, os.path.abspath(os.path.join(directory, "..", "src", "component")))
+sys.path.insert(0, os.path.abspath(os.path.join(directory, "..", "src", "service", "benchmark")))
+
+from aios import ComputeKernel, ComputeTask, ComputeTaskResultCode, ComputeTaskType, ComputeTaskState, LLMPrompt
+from test_node import MockComputeNode, LatencyDistribution
+from kernel_benchmark import BenchmarkConfig, KernelBenchmark, percentile
+
+
+class TestMockComputeNode(unittest.IsolatedAsyncioTestCase):
+    async def test_echo(self):
+        node = MockComputeNode(seed=1)
+        node.set_latency(ComputeTaskType.LLM_COMPLETION, 0.01)
+        node.echo_tokens = 3
+        node.start()
+        kernel = ComputeKernel()
+        kernel.add_compute_node(node)
+        await kernel.start()
+
+        result = await kernel.do_llm_completion(LLMPrompt("one two three four"), mode_name="gpt-4", timeout=5)
+        self.assertEqual(result.result_code, ComputeTaskResultCode.OK)
+        self.assertEqual(result.result_str, "one two three")
+        self.assertEqual(result.result_refers["token_usage"]["completion_tokens"], 3)
+
+        deltas = [delta async for delta in kernel.llm_completion_stream(LLMPrompt("a b"), mode_name="gpt-4", timeout=5)]
+        self.assertEqual(deltas, ["a ", "b "])
+
+    def test_deterministic_latency(self):
+        import random
+        distribution = LatencyDistribution(0.05, 0.02, "lognormal")
+        samples = [distribution.sample(random.Random(7)) for _ in range(2)]
+        self.assertEqual(samples[0], samples[1])
+        self.assertGreater(samples[0], 0)
+        self.assertAlmostEqual(LatencyDistribution(0.1, per_token=0.01).sample(random.Random(), 5), 0.15)
+
+    async def test_capacity(self):
+        node = MockComputeNode()
+        node.max_queue_depth = 1
+        node.set_latency(ComputeTaskType.LLM_COMPLETION, 0.1)
+        tasks = []
+        for i in range(3):
+            task = ComputeTask()
+            task.set_llm_params(LLMPrompt("hello"), "text", "gpt-4", 100)
+            await node.push_task(task)
+            tasks.append(task)
+        # not started, the queue holds one task
+        self.assertEqual(node.rejected_count, 2)
+        self.assertEqual(tasks[1].state, ComputeTaskState.ERROR)
+        self.assertEqual(tasks[0].state, ComputeTaskState.INIT)
+
+
+class TestBenchmark(unittest.IsolatedAsyncioTestCase):
+    def test_percentile(self):
+        self.assertEqual(percentile([3, 1, 2, 4], 0.5), 2)
+        self.assertEqual(percentile([3, 1, 2, 4], 0.99), 4)
+        self.assertIsNone(percentile([], 0.5))
+
+    async def test_kernel_mode(self):
+        config = BenchmarkConfig()
+        config.latency = 0.01
+        config.concurrency = 4
+        config.message_count = 20
+        report = await KernelBenchmark(config).run()
+        self.assertEqual(report["error_count"], 0)
+        self.assertEqual(sum(node["total_count"] for node in report["nodes"].values()), 20)
+        self.assertGreater(report["throughput"], 0)
+        self.assertLessEqual(report["latency"]["p50"], report["latency"]["p99"])
+
+    async def test_agent_mode(self):
+        old_kernel = ComputeKernel._instance
+        config = BenchmarkConfig()
+        config.mode = "agent"
+        config.latency = 0.01
+        config.agent_count = 2
+        config.concurrency = 4
+        config.message_count = 8
+        report = await KernelBenchmark(config).run()
+        self.assertEqual(report["error_count"], 0)
+        self.assertEqual(sum(node["total_count"] for node in report["nodes"].values()), 8)
+        self.assertIsNotNone(report["loop_lag"]["max"])
+        self.assertIs(ComputeKernel._instance, old_kernel)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import sys
+import gc
+import time
+import weakref
+import asyncio
+import unittest
+
+directory = os.path.dirname(__file__)
+sys.path.insert(0, os.path.abspath(os.path.join(directory, "..", "src")))
+
+from aios import AgentMsg, AIBus
+from aios.proto.agent_msg import AgentMsgStatus
+
+
+def create_msg(sender: str, target: str, body: str) -> AgentMsg:
+    msg = AgentMsg()
+    msg.set(sender, target, body)
+    return msg
+
+
+class TestBusSendMessage(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.bus = AIBus()
+        self.bus.register_message_handler("user", None)
+        self.user_handler = self.bus.handlers["user"]
+
+    async def test_early_reply(self):
+        async def echo(msg: AgentMsg) -> AgentMsg:
+            return msg.create_resp_msg("echo " + msg.body)
+        self.bus.register_message_handler("echo", echo)
+        self.bus.send_timeout = 5
+
+        msg = create_msg("user", "echo", "hello")
+        start_time = time.perf_counter()
+        resp = await self.bus.send_message(msg)
+        # wakes up on the resp, not on a polling interval or the timeout
+        self.assertLess(time.perf_counter() - start_time, 0.1)
+        self.assertEqual(resp.body, "echo hello")
+        self.assertIs(msg.resp_msg, resp)
+        self.assertEqual(msg.status, AgentMsgStatus.RESPONSED)
+        self.assertEqual(len(self.user_handler.waiters), 0)
+
+    async def test_timeout(self):
+        reply_event = asyncio.Event()
+        late_resps = []
+        async def slow(msg: AgentMsg) -> AgentMsg:
+            await reply_event.wait()
+            late_resps.append(msg.create_resp_msg("late"))
+            return late_resps[-1]
+        self.bus.register_message_handler("slow", slow)
+        self.bus.send_timeout = 0.1
+
+        msg = create_msg("user", "slow", "hello")
+        resp = await self.bus.send_message(msg)
+        self.assertIsNone(resp)
+        self.assertEqual(msg.status, AgentMsgStatus.ERROR)
+        self.assertEqual(len(self.user_handler.waiters), 0)
+
+        # the late resp is dropped, it doesn't leak into the sender
+        reply_event.set()
+        await asyncio.sleep(0.05)
+        late_resp = weakref.ref(late_resps.pop())
+        gc.collect()
+        self.assertIsNone(late_resp())
+        self.assertEqual(len(self.user_handler.waiters), 0)
+        self.assertTrue(self.user_handler.queue.empty())
+        self.assertIsNone(msg.resp_msg)
+
+    async def test_target_not_found(self):
+        msg = create_msg("user", "nobody", "hello")
+        self.assertIsNone(await self.bus.send_message(msg))
+        self.assertEqual(len(self.user_handler.waiters), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
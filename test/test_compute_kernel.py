@@ -0,0 +1,873 @@
+import os
+import sys
+import gc
+import time
+import random
+import asyncio
+import unittest
+
+directory = os.path.dirname(__file__)
+sys.path.insert(0, os.path.abspath(os.path.join(directory, "..", "src")))
+sys.path.insert(0, os.path.abspath(os.path.join(directory, "..", "src", "component")))
+
+from aios import ComputeKernel, ComputeTask, ComputeTaskResult, ComputeTaskType, ComputeTaskState, ComputeTaskResultCode, ComputeTaskPriority, ComputeTaskQueue, LLMPrompt
+from aios import WeightedRandomSchedulePolicy, CheapestSchedulePolicy, LowestLatencySchedulePolicy, ComputeCapabilityIndex, TokenCounter, StreamReplyEditor
+from aios import SchedulePolicy, CircuitBreaker, CircuitState, MetricsRegistry
+from aios.frame.rate_limiter import TokenBucket, RateLimiter
+from aios.frame.metrics import Histogram
+from test_node import TestComputeNode
+
+
+def create_test_node(node_id: str, running_time: float = 0.05, error_rate: float = 0.0) -> TestComputeNode:
+    node = TestComputeNode()
+    node.node_id = node_id
+    node.support_task_types = [ComputeTaskType.LLM_COMPLETION]
+    node.mock_running_time = {ComputeTaskType.LLM_COMPLETION: running_time}
+    node.mock_error_rate = {ComputeTaskType.LLM_COMPLETION: error_rate}
+    node.mock_task_load = {ComputeTaskType.LLM_COMPLETION: 1}
+    return node
+
+
+class TestComputeKernel(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.kernel = ComputeKernel()
+        self.node = create_test_node("test_node_1")
+        self.node.start()
+        self.kernel.add_compute_node(self.node)
+        await self.kernel.start()
+
+    async def test_wait_task_wakeup_without_polling(self):
+        start_time = time.time()
+        task_result = await self.kernel.do_llm_completion(LLMPrompt("hello"), timeout=5)
+        self.assertEqual(task_result.result_code, ComputeTaskResultCode.OK)
+        # the old implementation checked the task state every 0.5s
+        self.assertLess(time.time() - start_time, 0.4)
+
+    async def test_wait_task_timeout(self):
+        self.node.mock_running_time[ComputeTaskType.LLM_COMPLETION] = 2
+        task_req = self.kernel.llm_completion(LLMPrompt("hello"))
+        task_result = await self.kernel._wait_task(task_req, timeout=0.1)
+        self.assertEqual(task_req.state, ComputeTaskState.ERROR)
+        self.assertNotEqual(task_result.result_code, ComputeTaskResultCode.OK)
+
+    async def test_no_worker(self):
+        task_req = self.kernel.text_embedding("hello")
+        task_result = await self.kernel._wait_task(task_req, timeout=5)
+        self.assertEqual(task_result.result_code, ComputeTaskResultCode.NO_WORKER)
+
+    async def test_interactive_task_before_pipeline_tasks(self):
+        self.node.mock_running_time[ComputeTaskType.LLM_COMPLETION] = 0.1
+        pipeline_tasks = [self.kernel.llm_completion(LLMPrompt(f"summary {i}"), priority=ComputeTaskPriority.PIPELINE) for i in range(4)]
+        chat_task = self.kernel.llm_completion(LLMPrompt("hello"), priority=ComputeTaskPriority.INTERACTIVE)
+
+        await self.kernel._wait_task(chat_task, timeout=5)
+        self.assertEqual(chat_task.state, ComputeTaskState.DONE)
+        # the first pipeline task may be running already, the others are still waiting
+        self.assertGreaterEqual(len([task for task in pipeline_tasks if not task.is_finished()]), 2)
+
+    async def test_node_concurrency(self):
+        node = create_test_node("test_node_2", running_time=0.2)
+        node.max_in_flight = 4
+        node.start()
+        kernel = ComputeKernel()
+        kernel.add_compute_node(node)
+        await kernel.start()
+
+        start_time = time.time()
+        tasks = [kernel.llm_completion(LLMPrompt(f"hello {i}")) for i in range(4)]
+        await asyncio.sleep(0.1)
+        self.assertEqual(node.get_in_flight(), 4)
+        self.assertEqual(node.get_capacity(), 0)
+
+        for task in tasks:
+            await kernel._wait_task(task, timeout=5)
+            self.assertEqual(task.state, ComputeTaskState.DONE)
+        self.assertLess(time.time() - start_time, 0.4)
+        self.assertEqual(node.in_flight_peak, 4)
+        self.assertEqual(node.get_capacity(), 4)
+
+
+def create_task(priority: ComputeTaskPriority) -> ComputeTask:
+    task = ComputeTask()
+    task.priority = priority
+    return task
+
+
+class TestComputeTaskQueue(unittest.IsolatedAsyncioTestCase):
+    async def test_priority_order(self):
+        queue = ComputeTaskQueue()
+        pipeline_task = create_task(ComputeTaskPriority.PIPELINE)
+        normal_task = create_task(ComputeTaskPriority.NORMAL)
+        chat_task = create_task(ComputeTaskPriority.INTERACTIVE)
+        another_chat_task = create_task(ComputeTaskPriority.INTERACTIVE)
+        for task in [pipeline_task, normal_task, chat_task, another_chat_task]:
+            queue.put_nowait(task)
+
+        self.assertIs(await queue.get(), chat_task)
+        self.assertIs(await queue.get(), another_chat_task)
+        self.assertIs(await queue.get(), normal_task)
+        self.assertIs(await queue.get(), pipeline_task)
+
+    async def test_aging(self):
+        queue = ComputeTaskQueue(aging_interval=0.05)
+        pipeline_task = create_task(ComputeTaskPriority.PIPELINE)
+        queue.put_nowait(pipeline_task)
+        await asyncio.sleep(0.3)
+        chat_task = create_task(ComputeTaskPriority.INTERACTIVE)
+        queue.put_nowait(chat_task)
+
+        self.assertEqual(queue.pending_tasks(), [pipeline_task, chat_task])
+        self.assertIs(await queue.get(), pipeline_task)
+
+    async def test_earliest_deadline_first(self):
+        queue = ComputeTaskQueue()
+        tasks = [create_task(ComputeTaskPriority.NORMAL) for i in range(3)]
+        for task, timeout in zip(tasks, [None, 30, 10]):
+            if timeout is not None:
+                task.set_deadline(timeout)
+            queue.put_nowait(task)
+        chat_task = create_task(ComputeTaskPriority.INTERACTIVE)
+        queue.put_nowait(chat_task)
+
+        self.assertEqual(queue.pending_tasks(), [chat_task, tasks[2], tasks[1], tasks[0]])
+
+    async def test_deadline_with_fair_share(self):
+        queue = ComputeTaskQueue()
+        tasks = [create_task(ComputeTaskPriority.NORMAL) for i in range(4)]
+        for task, fair_tag, timeout in zip(tasks, [0, 100, 50, 10], [None, 30, 10, None]):
+            task.fair_tag = fair_tag
+            if timeout is not None:
+                task.set_deadline(timeout)
+            queue.put_nowait(task)
+
+        # the deadlines come first even if the owners used more tokens, the others are in fair share order
+        self.assertEqual(queue.pending_tasks(), [tasks[2], tasks[1], tasks[0], tasks[3]])
+
+    async def test_remove(self):
+        queue = ComputeTaskQueue()
+        tasks = [create_task(ComputeTaskPriority.NORMAL) for i in range(3)]
+        for i, task in enumerate(tasks):
+            task.task_id = str(i)
+            queue.put_nowait(task)
+
+        self.assertIs(queue.remove("1"), tasks[1])
+        self.assertIsNone(queue.remove("1"))
+        self.assertEqual(queue.qsize(), 2)
+        self.assertIs(await queue.get(), tasks[0])
+        self.assertIs(await queue.get(), tasks[2])
+
+
+class TestSchedulePolicy(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.kernel = ComputeKernel()
+        self.fast_node = create_test_node("fast_node", running_time=0.01)
+        self.slow_node = create_test_node("slow_node", running_time=0.2)
+        self.fast_node.mock_fee_type = "token"
+        for node in [self.fast_node, self.slow_node]:
+            node.start()
+            self.kernel.add_compute_node(node)
+        await self.kernel.start()
+
+    async def test_node_stats(self):
+        self.kernel.set_schedule_policy(CheapestSchedulePolicy())
+        task_result = await self.kernel.do_llm_completion(LLMPrompt("hello"), mode_name="gpt-4", timeout=5)
+        self.assertEqual(task_result.worker_id, "slow_node")
+        stats = self.kernel.get_node_stats("slow_node")
+        self.assertEqual(stats.total_count, 1)
+        self.assertGreaterEqual(stats.get_latency(), 0.2)
+
+    async def test_policy_per_priority(self):
+        self.kernel.set_schedule_policy(CheapestSchedulePolicy())
+        self.kernel.set_schedule_policy(LowestLatencySchedulePolicy(), ComputeTaskPriority.INTERACTIVE)
+        self.kernel.get_node_stats("fast_node").record(0.01, True)
+        self.kernel.get_node_stats("slow_node").record(0.2, True)
+
+        chat_task = self.kernel.llm_completion(LLMPrompt("hello"), priority=ComputeTaskPriority.INTERACTIVE)
+        pipeline_task = self.kernel.llm_completion(LLMPrompt("summary"), model_name="gpt-4", priority=ComputeTaskPriority.PIPELINE)
+        chat_result = await self.kernel._wait_task(chat_task, timeout=5)
+        pipeline_result = await self.kernel._wait_task(pipeline_task, timeout=5)
+        self.assertEqual(chat_result.worker_id, "fast_node")
+        self.assertEqual(pipeline_result.worker_id, "slow_node")
+
+    async def test_lowest_latency_avoid_error_node(self):
+        self.kernel.set_schedule_policy(LowestLatencySchedulePolicy())
+        for i in range(20):
+            self.kernel.get_node_stats("fast_node").record(0.05, False)
+        self.kernel.get_node_stats("slow_node").record(0.2, True)
+
+        task_result = await self.kernel.do_llm_completion(LLMPrompt("hello"), timeout=5)
+        self.assertEqual(task_result.worker_id, "slow_node")
+
+    async def test_avoid_error_result_node(self):
+        kernel = ComputeKernel()
+        bad_node = ErrorResultComputeNode()
+        good_node = create_test_node("good_node", running_time=0.01)
+        for node in [bad_node, good_node]:
+            node.start()
+            kernel.add_compute_node(node)
+        await kernel.start()
+        # keep the bad node in schedule, only the policies avoid it
+        kernel.get_circuit_breaker(bad_node.node_id).failure_threshold = 100
+        kernel.get_circuit_breaker(bad_node.node_id).error_rate_threshold = 1.1
+
+        for node in [bad_node, good_node]:
+            kernel.set_schedule_policy(NodeIdSchedulePolicy(node.node_id))
+            for i in range(10):
+                await kernel.do_llm_completion(LLMPrompt(f"hello {i}"), timeout=5)
+        await asyncio.sleep(0)
+
+        task = create_llm_task("gpt-4")
+        nodes = [bad_node, good_node]
+        self.assertIs(CheapestSchedulePolicy().select(task, nodes, kernel), good_node)
+        self.assertIs(LowestLatencySchedulePolicy().select(task, nodes, kernel), good_node)
+        random.seed(0)
+        selected = [WeightedRandomSchedulePolicy().select(task, nodes, kernel) for i in range(100)]
+        self.assertGreater(selected.count(good_node), 80)
+
+    def test_llm_token_price(self):
+        self.assertAlmostEqual(ComputeKernel.llm_token_price("gpt-4"), 0.03)
+        self.assertEqual(ComputeKernel.llm_token_price("unknown-model"), 0)
+        self.assertGreater(ComputeKernel.llm_tokens_cost(LLMPrompt("hello"), "gpt-4"), 0)
+
+
+class TestTaskCoalesce(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.kernel = ComputeKernel()
+        self.node = create_test_node("test_node_1", running_time=0.1)
+        self.node.max_in_flight = 4
+        self.node.start()
+        self.kernel.add_compute_node(self.node)
+        await self.kernel.start()
+
+    async def test_coalesce_identical_tasks(self):
+        results = await asyncio.gather(*[self.kernel.do_llm_completion(LLMPrompt("hello"), timeout=5) for i in range(3)],
+                                       self.kernel.do_llm_completion(LLMPrompt("another"), timeout=5))
+        for task_result in results:
+            self.assertEqual(task_result.result_code, ComputeTaskResultCode.OK)
+        self.assertEqual(len(set([task_result.task_id for task_result in results])), 4)
+        self.assertEqual(self.kernel.coalesced_count, 2)
+        self.assertEqual(self.kernel.get_node_stats(self.node.node_id).total_count, 2)
+        self.assertEqual(len(self.kernel.inflight_tasks), 0)
+
+    async def test_coalesce_error(self):
+        self.node.mock_error_rate[ComputeTaskType.LLM_COMPLETION] = 1.0
+        leader = self.kernel.llm_completion(LLMPrompt("hello"))
+        follower = self.kernel.llm_completion(LLMPrompt("hello"))
+        await self.kernel._wait_task(follower, timeout=5)
+        self.assertEqual(leader.state, ComputeTaskState.ERROR)
+        self.assertEqual(follower.state, ComputeTaskState.ERROR)
+        self.assertEqual(follower.error_str, leader.error_str)
+
+    async def test_leader_cancelled(self):
+        leader = self.kernel.llm_completion(LLMPrompt("hello"))
+        follower = self.kernel.llm_completion(LLMPrompt("hello"))
+        leader.get_done_future().cancel()
+
+        task_result = await self.kernel._wait_task(follower, timeout=5)
+        self.assertEqual(task_result.result_code, ComputeTaskResultCode.OK)
+        self.assertEqual(task_result.task_id, follower.task_id)
+
+
+class TestStreamCompletion(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        # a full collection in the middle of the timing test makes the first delta late
+        gc.collect()
+        self.kernel = ComputeKernel()
+        self.node = create_test_node("test_node_1", running_time=0.3)
+        self.node.start()
+        self.kernel.add_compute_node(self.node)
+        await self.kernel.start()
+
+    async def test_stream_iterator(self):
+        start_time = time.time()
+        deltas = []
+        first_delta_time = None
+        async for delta in self.kernel.llm_completion_stream(LLMPrompt("hello"), timeout=5):
+            if first_delta_time is None:
+                first_delta_time = time.time() - start_time
+            deltas.append(delta)
+        self.assertEqual(deltas, ["fin", "ish", "ed"])
+        self.assertLess(first_delta_time, 0.2)
+
+    async def test_stream_handler(self):
+        deltas = []
+        async def _on_delta(delta):
+            deltas.append(delta)
+
+        task_result = await self.kernel.do_llm_completion(LLMPrompt("hello"), timeout=5, stream_handler=_on_delta)
+        self.assertEqual(task_result.result_code, ComputeTaskResultCode.OK)
+        self.assertEqual("".join(deltas), task_result.result_str)
+
+    async def test_stream_without_node_support(self):
+        # the node doesn't push deltas (or the result is from cache), the whole result is one delta
+        task = ComputeTask()
+        task.enable_stream()
+        result = ComputeTaskResult()
+        result.result_str = "hello world"
+        task.set_done(result, ComputeTaskState.DONE)
+        self.assertEqual([delta async for delta in task.stream(timeout=1)], ["hello world"])
+
+    async def test_stream_reply_editor(self):
+        sent = []
+        edits = []
+        async def _send(text):
+            sent.append(text)
+            return len(sent)
+        async def _edit(handle, text):
+            edits.append((handle, text))
+
+        editor = StreamReplyEditor(_send, _edit, min_interval=0)
+        self.assertFalse(await editor.finish("final"))
+        for delta in ["hel", "lo", " world"]:
+            await editor.on_delta(delta)
+        self.assertTrue(await editor.finish("hello world!"))
+        self.assertEqual(sent, ["hel"])
+        self.assertEqual(edits, [(1, "hello"), (1, "hello world"), (1, "hello world!")])
+
+        # the final reply has no text, the streamed message is deleted or replaced
+        deleted = []
+        async def _delete(handle):
+            deleted.append(handle)
+        editor = StreamReplyEditor(_send, _edit, min_interval=0, delete_func=_delete)
+        await editor.on_delta("**IGN")
+        self.assertTrue(await editor.finish(""))
+        self.assertEqual(deleted, [2])
+
+        edits.clear()
+        editor = StreamReplyEditor(_send, _edit, min_interval=0)
+        await editor.on_delta("{\"resp\"")
+        self.assertTrue(await editor.finish(None))
+        self.assertEqual(edits, [(3, StreamReplyEditor.EMPTY_REPLY_TEXT)])
+
+
+class TestEmbeddingBatch(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.kernel = ComputeKernel()
+        self.node = create_test_node("test_node_1")
+        self.node.support_task_types = [ComputeTaskType.TEXT_EMBEDDING]
+        self.node.mock_running_time = {ComputeTaskType.TEXT_EMBEDDING: 0.05}
+        self.node.mock_error_rate = {ComputeTaskType.TEXT_EMBEDDING: 0}
+        self.node.mock_task_load = {ComputeTaskType.TEXT_EMBEDDING: 1}
+        self.node.start()
+        self.kernel.add_compute_node(self.node)
+        await self.kernel.start()
+
+    async def test_concurrent_requests_batched(self):
+        inputs = ["a", "bb", "ccc", "bb"]
+        vectors = await asyncio.gather(*[self.kernel.do_text_embedding(text) for text in inputs])
+        self.assertEqual(vectors, [TestComputeNode.mock_embedding(text) for text in inputs])
+        # one request for all the callers, the duplicated input is sent once
+        self.assertEqual(self.node.embedding_batch_sizes, [3])
+
+    async def test_embedding_batch_api(self):
+        self.kernel.embedding_batcher.max_batch_size = 2
+        inputs = ["a", "b", "c", "d", "e"]
+        vectors = await self.kernel.do_text_embedding_batch(inputs)
+        self.assertEqual(vectors, [TestComputeNode.mock_embedding(text) for text in inputs])
+        self.assertEqual(sorted(self.node.embedding_batch_sizes), [1, 2, 2])
+
+    async def test_batch_error(self):
+        self.node.mock_error_rate[ComputeTaskType.TEXT_EMBEDDING] = 1.0
+        vectors = await self.kernel.do_text_embedding_batch(["a", "b"])
+        self.assertEqual(vectors, [None, None])
+
+
+class TestRateLimit(unittest.IsolatedAsyncioTestCase):
+    def test_token_bucket(self):
+        bucket = TokenBucket(60, capacity=2)
+        now = bucket.update_time
+        self.assertEqual(bucket.reserve(1, now), 0)
+        self.assertEqual(bucket.reserve(1, now), 0)
+        # the bucket is in debt, the reservations are spread out by the refill rate
+        self.assertAlmostEqual(bucket.reserve(1, now), 1.0)
+        self.assertAlmostEqual(bucket.reserve(1, now), 2.0)
+        self.assertAlmostEqual(bucket.get_wait_time(1, now + 1.5), 1.5)
+
+    def test_limiter(self):
+        limiter = RateLimiter()
+        limiter.set_limit(tpm=600)
+        limiter.set_limit(rpm=1, model_name="gpt-4")
+        self.assertEqual(limiter.reserve("gpt-3.5-turbo", 600), 0)
+        self.assertGreater(limiter.get_wait_time("gpt-3.5-turbo", 100), 0)
+        self.assertEqual(limiter.reserve("gpt-4", 10000), 0)
+        self.assertGreater(limiter.get_wait_time("gpt-4"), 0)
+
+        limiter.pause("gpt-3.5-turbo-16k", 10)
+        self.assertGreater(limiter.get_wait_time("gpt-3.5-turbo-16k"), 9)
+        self.assertEqual(RateLimiter.parse_retry_after({"retry-after": "20"}), 20)
+        self.assertEqual(RateLimiter.parse_retry_after({"retry-after-ms": "500"}), 0.5)
+        self.assertEqual(RateLimiter.parse_retry_after({}, default=3), 3)
+
+    async def test_route_to_unsaturated_node(self):
+        kernel = ComputeKernel()
+        nodes = [create_test_node("test_node_1"), create_test_node("test_node_2")]
+        for node in nodes:
+            node.rate_limiter = RateLimiter()
+            node.rate_limiter.set_limit(rpm=1)
+            node.start()
+            kernel.add_compute_node(node)
+        await kernel.start()
+
+        results = await asyncio.gather(*[kernel.do_llm_completion(LLMPrompt(f"hello {i}"), timeout=5) for i in range(2)])
+        for task_result in results:
+            self.assertEqual(task_result.result_code, ComputeTaskResultCode.OK)
+        for node in nodes:
+            self.assertEqual(kernel.get_node_stats(node.node_id).total_count, 1)
+
+        # all the nodes are saturated, the task waits in the queue of node instead of being sent
+        task = kernel.llm_completion(LLMPrompt("hello 2"))
+        await asyncio.sleep(0.2)
+        self.assertFalse(task.is_finished())
+        self.assertGreater(task.not_before - time.monotonic(), 50)
+        self.assertGreater(task.token_count, 0)
+
+
+class TestTaskCancel(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.kernel = ComputeKernel()
+        self.node = create_test_node("test_node_1", running_time=0.3)
+        self.node.start()
+        self.kernel.add_compute_node(self.node)
+        await self.kernel.start()
+
+    async def test_timeout_cancels_running_task(self):
+        task_result = await self.kernel.do_llm_completion(LLMPrompt("hello"), timeout=0.1)
+        self.assertEqual(task_result.result_code, ComputeTaskResultCode.TIMEOUT)
+        await asyncio.sleep(0.01)
+        # the worker slot is released at once, not after the running time
+        self.assertEqual(self.node.get_in_flight(), 0)
+        self.assertEqual(len(self.node.running_workers), 0)
+
+    async def test_expired_task_dropped(self):
+        running_task = self.kernel.llm_completion(LLMPrompt("hello"))
+        await asyncio.sleep(0.01)
+        # expired in the queue of node, it's never sent
+        expired_task = self.kernel.llm_completion(LLMPrompt("another"), timeout=0.1)
+        await self.kernel._wait_task(running_task, timeout=5)
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(running_task.state, ComputeTaskState.DONE)
+        self.assertEqual(expired_task.state, ComputeTaskState.ERROR)
+        self.assertEqual(expired_task.result.result_code, ComputeTaskResultCode.TIMEOUT)
+        self.assertEqual(self.node.dropped_count, 1)
+        self.assertEqual(self.kernel.get_node_stats(self.node.node_id).total_count, 2)
+
+    async def test_remove_task(self):
+        running_task = self.kernel.llm_completion(LLMPrompt("hello"))
+        waiting_task = self.kernel.llm_completion(LLMPrompt("another"))
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.node.get_task_state(running_task.task_id), ComputeTaskState.RUNNING)
+        self.assertEqual(self.node.get_task_state(waiting_task.task_id), ComputeTaskState.INIT)
+
+        await self.node.remove_task(waiting_task.task_id)
+        await self.node.remove_task(running_task.task_id)
+        self.assertTrue(waiting_task.is_cancelled())
+        self.assertTrue(running_task.is_cancelled())
+        await asyncio.sleep(0.01)
+        self.assertIsNone(self.node.get_task_state(running_task.task_id))
+        self.assertEqual(self.node.get_in_flight(), 0)
+
+
+    async def test_rate_limited_task_not_blocking(self):
+        limited_task = ComputeTask()
+        limited_task.task_type = ComputeTaskType.LLM_COMPLETION
+        limited_task.params["model_name"] = "gpt-4"
+        limited_task.not_before = time.monotonic() + 0.5
+        await self.node.push_task(limited_task)
+        await asyncio.sleep(0.01)
+        # the rate limited task doesn't hold the worker slot of node
+        task_result = await self.kernel.do_llm_completion(LLMPrompt("hello"), timeout=0.45)
+        self.assertEqual(task_result.result_code, ComputeTaskResultCode.OK)
+        self.assertEqual(self.node.get_task_state(limited_task.task_id), ComputeTaskState.INIT)
+
+        await self.node.remove_task(limited_task.task_id)
+        self.assertTrue(limited_task.is_cancelled())
+        self.assertEqual(len(self.node.delayed_tasks), 0)
+        await asyncio.sleep(0.3)
+        self.assertEqual(self.node.task_queue.qsize(), 0)
+
+    async def test_worker_error(self):
+        node = create_test_node("error_node")
+        queue = ComputeTaskQueue()
+        errors = [ValueError("broken node"), asyncio.TimeoutError("read timeout")]
+        async def _run_task(task):
+            raise errors.pop(0)
+        dispatch_loop = asyncio.create_task(node._dispatch_task_loop(queue, _run_task))
+        try:
+            for error_str in ["broken node", "read timeout"]:
+                task = create_task(ComputeTaskPriority.NORMAL)
+                task.set_deadline(5)
+                queue.put_nowait(task)
+                # the caller gets the error at once, and the timeout of provider is not the expiry of task
+                result = await asyncio.wait_for(task.get_done_future(), 1)
+                self.assertEqual(task.state, ComputeTaskState.ERROR)
+                self.assertEqual(result.result_code, ComputeTaskResultCode.ERROR)
+                self.assertIn(error_str, result.error_str)
+        finally:
+            dispatch_loop.cancel()
+
+class FirstNodeSchedulePolicy(SchedulePolicy):
+    def select(self, task, nodes, kernel):
+        return nodes[0]
+
+
+
+class NodeIdSchedulePolicy(SchedulePolicy):
+    def __init__(self, node_id: str) -> None:
+        self.node_id = node_id
+
+    def select(self, task, nodes, kernel):
+        return [node for node in nodes if node.node_id == self.node_id][0]
+
+class TestNodeHealth(unittest.IsolatedAsyncioTestCase):
+    def test_circuit_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=3, open_duration=0.05)
+        for i in range(2):
+            breaker.record(False)
+        breaker.record(True)
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+        for i in range(3):
+            breaker.record(False)
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+        self.assertFalse(breaker.is_available())
+
+        # only one probe in half open, the failed probe opens it again for longer
+        time.sleep(0.06)
+        self.assertTrue(breaker.is_available())
+        breaker.on_dispatch()
+        self.assertFalse(breaker.is_available())
+        breaker.record(False)
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+        self.assertAlmostEqual(breaker.current_open_duration, 0.1)
+
+        time.sleep(0.11)
+        self.assertTrue(breaker.is_available())
+        breaker.on_dispatch()
+        breaker.record(True)
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+
+    def test_latency_percentile(self):
+        kernel = ComputeKernel()
+        stats = kernel.get_node_stats("test_node_1")
+        self.assertIsNone(stats.get_latency_percentile(0.95))
+        for i in range(1, 101):
+            stats.record(i / 100, i % 10 != 0)
+        self.assertAlmostEqual(stats.get_latency_percentile(0.95), 0.95)
+        self.assertAlmostEqual(stats.get_latency_percentile(0.5), 0.5)
+        self.assertAlmostEqual(stats.get_window_success_rate(), 0.9)
+
+    async def test_failing_node_is_tripped(self):
+        kernel = ComputeKernel()
+        kernel.set_schedule_policy(FirstNodeSchedulePolicy())
+        bad_node = create_test_node("test_node_1", running_time=0.01, error_rate=1.0)
+        good_node = create_test_node("test_node_2", running_time=0.01)
+        for node in [bad_node, good_node]:
+            node.start()
+            kernel.add_compute_node(node)
+        await kernel.start()
+
+        for i in range(10):
+            await kernel.do_llm_completion(LLMPrompt(f"hello {i}"), timeout=5)
+        self.assertEqual(kernel.get_circuit_breaker(bad_node.node_id).state, CircuitState.OPEN)
+        self.assertEqual(kernel.get_node_stats(bad_node.node_id).total_count, 5)
+        self.assertEqual(kernel.get_node_stats(good_node.node_id).total_count, 5)
+
+    async def test_hedged_request(self):
+        kernel = ComputeKernel()
+        kernel.set_schedule_policy(FirstNodeSchedulePolicy())
+        kernel.set_hedge(ComputeTaskPriority.INTERACTIVE)
+        kernel.hedge_default_delay = 0.1
+        slow_node = create_test_node("test_node_1", running_time=1.0)
+        fast_node = create_test_node("test_node_2", running_time=0.05)
+        for node in [slow_node, fast_node]:
+            node.start()
+            kernel.add_compute_node(node)
+        await kernel.start()
+
+        start_time = time.monotonic()
+        task_result = await kernel.do_llm_completion(LLMPrompt("hello"), timeout=5, priority=ComputeTaskPriority.INTERACTIVE)
+        self.assertLess(time.monotonic() - start_time, 0.5)
+        self.assertEqual(task_result.result_code, ComputeTaskResultCode.OK)
+        self.assertEqual(task_result.worker_id, fast_node.node_id)
+        self.assertEqual(kernel.hedged_count, 1)
+
+        # the normal task is not hedged
+        task_result = await kernel.do_llm_completion(LLMPrompt("hello"), timeout=5)
+        self.assertEqual(task_result.worker_id, slow_node.node_id)
+        self.assertEqual(kernel.hedged_count, 1)
+
+
+    async def test_error_result_with_done_state(self):
+        kernel = ComputeKernel(MetricsRegistry())
+        kernel.set_schedule_policy(FirstNodeSchedulePolicy())
+        kernel.set_hedge(ComputeTaskPriority.INTERACTIVE)
+        kernel.hedge_default_delay = 0.5
+        bad_node = ErrorResultComputeNode()
+        good_node = create_test_node("test_node_2", running_time=0.01)
+        for node in [bad_node, good_node]:
+            node.start()
+            kernel.add_compute_node(node)
+        await kernel.start()
+
+        # the failed copy is not the answer, the hedge is sent at once
+        task_result = await kernel.do_llm_completion(LLMPrompt("hello"), mode_name="gpt-4", timeout=5, priority=ComputeTaskPriority.INTERACTIVE)
+        self.assertEqual(task_result.result_code, ComputeTaskResultCode.OK)
+        self.assertEqual(task_result.worker_id, good_node.node_id)
+
+        for i in range(4):
+            await kernel.do_llm_completion(LLMPrompt(f"hello {i}"), mode_name="gpt-4", timeout=5)
+        await asyncio.sleep(0)
+        self.assertEqual(kernel.get_circuit_breaker(bad_node.node_id).state, CircuitState.OPEN)
+        self.assertEqual(kernel.get_node_stats(bad_node.node_id).get_window_success_rate(), 0)
+        labels = {"task_type": "llm_completion", "model": "gpt-4", "node": bad_node.node_id}
+        self.assertEqual(kernel.task_count_metric.get(result="error", **labels), 5)
+        self.assertEqual(kernel.task_count_metric.get(result="ok", **labels), 0)
+
+
+# finish the tasks as DONE with an ERROR result, like a node ignoring the result code
+class ErrorResultComputeNode(TestComputeNode):
+    def __init__(self) -> None:
+        super().__init__()
+        self.node_id = "error_result_node"
+        self.support_task_types = [ComputeTaskType.LLM_COMPLETION]
+        self.mock_task_load = {ComputeTaskType.LLM_COMPLETION: 1}
+
+    async def _run_task(self, task: ComputeTask) -> ComputeTaskResult:
+        await asyncio.sleep(0.01)
+        result = ComputeTaskResult()
+        result.set_from_task(task)
+        result.result_code = ComputeTaskResultCode.ERROR
+        result.error_str = "provider error"
+        result.worker_id = self.node_id
+        task.state = ComputeTaskState.DONE
+        return result
+
+class DynamicTestComputeNode(TestComputeNode):
+    def get_capabilities(self):
+        return None
+
+
+class ModelTestComputeNode(TestComputeNode):
+    def __init__(self, model_name: str) -> None:
+        super().__init__()
+        self.model_name = model_name
+
+    def get_capabilities(self):
+        return [(task_type, self.model_name) for task_type in self.support_task_types]
+
+
+def create_llm_task(model_name: str = None) -> ComputeTask:
+    task = ComputeTask()
+    task.task_type = ComputeTaskType.LLM_COMPLETION
+    task.params["model_name"] = model_name
+    return task
+
+
+class TestCapabilityIndex(unittest.TestCase):
+    def setUp(self):
+        self.any_model_node = create_test_node("any_model_node")
+        self.model_a_node = ModelTestComputeNode("model-a")
+        self.model_a_node.node_id = "model_a_node"
+        self.model_a_node.support_task_types = [ComputeTaskType.LLM_COMPLETION]
+        self.dynamic_node = DynamicTestComputeNode()
+        self.dynamic_node.node_id = "dynamic_node"
+        self.dynamic_node.support_task_types = [ComputeTaskType.TEXT_EMBEDDING]
+
+        self.kernel = ComputeKernel()
+        for node in [self.any_model_node, self.model_a_node, self.dynamic_node]:
+            self.kernel.add_compute_node(node)
+
+    def get_support_node_ids(self, task: ComputeTask):
+        return sorted([node.node_id for node in self.kernel._get_support_nodes(task)])
+
+    def test_lookup_by_model(self):
+        self.assertEqual(self.get_support_node_ids(create_llm_task("model-a")), ["any_model_node", "model_a_node"])
+        self.assertEqual(self.get_support_node_ids(create_llm_task("model-b")), ["any_model_node"])
+        self.assertEqual(self.get_support_node_ids(create_llm_task()), ["any_model_node", "model_a_node"])
+
+    def test_dynamic_node(self):
+        task = ComputeTask()
+        task.task_type = ComputeTaskType.TEXT_EMBEDDING
+        self.assertEqual(self.get_support_node_ids(task), ["dynamic_node"])
+        self.assertIsInstance(self.kernel.capability_index, ComputeCapabilityIndex)
+        self.assertEqual(self.kernel.capability_index.dynamic_nodes, [self.dynamic_node])
+
+    def test_disable_node(self):
+        self.kernel.disable_compute_node("any_model_node")
+        self.assertEqual(self.get_support_node_ids(create_llm_task("model-a")), ["model_a_node"])
+        self.assertEqual(self.get_support_node_ids(create_llm_task("model-b")), [])
+
+
+class TestTokenCounter(unittest.TestCase):
+    def setUp(self):
+        TokenCounter.clear()
+
+    def test_encoding_registry(self):
+        self.assertIs(TokenCounter.get_encoding("gpt-4"), TokenCounter.get_encoding("gpt-4"))
+        self.assertEqual(TokenCounter.get_encoding("unknown-model").name, "cl100k_base")
+
+    def test_count_cache(self):
+        text = "hello world " * 100
+        token_count = ComputeKernel.llm_num_tokens_from_text(text)
+        self.assertEqual(ComputeKernel.llm_num_tokens_from_text(text), token_count)
+        self.assertEqual(TokenCounter.miss_count, 1)
+        self.assertEqual(TokenCounter.hit_count, 1)
+        self.assertEqual(ComputeKernel.llm_num_tokens_from_text(""), 0)
+
+    def test_prompt_token_count(self):
+        prompt = LLMPrompt("hello")
+        prompt.append_system_message("you are a helpful assistant")
+        for i in range(10):
+            prompt.append_user_message(f"message {i}")
+        token_count = ComputeKernel.llm_num_tokens(prompt)
+        self.assertAlmostEqual(token_count, ComputeKernel.llm_num_tokens_from_text(prompt.as_str()), delta=20)
+
+        # only the new message is encoded
+        miss_count = TokenCounter.miss_count
+        prompt.append_user_message("one more message")
+        self.assertGreater(ComputeKernel.llm_num_tokens(prompt), token_count)
+        self.assertEqual(TokenCounter.miss_count, miss_count + 1)
+
+    def test_prompt_fork(self):
+        image_url = "data:image/jpeg;base64," + "A" * 100000
+        prompt = LLMPrompt()
+        prompt.append_system_message("you are a helpful assistant")
+        prompt.messages = [{"role": "user", "content": [{"type": "text", "text": "what is it"}, {"type": "image_url", "image_url": {"url": image_url}}]}]
+        token_count = ComputeKernel.llm_num_tokens(prompt)
+        # the image is not counted as text
+        self.assertLess(token_count, 1000)
+
+        fork = prompt.fork()
+        fork.messages.append({"role": "function", "name": "lookup", "content": "result"})
+        fork.append_system_message(" more rules")
+        self.assertEqual(len(prompt.messages), 1)
+        self.assertEqual(prompt.system_message["content"], "you are a helpful assistant")
+        self.assertIs(fork.messages[0], prompt.messages[0])
+
+        # the shared messages are not counted again
+        miss_count = TokenCounter.miss_count
+        hit_count = TokenCounter.hit_count
+        self.assertGreater(ComputeKernel.llm_num_tokens(fork), token_count)
+        self.assertEqual(TokenCounter.miss_count, miss_count + 2)
+        self.assertEqual(TokenCounter.hit_count, hit_count)
+
+
+class TestFairShare(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.kernel = ComputeKernel(MetricsRegistry())
+        self.node = create_test_node("test_node_1", running_time=0.05)
+        self.node.start()
+        self.kernel.add_compute_node(self.node)
+        await self.kernel.start()
+
+    async def test_fair_share_order(self):
+        busy_tasks = [self.kernel.llm_completion(LLMPrompt(f"busy {i}"), owner_id="busy_agent") for i in range(6)]
+        await asyncio.sleep(0.01)
+        task = self.kernel.llm_completion(LLMPrompt("hello"), owner_id="quiet_agent")
+        await self.kernel._wait_task(task, timeout=5)
+        self.assertEqual(task.state, ComputeTaskState.DONE)
+        # FIFO would run all the tasks of busy_agent first
+        self.assertLessEqual(len([t for t in busy_tasks if t.is_finished()]), 2)
+
+        for busy_task in busy_tasks:
+            await self.kernel._wait_task(busy_task, timeout=5)
+        budget = self.kernel.token_budget.get_budget("busy_agent")
+        self.assertEqual(budget.task_count, 6)
+        self.assertGreater(budget.used_tokens, 0)
+        self.assertIn('aios_owner_tokens_total{owner="busy_agent"}', self.kernel.metrics.expose())
+
+    async def test_quota(self):
+        tokens = ComputeKernel.llm_num_tokens(LLMPrompt("hello 0"))
+        # the third task is over the quota
+        self.kernel.token_budget.set_budget("agent", tokens_per_minute=60 * tokens, burst=tokens + 1)
+        start_time = time.monotonic()
+        tasks = [self.kernel.llm_completion(LLMPrompt(f"hello {i}"), owner_id="agent") for i in range(3)]
+        chat_task = self.kernel.llm_completion(LLMPrompt("hello"), owner_id="agent", priority=ComputeTaskPriority.INTERACTIVE)
+        budget = self.kernel.token_budget.get_budget("agent")
+        self.assertEqual(budget.deferred_count, 1)
+
+        await self.kernel._wait_task(chat_task, timeout=5)
+        self.assertFalse(tasks[2].is_finished())
+        await self.kernel._wait_task(tasks[2], timeout=5)
+        self.assertEqual(tasks[2].state, ComputeTaskState.DONE)
+        self.assertGreater(time.monotonic() - start_time, 0.5)
+
+    def test_charge(self):
+        task = ComputeTask()
+        task.owner_id = "agent"
+        task.token_count = 100
+        self.kernel.token_budget.set_budget("agent", tokens_per_minute=6000, burst=1000)
+        self.kernel.token_budget.admit(task)
+        budget = self.kernel.token_budget.get_budget("agent")
+        self.assertAlmostEqual(budget.get_balance(), 900, delta=1)
+        self.assertEqual(budget.finish_tag, 100)
+        # the real usage is less than the estimation
+        self.kernel.token_budget.charge(task, 40)
+        self.assertAlmostEqual(budget.get_balance(), 960, delta=1)
+        self.assertEqual(budget.finish_tag, 40)
+        self.assertEqual(budget.used_tokens, 40)
+
+
+class TestMetrics(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.kernel = ComputeKernel(MetricsRegistry())
+        self.node = create_test_node("test_node_1")
+        self.node.start()
+        self.kernel.add_compute_node(self.node)
+        await self.kernel.start()
+
+    async def test_task_metrics(self):
+        for i in range(2):
+            task_result = await self.kernel.do_llm_completion(LLMPrompt(f"hello {i}"), mode_name="gpt-4", timeout=5, owner_id="Jarvis")
+            self.assertEqual(task_result.result_code, ComputeTaskResultCode.OK)
+
+        labels = {"task_type": "llm_completion", "model": "gpt-4", "node": "test_node_1"}
+        self.assertEqual(self.kernel.task_count_metric.get(result="ok", **labels), 2)
+        self.assertEqual(self.kernel.task_latency_metric.get_count(**labels), 2)
+        # the test node doesn't return token_usage, the tokens are estimated
+        self.assertGreater(self.kernel.llm_token_metric.get(model="gpt-4", direction="prompt"), 0)
+        self.assertEqual(self.kernel.llm_token_metric.get(model="gpt-4", direction="completion"), 2)
+        self.assertGreater(self.kernel.llm_cost_metric.get(agent="Jarvis", model="gpt-4"), 0)
+        self.assertGreater(self.kernel.get_token_rate()[0], 0)
+
+        text = self.kernel.metrics.expose()
+        self.assertIn('aios_tasks_total{task_type="llm_completion",model="gpt-4",node="test_node_1",result="ok"} 2', text)
+        self.assertIn('aios_node_in_flight{node="test_node_1"} 0', text)
+        self.assertIn("aios_kernel_queue_length 0", text)
+
+    async def test_timeout_metrics(self):
+        self.node.mock_running_time[ComputeTaskType.LLM_COMPLETION] = 1
+        task_result = await self.kernel.do_llm_completion(LLMPrompt("hello"), mode_name="gpt-4", timeout=0.05)
+        self.assertEqual(task_result.result_code, ComputeTaskResultCode.TIMEOUT)
+        # when the node expires the task, the metrics are recorded by the done callback of task
+        await asyncio.sleep(0)
+        self.assertEqual(self.kernel.timeout_metric.get(task_type="llm_completion", model="gpt-4"), 1)
+
+    async def test_metrics_endpoint(self):
+        import socket
+        import aiohttp
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        await self.kernel.metrics.start_server(port=port)
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                    self.assertEqual(response.status, 200)
+                    self.assertIn("# TYPE aios_task_latency_seconds histogram", await response.text())
+        finally:
+            await self.kernel.metrics.stop_server()
+
+    def test_histogram_exposition(self):
+        histogram = Histogram("latency", "test latency", ["node"], buckets=[0.1, 1])
+        for latency in [0.05, 0.5, 0.5, 5]:
+            histogram.observe(latency, node="a")
+        lines = histogram.expose()
+        self.assertIn('latency_bucket{node="a",le="0.1"} 1', lines)
+        self.assertIn('latency_bucket{node="a",le="1"} 3', lines)
+        self.assertIn('latency_bucket{node="a",le="+Inf"} 4', lines)
+        self.assertIn('latency_count{node="a"} 4', lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+directory = os.path.dirname(__file__)
+sys.path.insert(0, os.path.abspath(os.path.join(directory, "..", "src")))
+
+from aios import AgentMsg, AIChatSession, ContextPacker, ContextSegment, TokenCounter
+from aios.agent.chatsession import format_chat_record
+
+
+class TestContextPacker(unittest.TestCase):
+    def test_truncate(self):
+        packer = ContextPacker(10)
+        packer.add_segment(ContextSegment("newest", ["a", "b", "c", "d"], [3, 3, 3, 3]))
+        packed = packer.pack()["newest"]
+        self.assertEqual(packed.items, ["b", "c", "d"])
+        self.assertEqual(packed.token_count, 9)
+        self.assertFalse(packed.is_complete)
+
+        packer = ContextPacker(10)
+        packer.add_segment(ContextSegment("oldest", ["a", "b", "c", "d"], [3, 3, 3, 3], truncate=ContextSegment.KEEP_OLDEST))
+        packer.add_segment(ContextSegment("drop", ["summary"], [2], priority=1, truncate=ContextSegment.DROP))
+        packed = packer.pack()
+        self.assertEqual(packed["oldest"].items, ["a", "b", "c"])
+        self.assertEqual(packed["drop"].items, [])
+
+    def test_priority_and_share(self):
+        packer = ContextPacker(100)
+        packer.add_segment(ContextSegment("history", [str(i) for i in range(20)], [10] * 20, priority=1))
+        packer.add_segment(ContextSegment("summary", ["summary"], [30], priority=0, max_share=0.25, truncate=ContextSegment.DROP))
+        packer.add_segment(ContextSegment("known_info", ["info"], [20], priority=2, min_share=0.2, truncate=ContextSegment.DROP))
+        packed = packer.pack()
+        # the summary is more than its max share, the reservation of known_info is kept from the history
+        self.assertEqual(packed["summary"].token_count, 0)
+        self.assertEqual(packed["history"].token_count, 80)
+        self.assertEqual(packed["history"].items[-1], "19")
+        self.assertEqual(packed["known_info"].items, ["info"])
+
+    def test_cut_text(self):
+        text = "hello world " * 100
+        packer = ContextPacker(20, "gpt-4")
+        packer.add_segment(ContextSegment("summary", text, truncate=ContextSegment.CUT_TEXT))
+        packed = packer.pack()["summary"]
+        self.assertFalse(packed.is_complete)
+        self.assertTrue(text.startswith(packed.to_str()))
+        self.assertLessEqual(TokenCounter.count(packed.to_str(), "gpt-4"), 20)
+
+
+class TestChatRecordTokens(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp(prefix="aios_test_")
+        self.db_path = f"{self.data_dir}/chat.db"
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def _create_msg(self, body: str) -> AgentMsg:
+        msg = AgentMsg()
+        msg.sender = "user"
+        msg.target = "agent"
+        msg.body = body
+        msg.create_time = time.time()
+        return msg
+
+    def test_stored_token_count(self):
+        # a db created before the TokenCount column
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("CREATE TABLE Messages (MessageID TEXT PRIMARY KEY, SessionID TEXT, MsgType INTEGER, PrevMsgID TEXT, QuoteMsgID TEXT, RelyMsgID TEXT, SenderID TEXT, ReceiverID TEXT, Timestamp TEXT, Topic TEXT, Mentions TEXT, ContentMIME TEXT, Content TEXT, ActionName TEXT, ActionParams TEXT, ActionResult TEXT, DoneTime TEXT, Status INTEGER, Tags TEXT)")
+        old_msg = self._create_msg("an old message")
+        conn.execute("INSERT INTO Messages (MessageID, SessionID, MsgType, SenderID, ReceiverID, Timestamp, Content, Status) VALUES (?, ?, 0, ?, ?, ?, ?, 0)",
+                     (old_msg.msg_id, "CS#test", old_msg.sender, old_msg.target, old_msg.create_time, old_msg.body))
+        conn.commit()
+        conn.close()
+
+        chatsession = AIChatSession.get_session_by_id("CS#test", self.db_path)
+        self.assertIsNone(chatsession)
+        chatsession = AIChatSession("agent", "CS#test", AIChatSession._dbs[self.db_path])
+        new_msg = self._create_msg("a new message")
+        chatsession.append(new_msg)
+        self.assertEqual(new_msg.token_count, TokenCounter.count(format_chat_record(new_msg)))
+
+        records, token_counts = chatsession.read_records(0, 0, "natural")
+        self.assertEqual(records, [format_chat_record(old_msg), format_chat_record(new_msg)])
+        self.assertEqual(token_counts, [TokenCounter.count(record) for record in records])
+        # the count of old message is stored when it's read
+        self.assertEqual([msg.token_count for msg in chatsession.read_history(0, 0, "natural")], token_counts)
+
+
+if __name__ == "__main__":
+    unittest.main()
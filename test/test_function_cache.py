@@ -0,0 +1,99 @@
+import os
+import sys
+import asyncio
+import unittest
+
+directory = os.path.dirname(__file__)
+sys.path.insert(0, os.path.abspath(os.path.join(directory, "..", "src")))
+
+from aios import AIFunctionResultCache
+from aios.proto.ai_function import CacheableResult, SimpleAIFunction
+
+
+class MockWorkspace:
+    def __init__(self, owner_id: str) -> None:
+        self.owner_id = owner_id
+
+    def get_cache_identity(self) -> str:
+        return self.owner_id
+
+
+class TestFunctionCache(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.cache = AIFunctionResultCache()
+        self.calls = []
+        self.files = {"a.txt": "hello"}
+
+        async def read_file(parameters):
+            self.calls.append(parameters["filename"])
+            await asyncio.sleep(parameters.get("delay", 0))
+            if parameters.get("_workspace") is False:
+                return "_workspace not found"
+            if parameters["filename"] not in self.files:
+                return "error: file not found"
+            return CacheableResult(self.files[parameters["filename"]])
+
+        async def write_file(parameters):
+            self.files[parameters["filename"]] = parameters["content"]
+            return "ok"
+
+        self.read_func = SimpleAIFunction("test.read_file", "read file", read_file, cache_ttl=60)
+        self.write_func = SimpleAIFunction("test.write_file", "write file", write_file, invalidate_functions=["test.read_file"])
+
+    async def _call(self, func: SimpleAIFunction, arguments: dict):
+        return await self.cache.execute(func, arguments, lambda: func.execute(arguments))
+
+    async def test_cached_result(self):
+        self.assertEqual(await self._call(self.read_func, {"filename": "a.txt", "delay": 0}), "hello")
+        # same arguments in another order
+        self.assertEqual(await self._call(self.read_func, {"delay": 0, "filename": "a.txt"}), "hello")
+        self.assertEqual(self.calls, ["a.txt"])
+        self.assertEqual(self.cache.get_stats()["hit_count"], 1)
+
+        # only the successful results are cached
+        await self._call(self.read_func, {"filename": "b.txt"})
+        await self._call(self.read_func, {"filename": "b.txt"})
+        await self._call(self.read_func, {"filename": "a.txt", "_workspace": False})
+        await self._call(self.read_func, {"filename": "a.txt", "_workspace": False})
+        self.assertEqual(self.calls, ["a.txt", "b.txt", "b.txt", "a.txt", "a.txt"])
+
+        # not cacheable
+        self.read_func.cache_ttl = None
+        await self._call(self.read_func, {"filename": "a.txt", "delay": 0})
+        self.assertEqual(len(self.calls), 6)
+
+    async def test_expire(self):
+        self.read_func.cache_ttl = 0.05
+        await self._call(self.read_func, {"filename": "a.txt"})
+        await asyncio.sleep(0.1)
+        await self._call(self.read_func, {"filename": "a.txt"})
+        self.assertEqual(self.calls, ["a.txt", "a.txt"])
+
+    async def test_invalidate(self):
+        await self._call(self.read_func, {"filename": "a.txt"})
+        await self._call(self.write_func, {"filename": "a.txt", "content": "world"})
+        self.assertEqual(await self._call(self.read_func, {"filename": "a.txt"}), "world")
+        self.assertEqual(len(self.calls), 2)
+
+        # a read started before the write is not put to the cache
+        read_task = asyncio.create_task(self._call(self.read_func, {"filename": "a.txt", "delay": 0.1}))
+        await asyncio.sleep(0.05)
+        await self._call(self.write_func, {"filename": "a.txt", "content": "again"})
+        await read_task
+        self.assertEqual(await self._call(self.read_func, {"filename": "a.txt", "delay": 0.1}), "again")
+
+    async def test_object_arguments(self):
+        # the objects in arguments are keyed by their cache identity, like the owner of _workspace
+        await self._call(self.read_func, {"filename": "a.txt", "_workspace": MockWorkspace("agent_a")})
+        await self._call(self.read_func, {"filename": "a.txt", "_workspace": MockWorkspace("agent_a")})
+        await self._call(self.read_func, {"filename": "a.txt", "_workspace": MockWorkspace("agent_b")})
+        self.assertEqual(len(self.calls), 2)
+
+        # the object without identity is not cached
+        await self._call(self.read_func, {"filename": "a.txt", "_workspace": object()})
+        await self._call(self.read_func, {"filename": "a.txt", "_workspace": object()})
+        self.assertEqual(len(self.calls), 4)
+        self.assertEqual(self.cache.get_stats()["entry_count"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import tempfile
+import unittest
+
+directory = os.path.dirname(__file__)
+sys.path.insert(0, os.path.abspath(os.path.join(directory, "..", "src")))
+sys.path.insert(0, os.path.abspath(os.path.join(directory, "..", "src", "component")))
+
+from aios import ComputeKernel, ComputeTask, ComputeTaskResult, ComputeTaskResultCode, ComputeTaskType, LLMPrompt, LLMCompletionCache
+from test_node import TestComputeNode
+
+
+def create_llm_task(content: str, model_name: str = "gpt-4") -> ComputeTask:
+    task = ComputeTask()
+    task.set_llm_params(LLMPrompt(content), "text", model_name, 1000)
+    return task
+
+
+def create_result(result_str: str) -> ComputeTaskResult:
+    result = ComputeTaskResult()
+    result.result_code = ComputeTaskResultCode.OK
+    result.result_str = result_str
+    result.result["message"] = {"role": "assistant", "content": result_str}
+    return result
+
+
+class TestLLMCompletionCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = LLMCompletionCache(os.path.join(self.temp_dir.name, "llm_cache.db"), ttl=60, max_entries=2)
+
+    def tearDown(self):
+        self.cache.close()
+        self.temp_dir.cleanup()
+
+    def test_cache_key(self):
+        key = LLMCompletionCache.get_cache_key(create_llm_task("hello"))
+        self.assertEqual(key, LLMCompletionCache.get_cache_key(create_llm_task(" hello\n")))
+        self.assertNotEqual(key, LLMCompletionCache.get_cache_key(create_llm_task("hello", "gpt-3.5-turbo")))
+
+    def test_get_put(self):
+        task = create_llm_task("hello")
+        self.assertIsNone(self.cache.get(task))
+        self.cache.put(task, create_result("world"))
+
+        another_task = create_llm_task("hello")
+        result = self.cache.get(another_task)
+        self.assertEqual(result.result_str, "world")
+        self.assertEqual(result.result["message"]["content"], "world")
+        self.assertTrue(result.result_refers["from_cache"])
+        self.assertIs(another_task.result, result)
+        self.assertEqual(self.cache.get_stats()["hit_count"], 1)
+        self.assertEqual(self.cache.get_stats()["miss_count"], 1)
+
+    def test_ttl(self):
+        self.cache.ttl = 0.05
+        task = create_llm_task("hello")
+        self.cache.put(task, create_result("world"))
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get(task))
+
+    def test_lru_eviction(self):
+        for content in ["a", "b"]:
+            self.cache.put(create_llm_task(content), create_result(content))
+        time.sleep(0.01)
+        self.assertIsNotNone(self.cache.get(create_llm_task("a")))
+        self.cache.put(create_llm_task("c"), create_result("c"))
+
+        self.assertIsNotNone(self.cache.get(create_llm_task("a")))
+        self.assertIsNone(self.cache.get(create_llm_task("b")))
+        self.assertEqual(self.cache.get_stats()["evict_count"], 1)
+
+    async def test_kernel_cacheable_completion(self):
+        node = TestComputeNode()
+        node.support_task_types = [ComputeTaskType.LLM_COMPLETION]
+        node.mock_running_time = {ComputeTaskType.LLM_COMPLETION: 0.05}
+        node.mock_error_rate = {ComputeTaskType.LLM_COMPLETION: 0}
+        node.mock_task_load = {ComputeTaskType.LLM_COMPLETION: 1}
+        node.start()
+        kernel = ComputeKernel()
+        kernel.llm_cache = self.cache
+        kernel.add_compute_node(node)
+        await kernel.start()
+
+        first_result = await kernel.do_llm_completion(LLMPrompt("hello"), cacheable=True)
+        second_result = await kernel.do_llm_completion(LLMPrompt("hello"), cacheable=True)
+        await kernel.do_llm_completion(LLMPrompt("hello"))
+
+        self.assertEqual(second_result.result_str, first_result.result_str)
+        self.assertTrue(second_result.result_refers.get("from_cache"))
+        self.assertEqual(kernel.get_node_stats(node.node_id).total_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
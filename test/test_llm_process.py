@@ -0,0 +1,348 @@
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import shutil
+import tempfile
+import unittest
+
+directory = os.path.dirname(__file__)
+sys.path.insert(0, os.path.abspath(os.path.join(directory, "..", "src")))
+sys.path.insert(0, os.path.abspath(os.path.join(directory, "..", "src", "component")))
+
+from aios import AgentMsg, ComputeKernel, ComputeTask, ComputeTaskResult, ComputeTaskResultCode, ComputeTaskType, LLMPrompt, LLMResult
+from aios.proto.ai_function import ParameterDefine, SimpleAIFunction
+from aios.frame.token_counter import TokenCounter
+from aios.agent.agent import AIAgent
+from aios.agent.agent_memory import AgentMemory
+from aios.agent.llm_process import BaseLLMProcess
+from aios.agent.llm_context import GlobaToolsLibrary, LLMProcessContext, SimpleLLMContext
+from test_node import MockComputeNode
+
+
+async def create_agent(agent_id: str, data_dir: str, process_config: dict = None, agent_config: dict = None) -> AIAgent:
+    agent = AIAgent()
+    on_message = {
+        "type": "AgentMessageProcess",
+        "role_desc": "You are a test agent.",
+        "context": "now is {now}",
+        "model_name": "gpt-4",
+    }
+    on_message.update(process_config or {})
+    config = {"instance_id": agent_id, "fullname": agent_id, "llm_model_name": "gpt-4", "behavior": {"on_message": on_message}}
+    config.update(agent_config or {})
+    await agent.load_from_config(config)
+    agent.memory = AgentMemory(agent_id, f"{data_dir}/{agent_id}/memory")
+    for process in agent.behaviors.values():
+        await process.initial({"memory": agent.memory})
+    return agent
+
+
+def create_msg(agent_id: str, body: str) -> AgentMsg:
+    msg = AgentMsg()
+    msg.sender = "test_user"
+    msg.target = agent_id
+    msg.topic = "test"
+    msg.body = body
+    return msg
+
+
+class TestPromptPrefix(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.old_kernel = ComputeKernel._instance
+        self.kernel = ComputeKernel()
+        ComputeKernel._instance = self.kernel
+        self.node = MockComputeNode()
+        self.node.set_latency(ComputeTaskType.LLM_COMPLETION, 0.01)
+        self.node.enable_prefix_cache = True
+        self.node.start()
+        self.kernel.add_compute_node(self.node)
+        await self.kernel.start()
+        self.data_dir = tempfile.mkdtemp()
+
+    async def asyncTearDown(self):
+        ComputeKernel._instance = self.old_kernel
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_dumps_system_prompt(self):
+        a = {"known_info": {"sender_info": "x", "chat_record": "y"}, "context": "now", "role_description": "role", "support_actions": {"b": 1, "a": 2}}
+        b = {"role_description": "role", "support_actions": {"a": 2, "b": 1}, "context": "now", "known_info": {"chat_record": "y", "sender_info": "x"}}
+        self.assertEqual(BaseLLMProcess.dumps_system_prompt(a), BaseLLMProcess.dumps_system_prompt(b))
+        self.assertEqual(list(json.loads(BaseLLMProcess.dumps_system_prompt(a)).keys()), ["role_description", "support_actions", "context", "known_info"])
+        # unknown segments before the volatile ones
+        c = {"context": "now", "extra": 1, "role_description": "role"}
+        self.assertEqual(list(json.loads(BaseLLMProcess.dumps_system_prompt(c)).keys()), ["role_description", "extra", "context"])
+
+    def test_prompt_cache_usage(self):
+        result = ComputeTaskResult()
+        self.assertEqual(ComputeKernel.get_prompt_cache_usage(result), (0, 0))
+        result.result_refers["token_usage"] = {"prompt_tokens": 100, "prompt_tokens_details": {"cached_tokens": 64}}
+        self.assertEqual(ComputeKernel.get_prompt_cache_usage(result), (100, 64))
+        result.result_refers["token_usage"] = {"prompt_tokens": 100, "cache_read_input_tokens": 32}
+        self.assertEqual(ComputeKernel.get_prompt_cache_usage(result), (100, 32))
+
+    async def test_stable_prefix(self):
+        agent = await create_agent("prefix_agent", self.data_dir)
+        process = agent.behaviors["on_message"]
+        self.assertEqual(process.behavior, "on_message")
+
+        prompts = []
+        for body in ["hello", "how are you"]:
+            prompt = await process.prepare_prompt({"msg": create_msg(agent.agent_id, body), "context_info": await agent._get_context_info()})
+            prompts.append(prompt.system_message["content"])
+        self.assertTrue(prompts[0].startswith('{"role_description": "You are a test agent."'))
+        # the volatile context is after the action schemas
+        self.assertLess(prompts[0].index('"support_actions"'), prompts[0].index('"context"'))
+
+        for body in ["hello", "how are you"]:
+            resp = await agent._process_msg(create_msg(agent.agent_id, body))
+            self.assertIsNotNone(resp)
+        self.assertGreater(process.prompt_token_count, 0)
+        self.assertGreater(process.cached_token_count, 0)
+        self.assertGreater(process.get_prompt_cache_hit_ratio(), 0)
+        self.assertGreater(self.kernel.llm_cached_token_metric.get(model="gpt-4"), 0)
+
+    async def test_agent_energy(self):
+        # no quota by default, only the fair share
+        agent = await create_agent("fair_agent", self.data_dir)
+        self.assertEqual(agent.agent_energy, math.inf)
+        await agent._process_msg(create_msg(agent.agent_id, "hello"))
+        self.assertEqual(agent.agent_energy, math.inf)
+        self.assertGreater(self.kernel.token_budget.get_budget("fair_agent").used_tokens, 0)
+
+        agent = await create_agent("energy_agent", self.data_dir, agent_config={"token_quota": 2000})
+        self.assertEqual(agent.agent_energy, AIAgent.DEFAULT_TOKEN_BURST / AIAgent.ENERGY_TOKENS)
+        await agent._process_msg(create_msg(agent.agent_id, "hello"))
+        # the tokens of the reply are taken from the budget
+        self.assertLess(agent.agent_energy, AIAgent.DEFAULT_TOKEN_BURST / AIAgent.ENERGY_TOKENS)
+        self.assertGreater(self.kernel.token_budget.get_budget("energy_agent").used_tokens, 0)
+
+
+# returns the scripted assistant messages in order
+class ScriptedComputeNode(MockComputeNode):
+    def __init__(self, messages) -> None:
+        super().__init__("scripted_node")
+        self.messages = messages
+        self.tasks = []
+
+    async def execute_task(self, task: ComputeTask) -> ComputeTaskResult:
+        self.tasks.append(task)
+        message = self.messages.pop(0)
+        result = ComputeTaskResult()
+        result.set_from_task(task)
+        result.result_code = ComputeTaskResultCode.OK
+        result.result_str = message.get("content")
+        result.result["message"] = message
+        return result
+
+
+class ToolTestProcess(BaseLLMProcess):
+    def __init__(self, functions) -> None:
+        super().__init__()
+        self.functions = {func.get_name(): func for func in functions}
+
+    async def prepare_prompt(self, input):
+        prompt = LLMPrompt(input["text"])
+        prompt.inner_functions = [{"name": name, "description": "", "parameters": {}} for name in self.functions.keys()]
+        return prompt
+
+    async def get_inner_function_for_exec(self, func_name):
+        return self.functions.get(func_name)
+
+    def prepare_inner_function_context_for_exec(self, inner_func_name, parameters):
+        return
+
+    async def post_llm_process(self, actions, input, llm_result):
+        return True
+
+    async def load_from_config(self, config):
+        return await super().load_from_config(config)
+
+    async def initial(self, params=None):
+        return True
+
+
+def tool_call(call_id: str, name: str, arguments: dict) -> dict:
+    return {"id": call_id, "type": "function", "function": {"name": name, "arguments": json.dumps(arguments)}}
+
+
+class TestToolCalls(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.old_kernel = ComputeKernel._instance
+        self.kernel = ComputeKernel()
+        ComputeKernel._instance = self.kernel
+        self.running = 0
+        self.running_peak = 0
+
+    async def asyncTearDown(self):
+        ComputeKernel._instance = self.old_kernel
+
+    async def _start_node(self, messages) -> ScriptedComputeNode:
+        node = ScriptedComputeNode(messages)
+        node.start()
+        self.kernel.add_compute_node(node)
+        await self.kernel.start()
+        return node
+
+    def _create_process(self) -> ToolTestProcess:
+        async def lookup(parameters):
+            self.running += 1
+            self.running_peak = max(self.running_peak, self.running)
+            try:
+                await asyncio.sleep(parameters.get("delay", 0.1))
+            finally:
+                self.running -= 1
+            return f"result of {parameters['key']}"
+
+        async def broken(parameters):
+            raise ValueError("broken tool")
+
+        process = ToolTestProcess([SimpleAIFunction("lookup", "lookup a key", lookup), SimpleAIFunction("broken", "always fails", broken)])
+        process.model_name = "gpt-4"
+        process.max_token = 4000
+        return process
+
+    async def test_parallel_tool_calls(self):
+        tool_calls = [tool_call(f"call_{i}", "lookup", {"key": i}) for i in range(4)]
+        tool_calls.append(tool_call("call_broken", "broken", {}))
+        tool_calls.append(tool_call("call_slow", "lookup", {"key": "slow", "delay": 2}))
+        node = await self._start_node([
+            {"role": "assistant", "content": None, "function_call": None, "tool_calls": tool_calls},
+            {"role": "assistant", "content": "done", "function_call": None, "tool_calls": None},
+        ])
+        process = self._create_process()
+        process.max_parallel_tool_calls = 2
+        process.tool_timeout = 0.3
+
+        start_time = time.monotonic()
+        llm_result : LLMResult = await process.process({"text": "lookup all"})
+        self.assertEqual(llm_result.resp.strip(), "done")
+        # 4 lookups of 0.1s by 2 workers, and the slow one is stopped by the timeout
+        self.assertLess(time.monotonic() - start_time, 0.8)
+        self.assertEqual(self.running_peak, 2)
+
+        # one follow-up completion with all the results in order
+        self.assertEqual(len(node.tasks), 2)
+        messages = node.tasks[1].params["prompts"]
+        self.assertEqual(messages[-7]["tool_calls"], tool_calls)
+        tool_messages = messages[-6:]
+        self.assertEqual([msg["tool_call_id"] for msg in tool_messages], [call["id"] for call in tool_calls])
+        self.assertEqual(tool_messages[0]["content"], "result of 0")
+        self.assertIn("broken tool", tool_messages[4]["content"])
+        self.assertIn("timeout", tool_messages[5]["content"])
+
+    async def test_legacy_function_call(self):
+        node = await self._start_node([
+            {"role": "assistant", "content": None, "function_call": {"name": "lookup", "arguments": json.dumps({"key": "a"})}, "tool_calls": None},
+            {"role": "assistant", "content": "done", "function_call": None, "tool_calls": None},
+        ])
+        llm_result = await self._create_process().process({"text": "lookup a"})
+        self.assertEqual(llm_result.resp.strip(), "done")
+        messages = node.tasks[1].params["prompts"]
+        self.assertNotIn("tool_calls", messages[-2])
+        self.assertEqual(messages[-1], {"role": "function", "content": "result of a", "name": "lookup"})
+        # no more function calls after the stack limit
+        self.assertIsNone(node.tasks[1].params.get("inner_functions"))
+
+    async def test_stream_reply(self):
+        node = await self._start_node([
+            {"role": "assistant", "content": "**IGNORE**", "function_call": None, "tool_calls": None},
+            {"role": "assistant", "content": "hello", "function_call": None, "tool_calls": None},
+        ])
+        deltas = []
+        async def _on_delta(delta):
+            deltas.append(delta)
+        process = self._create_process()
+        process.get_stream_handler = lambda input: _on_delta
+
+        # the reply may be json, actions or **IGNORE**, not streamed by default
+        await process.process({"text": "lookup a"})
+        self.assertFalse(node.tasks[0].is_stream())
+
+        process.enable_stream_reply = True
+        llm_result = await process.process({"text": "say hello"})
+        self.assertEqual(llm_result.resp.strip(), "hello")
+        self.assertTrue(node.tasks[1].is_stream())
+
+
+class TestCompiledFunctions(unittest.TestCase):
+    def setUp(self):
+        self.old_library = GlobaToolsLibrary._instance
+        GlobaToolsLibrary._instance = GlobaToolsLibrary()
+
+    def tearDown(self):
+        GlobaToolsLibrary._instance = self.old_library
+
+    def _create_function(self, func_id: str) -> SimpleAIFunction:
+        return SimpleAIFunction(func_id, f"the {func_id} function", None, ParameterDefine.create_parameters({"key": "the key"}))
+
+    def test_compiled_functions(self):
+        library = GlobaToolsLibrary.get_instance()
+        for func_id in ["test.search", "test.add", "test.remove"]:
+            library.register_tool_function(self._create_function(func_id))
+        context = SimpleLLMContext()
+        context.load_from_config({"functions": {"enable": ["test.search", "test.add"]}})
+
+        compiled = context.get_compiled_functions()
+        self.assertIs(context.get_compiled_functions(), compiled)
+        all_functions = list(context.get_all_ai_functions())
+        self.assertEqual(compiled.inner_functions, LLMProcessContext.aifunctions_to_inner_functions(all_functions))
+        self.assertEqual(compiled.schema_json, json.dumps(compiled.inner_functions, ensure_ascii=False))
+        self.assertEqual(compiled.get_token_count("gpt-4"), TokenCounter.count(compiled.schema_json, "gpt-4"))
+        self.assertEqual(context.get_ai_function("search").get_id(), "test.search")
+        self.assertIsNone(context.get_ai_function("remove"))
+
+        # the schemas of the library are reused by the other contexts
+        other_context = SimpleLLMContext()
+        other_context.load_from_config({"functions": {"enable": ["test.search"]}})
+        self.assertIs(other_context.get_compiled_functions().inner_functions[0], compiled.inner_functions[1])
+
+        # only rebuilt when a function is added or removed
+        context.add_ai_function(library.get_tool_function("test.remove"))
+        new_compiled = context.get_compiled_functions()
+        self.assertIsNot(new_compiled, compiled)
+        self.assertEqual([func["name"] for func in new_compiled.inner_functions], ["add", "remove", "search"])
+        context.remove_ai_function("test.add")
+        self.assertIsNone(context.get_ai_function("add"))
+
+    def test_library_and_preset(self):
+        library = GlobaToolsLibrary.get_instance()
+        library.register_tool_function(self._create_function("test.search"))
+        library.register_tool_function(self._create_function("test.add"))
+        preset = SimpleLLMContext()
+        preset.load_from_config({"functions": {"enable": ["test.search"]}})
+        library.register_prset_context("test_preset", preset)
+
+        context = SimpleLLMContext()
+        context.load_from_config({"preset": "test_preset", "functions": {"enable": ["test.add"]}})
+        self.assertEqual([func["name"] for func in context.get_compiled_functions().inner_functions], ["add", "search"])
+        # the preset is not changed by the context
+        self.assertEqual([func["name"] for func in preset.get_compiled_functions().inner_functions], ["search"])
+        self.assertIsNone(preset.get_ai_function("add"))
+
+        # a function registered again is compiled again
+        compiled = preset.get_compiled_functions()
+        library.register_tool_function(self._create_function("test.search"))
+        self.assertIsNot(preset.get_compiled_functions(), compiled)
+        self.assertIs(preset.get_compiled_functions(), preset.get_compiled_functions())
+
+    def test_prompt_token_count(self):
+        context = SimpleLLMContext()
+        context.add_ai_function(self._create_function("test.search"))
+        compiled = context.get_compiled_functions()
+
+        prompt = LLMPrompt("hello")
+        compiled.set_to_prompt(prompt)
+        token_count = prompt.get_token_count("gpt-4")
+        self.assertEqual(compiled.token_counts["gpt-4"], compiled.get_token_count("gpt-4"))
+        self.assertEqual(token_count, LLMPrompt.get_message_token_count(prompt.messages[0], "gpt-4") + compiled.get_token_count("gpt-4"))
+
+        # the counts are not used for the functions set directly
+        prompt.inner_functions = compiled.inner_functions + [{"name": "other", "description": "", "parameters": {}}]
+        self.assertGreater(prompt.get_token_count("gpt-4"), token_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import sys
+import asyncio
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+directory = os.path.dirname(__file__)
+sys.path.insert(0, os.path.abspath(os.path.join(directory, "..", "src")))
+sys.path.insert(0, os.path.abspath(os.path.join(directory, "..", "src", "component")))
+
+from aios import ComputeTask, ComputeTaskState, ComputeTaskResultCode, LLMPrompt
+from aios.net.http_client import AsyncHttpClient
+from llama_node import LocalLlama_ComputeNode
+
+
+def create_llama_app(delay: float, replica_id: int) -> web.Application:
+    async def _embeddings(request):
+        body = await request.json()
+        await asyncio.sleep(delay)
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = [{"index": i, "embedding": [float(len(text)), float(replica_id)]} for i, text in enumerate(inputs)]
+        return web.json_response({"data": list(reversed(data))})
+
+    async def _completions(request):
+        body = await request.json()
+        await asyncio.sleep(delay)
+        return web.json_response({
+            "choices": [{"finish_reason": "stop", "message": {"role": "assistant", "content": body["messages"][-1]["content"]}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1},
+        })
+
+    app = web.Application()
+    app.router.add_post("/v1/embeddings", _embeddings)
+    app.router.add_post("/v1/chat/completions", _completions)
+    return app
+
+
+class TestLocalLlamaNode(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.servers = [TestServer(create_llama_app(0.1, i)) for i in range(2)]
+        for server in self.servers:
+            await server.start_server()
+        urls = [str(server.make_url("")).rstrip("/") for server in self.servers]
+        self.node = LocalLlama_ComputeNode(urls[0], "llama-test", replica_urls=urls[1:])
+        self.node.max_in_flight = 4
+        self.node.start()
+
+    async def asyncTearDown(self):
+        await AsyncHttpClient.get_instance().close()
+        for server in self.servers:
+            await server.close()
+
+    async def _run(self, task: ComputeTask) -> ComputeTask:
+        await self.node.push_task(task)
+        await asyncio.wait_for(asyncio.shield(task.get_done_future()), 5)
+        return task
+
+    async def test_completion_not_blocking(self):
+        tasks = []
+        for i in range(4):
+            task = ComputeTask()
+            task.set_llm_params(LLMPrompt(f"hello {i}"), "text", "llama-test", 100)
+            tasks.append(task)
+
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+        await asyncio.gather(*[self._run(task) for task in tasks])
+        # 4 requests of 0.1s on 2 replicas run concurrently
+        self.assertLess(loop.time() - start_time, 0.35)
+        for i, task in enumerate(tasks):
+            self.assertEqual(task.state, ComputeTaskState.DONE)
+            self.assertEqual(task.result.result_str, f"hello {i}")
+        self.assertEqual([replica.total_count for replica in self.node.replicas], [2, 2])
+        self.assertEqual([replica.outstanding for replica in self.node.replicas], [0, 0])
+
+    async def test_batch_embedding(self):
+        task = ComputeTask()
+        task.set_text_embedding_params(["a", "bb"], "llama-test")
+        await self._run(task)
+        self.assertEqual(task.result.result_code, ComputeTaskResultCode.OK)
+        self.assertEqual([vector[0] for vector in task.result.result["content"]], [1.0, 2.0])
+
+    async def test_deadline_timeout(self):
+        task = ComputeTask()
+        task.set_text_embedding_params("a", "llama-test")
+        task.set_deadline(0.05)
+        await self._run(task)
+        self.assertEqual(task.state, ComputeTaskState.ERROR)
+
+    async def test_request_timeout(self):
+        task = ComputeTask()
+        task.set_text_embedding_params("a", "llama-test")
+        task.set_deadline(30)
+        timeout = self.node._get_timeout(task)
+        self.assertLessEqual(timeout.total, 30)
+        # the per-request timeout keeps the connect timeout of the session
+        self.assertEqual(timeout.connect, AsyncHttpClient.get_instance().connect_timeout)
+        timeout = self.node._get_timeout(ComputeTask())
+        self.assertEqual(timeout.total, self.node.request_timeout)
+        self.assertEqual(timeout.connect, AsyncHttpClient.get_instance().connect_timeout)
+
+
+if __name__ == "__main__":
+    unittest.main()
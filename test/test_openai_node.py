@@ -0,0 +1,79 @@
+import os
+import sys
+import asyncio
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+directory = os.path.dirname(__file__)
+sys.path.insert(0, os.path.abspath(os.path.join(directory, "..", "src")))
+sys.path.insert(0, os.path.abspath(os.path.join(directory, "..", "src", "component")))
+
+from aios import ComputeTask, ComputeTaskState, ComputeTaskResultCode, ComputeTaskType, LLMPrompt
+from openai_node import OpenAI_ComputeNode, OpenAITTSComputeNode, WhisperComputeNode, OpenAIClientPool
+
+
+class FailingOpenAIClient:
+    def __init__(self) -> None:
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._raise))
+        self.audio = SimpleNamespace(speech=SimpleNamespace(create=self._raise), transcriptions=SimpleNamespace(create=self._raise))
+
+    async def _raise(self, **kwargs):
+        raise ConnectionError("openai is down")
+
+
+class LengthOpenAIClient:
+    def __init__(self) -> None:
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        choice = SimpleNamespace(finish_reason="length", message=None)
+        return SimpleNamespace(choices=[choice], usage=None)
+
+
+async def run_task(node, task: ComputeTask) -> ComputeTask:
+    await node.push_task(task)
+    await asyncio.wait_for(asyncio.shield(task.get_done_future()), 5)
+    return task
+
+
+def create_llm_task() -> ComputeTask:
+    task = ComputeTask()
+    task.set_llm_params(LLMPrompt("hello"), "text", "gpt-4", 100)
+    return task
+
+
+class TestOpenAINodeError(unittest.IsolatedAsyncioTestCase):
+    async def test_completion_error(self):
+        for client in [FailingOpenAIClient(), LengthOpenAIClient()]:
+            node = OpenAI_ComputeNode()
+            node.get_client = lambda client=client: client
+            node.start()
+            task = await run_task(node, create_llm_task())
+            # the failed completion is not DONE
+            self.assertEqual(task.state, ComputeTaskState.ERROR)
+            self.assertEqual(task.result.result_code, ComputeTaskResultCode.ERROR)
+
+    async def test_audio_error(self):
+        pool = SimpleNamespace(get_client=lambda api_key: FailingOpenAIClient())
+        with mock.patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}), mock.patch.object(OpenAIClientPool, "get_instance", return_value=pool):
+            tts_task = ComputeTask()
+            tts_task.task_type = ComputeTaskType.TEXT_2_VOICE
+            tts_task.params = {"text": "hello", "voice_name": None, "gender": None, "model_name": None}
+            await run_task(OpenAITTSComputeNode(), tts_task)
+
+            with tempfile.NamedTemporaryFile(suffix=".mp3") as audio_file:
+                whisper_task = ComputeTask()
+                whisper_task.task_type = ComputeTaskType.VOICE_2_TEXT
+                whisper_task.params = {"prompt": None, "file": audio_file.name}
+                await run_task(WhisperComputeNode(), whisper_task)
+
+        for task in [tts_task, whisper_task]:
+            self.assertEqual(task.state, ComputeTaskState.ERROR)
+            self.assertEqual(task.result.result_code, ComputeTaskResultCode.ERROR)
+            self.assertIn("openai is down", task.result.error_str)
+
+
+if __name__ == "__main__":
+    unittest.main()
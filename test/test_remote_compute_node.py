@@ -0,0 +1,152 @@
+import os
+import sys
+import socket
+import asyncio
+import unittest
+
+from aiohttp.test_utils import TestServer
+
+directory = os.path.dirname(__file__)
+sys.path.insert(0, os.path.abspath(os.path.join(directory, "..", "src")))
+sys.path.insert(0, os.path.abspath(os.path.join(directory, "..", "src", "component")))
+
+from aios import ComputeKernel, ComputeTask, ComputeTaskResult, ComputeTaskType, ComputeTaskState, ComputeTaskResultCode, LLMPrompt
+from aios import RemoteComputeNode, ComputeNodeWorker
+from aios.frame.remote_compute_node import dumps_message, loads_message
+from test_node import TestComputeNode
+
+
+def create_worker_node(running_time: float = 0.1) -> TestComputeNode:
+    node = TestComputeNode()
+    node.node_id = "worker_test_node"
+    node.max_in_flight = 2
+    node.support_task_types = [ComputeTaskType.LLM_COMPLETION, ComputeTaskType.TEXT_EMBEDDING]
+    for task_type in node.support_task_types:
+        node.mock_running_time[task_type] = running_time
+        node.mock_error_rate[task_type] = 0.0
+        node.mock_task_load[task_type] = 1
+    return node
+
+
+class TestRemoteComputeNode(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.worker_node = create_worker_node()
+        self.worker_node.start()
+        self.worker = ComputeNodeWorker("test_worker", "test_token")
+        self.worker.status_interval = 0.05
+        self.worker.add_node(self.worker_node)
+        self.server = TestServer(self.worker.get_app())
+        await self.server.start_server()
+
+        self.node = RemoteComputeNode(str(self.server.make_url("/compute_node")), token="test_token")
+        self.node.start()
+        self.assertTrue(await self.node.wait_connected())
+
+        self.kernel = ComputeKernel()
+        self.kernel.add_compute_node(self.node)
+        await self.kernel.start()
+
+    async def asyncTearDown(self):
+        await self.node.close()
+        await self.server.close()
+
+    async def test_capabilities_and_status(self):
+        task = ComputeTask()
+        task.set_llm_params(LLMPrompt("hello"), "text", "gpt-4", 100)
+        self.assertTrue(self.node.is_support(task))
+        task.task_type = ComputeTaskType.VOICE_2_TEXT
+        self.assertFalse(self.node.is_support(task))
+        self.assertEqual(self.node.worker_id, "test_worker")
+        self.assertEqual(self.node.get_capacity(), 2)
+
+    async def test_completion(self):
+        tasks = [self.kernel.llm_completion(LLMPrompt(f"hello {i}"), model_name="gpt-4") for i in range(2)]
+        for task in tasks:
+            result = await self.kernel._wait_task(task, timeout=5)
+            self.assertEqual(result.result_code, ComputeTaskResultCode.OK)
+            self.assertEqual(result.result_str, "finished")
+            self.assertEqual(result.worker_id, "worker_test_node")
+            self.assertEqual(task.state, ComputeTaskState.DONE)
+        self.assertEqual(self.worker_node.in_flight_peak, 2)
+
+        vectors = await self.kernel.do_text_embedding_batch(["a", "bb"])
+        self.assertEqual(vectors, [TestComputeNode.mock_embedding(text) for text in ["a", "bb"]])
+
+    async def test_stream(self):
+        deltas = [delta async for delta in self.kernel.llm_completion_stream(LLMPrompt("hello"), mode_name="gpt-4", timeout=5)]
+        self.assertEqual(deltas, ["fin", "ish", "ed"])
+
+    async def test_cancel(self):
+        self.worker_node.mock_running_time[ComputeTaskType.LLM_COMPLETION] = 2
+        task = self.kernel.llm_completion(LLMPrompt("hello"), model_name="gpt-4")
+        await asyncio.sleep(0.2)
+        self.assertEqual(len(self.worker.running_tasks), 1)
+        task.cancel()
+        await asyncio.sleep(0.1)
+        self.assertEqual(len(self.worker.running_tasks), 0)
+        self.assertEqual(len(self.worker_node.running_workers), 0)
+        self.assertEqual(len(self.node.remote_tasks), 0)
+
+    async def test_disconnect(self):
+        self.worker_node.mock_running_time[ComputeTaskType.LLM_COMPLETION] = 2
+        task = self.kernel.llm_completion(LLMPrompt("hello"), model_name="gpt-4")
+        await asyncio.sleep(0.2)
+        await self.node.ws.close()
+        result = await self.kernel._wait_task(task, timeout=1)
+        self.assertEqual(result.result_code, ComputeTaskResultCode.ERROR)
+        # the worker cancels the tasks of the closed connection
+        await asyncio.sleep(0.1)
+        self.assertEqual(len(self.worker.running_tasks), 0)
+        self.assertEqual(len(self.worker_node.running_workers), 0)
+
+    async def test_token(self):
+        for token in [None, "wrong_token"]:
+            node = RemoteComputeNode(str(self.server.make_url("/compute_node")), token=token)
+            node.start()
+            self.assertFalse(await node.wait_connected(timeout=0.3))
+            await node.close()
+
+        # the token is required out of loopback
+        with self.assertRaises(ValueError):
+            await ComputeNodeWorker("open_worker").start("0.0.0.0", get_free_port())
+
+    def test_message_bytes(self):
+        result = ComputeTaskResult()
+        result.result = b"\x00audio"
+        msg = loads_message(dumps_message({"type": "result", "result": result.to_dict()}))
+        self.assertEqual(ComputeTaskResult.from_dict(msg["result"]).result, b"\x00audio")
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestRemoteWorkerProcess(unittest.IsolatedAsyncioTestCase):
+    async def test_two_processes(self):
+        port = get_free_port()
+        worker_path = os.path.abspath(os.path.join(directory, "..", "src", "service", "compute_worker", "compute_worker.py"))
+        process = await asyncio.create_subprocess_exec(sys.executable, worker_path, "--host", "127.0.0.1", "--port", str(port), "--token", "test_token", "--test_node",
+                                                       stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+        node = RemoteComputeNode(f"ws://127.0.0.1:{port}/compute_node", token="test_token")
+        node.reconnect_interval = 0.2
+        node.max_reconnect_interval = 0.2
+        try:
+            node.start()
+            self.assertTrue(await node.wait_connected(timeout=30))
+            kernel = ComputeKernel()
+            kernel.add_compute_node(node)
+            await kernel.start()
+
+            result = await kernel.do_llm_completion(LLMPrompt("hello"), mode_name="gpt-4", timeout=5)
+            self.assertEqual(result.result_code, ComputeTaskResultCode.OK)
+            self.assertEqual(result.result_str, "finished")
+        finally:
+            await node.close()
+            process.kill()
+            await process.wait()
+
+
+if __name__ == "__main__":
+    unittest.main()